@@ -1,52 +1,232 @@
 import cv2
 import os
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 from loguru import logger
+import face_cache
+import face_model_store
 # Папка с датасетом
+DATASET_PATH = "dataset"
+MODEL_PATH = "face_model.yml"
+LABELS_PATH = "labels.npy"
+# Что уже есть в модели: стабильные ID людей и учтённые файлы (хеш + mtime)
+MANIFEST_PATH = "face_model_manifest.json"
+# Версия формата обучающих лиц: модель на старых (ненормализованных) лицах дообучать нельзя
+MANIFEST_VERSION = 2
+# Декодирование фото и поиск лиц — в пуле потоков по числу ядер (cv2 отпускает GIL)
+TRAIN_WORKERS = os.cpu_count() or 1
+PROGRESS_INTERVAL = 2.0  # секунд между сообщениями о прогрессе
 
 
+def _load_manifest():
+    if not os.path.exists(MANIFEST_PATH):
+        return None
+    try:
+        with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Training manifest is damaged, full retrain: {e}")
+        return None
 
-def learning():
-    DATASET_PATH = "dataset"
-    recognizer = cv2.face.LBPHFaceRecognizer_create()
-    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
-    def load_images(dataset_path):
-        faces = []
-        labels = []
-        label_dict = {}
-        current_id = 0
 
-        for person_name in os.listdir(dataset_path):
-            person_path = os.path.join(dataset_path, person_name)
-            if not os.path.isdir(person_path):
+def _save_manifest(manifest):
+    tmp_path = MANIFEST_PATH + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+
+def _scan_dataset(dataset_path, known_files):
+    """
+    Список файлов датасета {relpath: {person, hash, mtime, size}}.
+    Хеш пересчитывается только если изменились mtime или размер.
+    """
+    files = {}
+    if not os.path.isdir(dataset_path):
+        return files
+    for person_name in sorted(os.listdir(dataset_path)):
+        person_path = os.path.join(dataset_path, person_name)
+        if not os.path.isdir(person_path):
+            continue
+        for img_name in sorted(os.listdir(person_path)):
+            img_path = os.path.join(person_path, img_name)
+            if not os.path.isfile(img_path):
                 continue
+            rel_path = os.path.relpath(img_path, dataset_path)
+            st = os.stat(img_path)
+            known = known_files.get(rel_path)
+            if known and known["mtime"] == st.st_mtime and known["size"] == st.st_size:
+                file_hash = known["hash"]
+            else:
+                file_hash = face_cache.file_hash(img_path)
+            files[rel_path] = {
+                "person": person_name,
+                "hash": file_hash,
+                "mtime": st.st_mtime,
+                "size": st.st_size,
+            }
+    return files
+
+
+def _scan_captures():
+    """Лица, снятые сразу в кэш (script_save), — как «файлы» без исходного фото"""
+    files = {}
+    for person_name, keys in face_cache.list_captures().items():
+        for key in keys:
+            files[f"@capture/{person_name}/{key}"] = {
+                "person": person_name,
+                "hash": key,
+                "mtime": 0,
+                "size": 0,
+            }
+    return files
+
+
+def _assign_labels(files, labels):
+    """Новым людям — следующий свободный ID; старые ID никогда не сдвигаются"""
+    next_id = max(labels.values(), default=-1) + 1
+    for info in files.values():
+        if info["person"] not in labels:
+            labels[info["person"]] = next_id
+            next_id += 1
+    return labels
+
 
-            label_dict[current_id] = person_name
+def _extract_parallel(paths, progress=None):
+    """
+    Поиск лиц на фото в пуле потоков. Результаты отдаются в порядке paths.
+    Не процессы: дочерний процесс заново импортирует главный модуль (веб-приложение, логи).
+    progress(done, total, images_per_sec, eta_sec) вызывается по ходу обработки.
+    """
+    total = len(paths)
+    workers = min(TRAIN_WORKERS, total)
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="train") if workers > 1 else None
+    try:
+        if pool is not None:
+            results = pool.map(face_cache.extract_file, paths)
+        else:
+            results = map(face_cache.extract_file, paths)
 
-            for img_name in os.listdir(person_path):
-                img_path = os.path.join(person_path, img_name)
-                img = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
+        started = last_report = time.time()
+        for done, crops in enumerate(results, 1):
+            now = time.time()
+            rate = done / max(now - started, 1e-6)
+            eta = (total - done) / rate
+            if now - last_report >= PROGRESS_INTERVAL or done == total:
+                logger.info(f"Training data: {done}/{total} images, {rate:.1f} img/s, ETA {eta:.0f}s")
+                last_report = now
+            if progress is not None:
+                progress(done, total, rate, eta)
+            yield crops
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
 
-                if img is None:
+
+def learning(incremental=True, progress=None, check_cancelled=None):
+    """
+    Обучение LBPH-модели по папке dataset.
+    incremental=True — в модель добавляются только новые фото (recognizer.update);
+    полное переобучение — при первом запуске, удалении или изменении уже учтённых фото.
+    progress(done, total, images_per_sec, eta_sec) — прогресс обработки новых фото.
+    check_cancelled() — бросает исключение, если обучение отменено; вызывается только
+    до записи модели на диск (после начала записи отмена уже не действует).
+    Возвращает True, если модель и словарь имён сохранены.
+    """
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    check_cancelled = check_cancelled or (lambda: None)
+
+    def load_images(dataset_path, file_list, labels):
+        """Лица берутся из кэша face_cache; промахи обрабатываются параллельно"""
+        person_data = {}
+        samples = {}
+        misses = []
+
+        for rel_path in file_list:
+            info = files[rel_path]
+            person = info["person"]
+            if person not in person_data:
+                person_data[person] = face_cache.load_person(person)
+
+            crops = face_cache.get_samples(person, info["hash"], person_data[person])
+            if crops is None:
+                misses.append(rel_path)
+            else:
+                samples[rel_path] = crops
+
+        if misses:
+            paths = [os.path.join(dataset_path, rel_path) for rel_path in misses]
+            new_items = {}
+            for rel_path, crops in zip(misses, _extract_parallel(paths, progress)):
+                if crops is None:
+                    logger.warning(f"Cannot read image: {rel_path}")
                     continue
+                samples[rel_path] = crops
+                info = files[rel_path]
+                new_items.setdefault(info["person"], []).append((info["hash"], crops))
+            # Одна перезапись кэша на человека
+            for person, items in new_items.items():
+                face_cache.add_many(person, items)
+
+        faces = []
+        face_labels = []
+        for rel_path in file_list:
+            crops = samples.get(rel_path, [])
+            faces.extend(crops)
+            face_labels.extend([labels[files[rel_path]["person"]]] * len(crops))
 
-                faces_detected = face_cascade.detectMultiScale(img, scaleFactor=1.1, minNeighbors=5)
-                for (x, y, w, h) in faces_detected:
-                    faces.append(img[y:y+h, x:x+w])
-                    labels.append(current_id)
+        return faces, face_labels
 
-            current_id += 1
+    manifest = _load_manifest() or {"labels": {}, "files": {}}
+    known_files = manifest["files"]
+    files = _scan_dataset(DATASET_PATH, known_files)
+    files.update(_scan_captures())
+    labels = _assign_labels(files, dict(manifest["labels"]))
+    check_cancelled()
 
-        return faces, labels, label_dict
+    # Инкрементально можно, только если все учтённые фото на месте и не менялись
+    changed = [rel for rel, info in known_files.items()
+               if rel not in files or files[rel]["hash"] != info["hash"]]
+    can_update = (incremental and known_files and not changed
+                  and manifest.get("version") == MANIFEST_VERSION
+                  and os.path.exists(MODEL_PATH))
 
-    # Загружаем данные
-    faces, labels, label_dict = load_images(DATASET_PATH)
+    if can_update:
+        new_files = [rel for rel in files if rel not in known_files]
+        if not new_files:
+            logger.info("No new photos in the dataset, the model is up to date")
+            return False
+        faces, face_labels = load_images(DATASET_PATH, new_files, labels)
+        check_cancelled()
+        if faces:
+            recognizer.read(MODEL_PATH)
+            recognizer.update(faces, np.array(face_labels))
+        logger.info(f"Incremental training: {len(new_files)} new photo(s), {len(faces)} face(s)")
+    else:
+        if changed:
+            logger.info(f"Dataset changed ({len(changed)} photo(s) removed or modified), full retrain")
+        # Загружаем данные
+        faces, face_labels = load_images(DATASET_PATH, list(files), labels)
+        if not faces:
+            logger.warning("No faces found in the dataset, the model was not trained")
+            return False
+        check_cancelled()
+        # Обучаем модель
+        recognizer.train(faces, np.array(face_labels))
 
-    # Обучаем модель
-    recognizer.train(faces, np.array(labels))
+    # Последняя точка отмены: дальше файлы модели пишутся на диск
+    check_cancelled()
 
     # Сохраняем модель и словарь имён
-    recognizer.save("face_model.yml")
-    np.save("labels.npy", label_dict)
+    if faces:
+        recognizer.save(MODEL_PATH)
+    label_dict = {label_id: name for name, label_id in labels.items()}
+    np.save(LABELS_PATH, label_dict)
+    # Бинарная копия для быстрой загрузки (face_model/), YAML остаётся основой для дообучения
+    if faces:
+        face_model_store.export_recognizer(recognizer, label_dict, MODEL_PATH)
+    _save_manifest({"version": MANIFEST_VERSION, "labels": labels, "files": files})
     logger.success("The model is trained and saved")
-
+    return True
@@ -0,0 +1,111 @@
+import os
+
+import numpy as np
+
+# Посекундная активность записи: <имя>.activity.npy рядом с видео.
+# Элемент i — секунда [i, i+1) от первого кадра записи (первая строка .timestamps.csv).
+ACTIVITY_SUFFIX = ".activity.npy"
+ACTIVITY_DTYPE = np.dtype([('motion', '<f2'),    # пиковая доля площади кадра в движении
+                           ('objects', '<u2'),   # пиковое число движущихся объектов
+                           ('face', 'u1')])      # 1 — в эту секунду было лицо
+ACTIVITY_THRESHOLD = 0.01  # доля площади, с которой секунда считается активной
+MERGE_GAP = 2              # секунд тишины, которые не разрывают отрезок активности
+MAX_SECONDS = 24 * 3600
+
+
+def activity_path(video_path):
+    return os.path.splitext(video_path)[0] + ACTIVITY_SUFFIX
+
+
+class ActivitySeries:
+    """Накопление посекундной активности (в потоке записи)"""
+
+    def __init__(self):
+        self.start = None
+        self.data = np.zeros(64, dtype=ACTIVITY_DTYPE)
+        self.length = 0
+
+    def add(self, timestamp, motion, objects=0, face=False):
+        if self.start is None:
+            self.start = timestamp
+        second = int(timestamp - self.start)
+        if second < 0 or second >= MAX_SECONDS:
+            return
+        if second >= len(self.data):
+            grown = np.zeros(max(second + 1, len(self.data) * 2), dtype=ACTIVITY_DTYPE)
+            grown[:len(self.data)] = self.data
+            self.data = grown
+        item = self.data[second]
+        item['motion'] = max(float(item['motion']), motion)
+        item['objects'] = max(int(item['objects']), objects)
+        item['face'] = item['face'] or face
+        self.length = max(self.length, second + 1)
+
+    def save(self, video_path, duration=None):
+        """Сохранить ряд длиной в запись (секунды без активности — нули)"""
+        length = self.length if duration is None else max(self.length, int(np.ceil(duration)))
+        data = np.zeros(length, dtype=ACTIVITY_DTYPE)
+        n = min(length, len(self.data))
+        data[:n] = self.data[:n]
+        np.save(activity_path(video_path), data)
+
+
+def load_activity(video_path):
+    """Ряд активности записи или None"""
+    path = activity_path(video_path)
+    if not os.path.exists(path):
+        return None
+    return np.load(path)
+
+
+def activity_ranges(series, threshold=ACTIVITY_THRESHOLD, merge_gap=MERGE_GAP):
+    """
+    Отрезки активности: секунды с движением выше порога или с лицом, близкие отрезки склеиваются.
+    Возвращает [{'start', 'end', 'peak_motion', 'objects', 'face'}] (секунды от начала записи).
+    """
+    active = np.flatnonzero((series['motion'] >= threshold) | (series['face'] > 0))
+    ranges = []
+    if len(active) == 0:
+        return ranges
+    breaks = np.flatnonzero(np.diff(active) > merge_gap + 1)
+    starts = np.concatenate(([active[0]], active[breaks + 1]))
+    ends = np.concatenate((active[breaks], [active[-1]])) + 1
+    for start, end in zip(starts, ends):
+        chunk = series[start:end]
+        ranges.append({
+            'start': int(start),
+            'end': int(end),
+            'peak_motion': round(float(chunk['motion'].max()), 4),
+            'objects': int(chunk['objects'].max()),
+            'face': bool(chunk['face'].any()),
+        })
+    return ranges
+
+
+def recording_activity(index, row, threshold=ACTIVITY_THRESHOLD, merge_gap=MERGE_GAP):
+    """
+    Отрезки активности записи из индекса в абсолютном времени. У каждого отрезка —
+    файл и смещение в нём (file, offset) для перехода к действию. У события — по его кускам.
+    """
+    if row['path']:
+        sources = [(row['path'], row['start'])]
+    else:
+        sources = []
+        for segment in row['segments'] or []:
+            segment_row = index.find(segment['file'])
+            if segment_row is not None:
+                sources.append((segment['file'], segment_row['start']))
+    result = []
+    for video, start in sources:
+        series = load_activity(video)
+        if series is None:
+            continue
+        for item in activity_ranges(series, threshold, merge_gap):
+            item['file'] = video
+            item['offset'] = item['start']
+            item['start'] = round(start + item['start'], 3)
+            item['end'] = round(start + item['end'], 3)
+            if not row['path'] and (item['end'] < row['start'] or item['start'] > row['end']):
+                continue  # кусок длиннее события — активность вне события не нужна
+            result.append(item)
+    return result
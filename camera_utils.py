@@ -3,6 +3,8 @@ import numpy as np
 import os
 import time
 from logger import logger
+from face_cache import normalize_face
+from face_model_store import load_face_model
 
 # === ГЛОБАЛЬНЫЕ ПАРАМЕТРЫ ОПТИМИЗАЦИИ ДЛЯ RASPBERRY PI 5 ===
 TARGET_RESOLUTION = (320, 240)  # Было (480, 320) → снижено для 4 камер
@@ -225,19 +227,18 @@ def draw_bounding_box(frame, rect, label=None, color=(0, 255, 0)):
 
 
 def load_lbph_face_recognizer(model_path="face_model.yml", labels_path="labels.npy"):
-    """Загрузка модели распознавания лиц"""
-    if not (os.path.exists(model_path) and os.path.exists(labels_path)):
+    """Загрузка модели распознавания лиц (бинарное хранилище face_model/, YAML конвертируется сам)"""
+    recognizer = load_face_model(model_path, labels_path)
+    if recognizer is None:
         logger.warning("Face model files not found")
         return None, None, None
-    recognizer = cv2.face.LBPHFaceRecognizer_create()
-    recognizer.read(model_path)
-    label_dict = np.load(labels_path, allow_pickle=True).item()
+    label_dict = recognizer.names
     face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
     return recognizer, label_dict, face_cascade
 
 
-def detect_faces_only(frame, detection_scale=FACE_DETECTION_SCALE):
-    """Детекция лиц БЕЗ распознавания (оптимизировано)"""
+def detect_faces_only(frame, detection_scale=FACE_DETECTION_SCALE, faces_info=None, draw=True):
+    """Детекция лиц БЕЗ распознавания (оптимизировано); faces_info/draw — как в annotate_face_boxes"""
     h, w = frame.shape[:2]
     small_w, small_h = int(w / detection_scale), int(h / detection_scale)
     small_frame = cv2.resize(frame, (small_w, small_h))
@@ -256,14 +257,66 @@ def detect_faces_only(frame, detection_scale=FACE_DETECTION_SCALE):
         x, y = int(x * detection_scale), int(y * detection_scale)
         fw, fh = int(fw * detection_scale), int(fh * detection_scale)
         face_boxes.append([x, y, x + fw, y + fh])
-        cv2.rectangle(frame, (x, y), (x + fw, y + fh), (0, 0, 255), 1)
-        cv2.putText(frame, "NE RASPOZNAN", (x, y - 10),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.4, (0, 0, 255), 1)
+        if faces_info is not None:
+            faces_info.append({'box': [x, y, x + fw, y + fh], 'name': None, 'confidence': None})
+        if draw:
+            cv2.rectangle(frame, (x, y), (x + fw, y + fh), (0, 0, 255), 1)
+            cv2.putText(frame, "NE RASPOZNAN", (x, y - 10),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.4, (0, 0, 255), 1)
     return frame, face_boxes
 
 
-def detect_and_recognize_faces(recognizer, label_dict, face_cascade, frame, confidence_threshold=80, detection_scale=FACE_DETECTION_SCALE):
-    """Распознавание лиц с оптимизацией под Pi"""
+def annotate_face_boxes(frame, face_boxes, recognizer=None, label_dict=None, confidence_threshold=80,
+                        recognized=None, faces_info=None, draw=True):
+    """
+    Распознавание и отрисовка лиц по готовым боксам (например, от DNN-детектора).
+    recognized — список, в который добавляются имена распознанных лиц;
+    faces_info — список для метаданных ({'box', 'name', 'confidence'}); draw=False — не рисовать.
+    """
+    predictions = [None] * len(face_boxes)
+    if recognizer is not None and face_boxes:
+        rois = [normalize_face(cv2.cvtColor(frame[y1:y2, x1:x2], cv2.COLOR_BGR2GRAY))
+                for (x1, y1, x2, y2) in face_boxes]
+        predictions = predict_faces(recognizer, rois)
+    for (x1, y1, x2, y2), prediction in zip(face_boxes, predictions):
+        name = confidence = None
+        if prediction is not None:
+            label_id, confidence = prediction
+            confidence = int(confidence)
+            if confidence < confidence_threshold:
+                color = (0, 255, 0)
+                name = label_dict.get(label_id, 'Unknown')
+                label_text = f"{name} ({confidence})"
+                if recognized is not None:
+                    recognized.append(name)
+            else:
+                color = (0, 0, 255)
+                label_text = f"NE RASPOZNAN ({confidence})"
+        else:
+            color = (0, 0, 255)
+            label_text = "NE RASPOZNAN"
+        if faces_info is not None:
+            faces_info.append({'box': [int(x1), int(y1), int(x2), int(y2)], 'name': name,
+                               'confidence': confidence})
+
+        if draw:
+            cv2.rectangle(frame, (x1, y1), (x2, y2), color, 1)
+            cv2.putText(frame, label_text, (x1, y1 - 10),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.4, color, 1)
+    return frame, face_boxes
+
+
+def predict_faces(recognizer, rois):
+    """Распознавание пачки лиц: одним вызовом, если модель это умеет (FaceModel)"""
+    if hasattr(recognizer, "predict_batch"):
+        labels, distances = recognizer.predict_batch(rois)
+        return [(int(l), float(d)) for l, d in zip(labels, distances)]
+    return [recognizer.predict(roi) for roi in rois]
+
+
+def detect_and_recognize_faces(recognizer, label_dict, face_cascade, frame, confidence_threshold=80, detection_scale=FACE_DETECTION_SCALE,
+                               recognized=None, faces_info=None, draw=True):
+    """Распознавание лиц с оптимизацией под Pi; имена распознанных добавляются в recognized"""
     h, w = frame.shape[:2]
     small_w, small_h = int(w / detection_scale), int(h / detection_scale)
     small_frame = cv2.resize(frame, (small_w, small_h))
@@ -277,24 +330,33 @@ def detect_and_recognize_faces(recognizer, label_dict, face_cascade, frame, conf
     )
 
     face_boxes = []
+    rois = []
     for (x, y, fw, fh) in faces:
         x, y = int(x * detection_scale), int(y * detection_scale)
         fw, fh = int(fw * detection_scale), int(fh * detection_scale)
-        roi = cv2.cvtColor(frame[y:y+fh, x:x+fw], cv2.COLOR_BGR2GRAY)
-
-        label_id, confidence = recognizer.predict(roi)
+        face_boxes.append([x, y, x + fw, y + fh])
+        # Лицо нормализуется так же, как при обучении (face_cache)
+        rois.append(normalize_face(cv2.cvtColor(frame[y:y+fh, x:x+fw], cv2.COLOR_BGR2GRAY)))
 
+    # Все лица кадра распознаются одним вызовом
+    for (x, y, x2, y2), (label_id, confidence) in zip(face_boxes, predict_faces(recognizer, rois)):
+        name = None
+        confidence = int(confidence)
         if confidence < confidence_threshold:
             name = label_dict.get(label_id, "Unknown")
             color = (0, 255, 0)
-            label_text = f"{name} ({int(confidence)})"
+            label_text = f"{name} ({confidence})"
+            if recognized is not None:
+                recognized.append(name)
         else:
             color = (0, 0, 255)
-            label_text = f"NE RASPOZNAN ({int(confidence)})"
-
-        face_boxes.append([x, y, x + fw, y + fh])
-        cv2.rectangle(frame, (x, y), (x + fw, y + fh), color, 1)
-        cv2.putText(frame, label_text, (x, y - 10),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.4, color, 1)
+            label_text = f"NE RASPOZNAN ({confidence})"
+        if faces_info is not None:
+            faces_info.append({'box': [x, y, x2, y2], 'name': name, 'confidence': confidence})
+
+        if draw:
+            cv2.rectangle(frame, (x, y), (x2, y2), color, 1)
+            cv2.putText(frame, label_text, (x, y - 10),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.4, color, 1)
 
     return frame, face_boxes
@@ -0,0 +1,166 @@
+import os
+
+import cv2
+import numpy as np
+
+from mjpeg_avi import AviInfo, stream_avi, avi_file_size, encode_jpeg
+
+# Экспорт отрезка времени одной камеры в один MJPEG AVI, который отдаётся клиенту по мере сборки.
+# Кадры MJPEG-записей копируются как есть; записи в других кодеках (XVID) перекодируются в JPEG.
+# Формат файла (частота, размер) — как у первого куска: куски с другим размером масштабируются,
+# с другой частотой — прореживаются или дополняются повторами кадров.
+MAX_EXPORT_SECONDS = 3 * 3600
+MAX_EXPORT_FILES = 10000
+
+
+class ExportPart:
+    """Кадры [first, last) одного файла записи"""
+
+    def __init__(self, path, info, first, last, fps):
+        self.path = path
+        self.info = info
+        self.first = first
+        self.last = last
+        self.fps = fps
+        self.out_fps = fps
+        self.out_size = tuple(info.size)
+
+    def conform(self, fps, size):
+        """Выдавать кадры с частотой fps и размером size (как у всего файла экспорта)"""
+        self.out_fps = fps
+        self.out_size = tuple(size)
+
+    @property
+    def passthrough(self):
+        return (self.info.is_mjpeg and len(self.info.frames) >= self.last
+                and tuple(self.info.size) == self.out_size)
+
+    def indices(self):
+        """Номера кадров куска (от first) для каждого кадра на выходе"""
+        count = self.last - self.first
+        if self.out_fps == self.fps:
+            return list(range(count))
+        total = max(1, int(round(count * self.out_fps / self.fps)))
+        return [min(count - 1, int(k * self.fps / self.out_fps)) for k in range(total)]
+
+    def sizes(self):
+        frames = self.info.frames
+        return [frames[self.first + i][1] for i in self.indices()]
+
+    def jpegs(self):
+        indices = self.indices()
+        if self.passthrough:
+            with open(self.path, "rb") as f:
+                for i in indices:
+                    offset, size = self.info.frames[self.first + i]
+                    f.seek(offset)
+                    yield f.read(size)
+            return
+        cap = cv2.VideoCapture(self.path)
+        try:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, self.first)
+            position, jpeg = -1, None
+            for i in indices:
+                # Повтор того же кадра (частота выше исходной) не кодируется заново
+                while position < i:
+                    ok, frame = cap.read()
+                    if not ok:
+                        return
+                    position += 1
+                    jpeg = None
+                if jpeg is None:
+                    if (frame.shape[1], frame.shape[0]) != self.out_size:
+                        frame = cv2.resize(frame, self.out_size, interpolation=cv2.INTER_AREA)
+                    jpeg = encode_jpeg(frame)
+                yield jpeg
+        finally:
+            cap.release()
+
+
+class _CaptureInfo:
+    """Параметры не-AVI записи (например, перекодированной в MP4) через VideoCapture"""
+
+    codec = None
+    is_mjpeg = False
+    frames = []
+
+    def __init__(self, path):
+        cap = cv2.VideoCapture(path)
+        if not cap.isOpened():
+            raise ValueError(f"Cannot open {path}")
+        self.fps = cap.get(cv2.CAP_PROP_FPS)
+        self.size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        cap.release()
+
+
+def frame_times(path, start, fps, count):
+    """
+    Время каждого кадра файла. Файл пишется с постоянной частотой, поэтому время кадра —
+    время последнего реального кадра (.timestamps.csv) плюс повторы после него.
+    """
+    n = np.arange(count)
+    sidecar = os.path.splitext(path)[0] + ".timestamps.csv"
+    if not os.path.exists(sidecar):
+        return start + n / fps
+    data = np.loadtxt(sidecar, delimiter=",", skiprows=1, ndmin=2)
+    if data.size == 0:
+        return start + n / fps
+    frames, stamps = data[:, 0].astype(int), data[:, 1]
+    idx = np.clip(np.searchsorted(frames, n, side="right") - 1, 0, None)
+    return stamps[idx] + (n - frames[idx]) / fps
+
+
+def _frame_count(path, info):
+    if info.is_mjpeg and info.frames:
+        return len(info.frames)
+    cap = cv2.VideoCapture(path)
+    count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    return count
+
+
+def plan_export(index, camera, start, end):
+    """Куски файлов, покрывающие [start, end] камеры, по порядку и без перекрытий"""
+    rows, _ = index.query(camera=camera, start=start, end=end, limit=MAX_EXPORT_FILES, newest_first=False)
+    parts = []
+    cursor = start
+    for row in rows:
+        path = row['path']
+        if not path or not os.path.exists(path):
+            continue
+        try:
+            info = AviInfo(path) if path.lower().endswith(".avi") else _CaptureInfo(path)
+        except (OSError, ValueError):
+            continue
+        fps = info.fps or 8.0
+        count = _frame_count(path, info)
+        if count == 0:
+            continue
+        times = frame_times(path, row['start'], fps, count)
+        selected = np.flatnonzero((times >= cursor) & (times <= end))
+        if len(selected) == 0:
+            continue
+        first, last = int(selected[0]), int(selected[-1]) + 1
+        parts.append(ExportPart(path, info, first, last, fps))
+        cursor = float(times[last - 1]) + 1e-3
+    return parts
+
+
+def export_stream(parts):
+    """
+    (генератор байтов AVI, размер файла или None). Размер известен заранее, если все кадры
+    копируются без перекодирования — тогда заголовок точный и можно отдать Content-Length.
+    """
+    fps, size = parts[0].fps, tuple(parts[0].info.size)
+    for part in parts:
+        part.conform(fps, size)
+    sizes = None
+    if all(part.passthrough for part in parts):
+        sizes = [s for part in parts for s in part.sizes()]
+
+    def frames():
+        for part in parts:
+            yield from part.jpegs()
+
+    total = avi_file_size(sizes) if sizes is not None else None
+    return stream_avi(frames(), fps, size, sizes), total
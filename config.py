@@ -53,6 +53,43 @@ def get_logical_camera_index(physical_index):
     return CAMERA_MAP_REVERSE.get(physical_index, physical_index)
 
 
+# Детектор лиц: 'haar' (каскад Хаара) или 'dnn' (SSD res10, пакетная обработка камер)
+FACE_DETECTOR_BACKEND = os.environ.get('OCTO_FACE_BACKEND', 'haar').lower()
+
+
+def _camera_values(value):
+    """'0:20,2:5' -> {0: 20.0, 2: 5.0}"""
+    result = {}
+    for item in filter(None, value.split(',')):
+        camera, _, amount = item.partition(':')
+        result[int(camera)] = float(amount)
+    return result
+
+
+# Хранение записей (0 — без ограничения). Старые записи удаляются первыми
+RETENTION_MAX_GB = float(os.environ.get('OCTO_RETENTION_MAX_GB', '0'))          # все камеры вместе
+RETENTION_MAX_DAYS = float(os.environ.get('OCTO_RETENTION_MAX_DAYS', '0'))
+RETENTION_CAMERA_GB = _camera_values(os.environ.get('OCTO_RETENTION_CAMERA_GB', ''))      # '0:20,2:5'
+RETENTION_CAMERA_DAYS = _camera_values(os.environ.get('OCTO_RETENTION_CAMERA_DAYS', ''))  # '0:7'
+RETENTION_FACE_DAYS = float(os.environ.get('OCTO_RETENTION_FACE_DAYS', '0'))    # записи с лицами хранятся дольше
+RETENTION_MIN_FREE_PERCENT = float(os.environ.get('OCTO_RETENTION_MIN_FREE_PERCENT', '0'))   # 0 — не следить
+
+# Фоновое перекодирование MJPEG-записей в компактный кодек ('0' — выключить)
+TRANSCODE_ENABLED = os.environ.get('OCTO_TRANSCODE', '1') == '1'
+
+# Подписи на видео в веб-интерфейсе: 'client' — рисует браузер по метаданным кадра (чистый поток),
+# 'burn' — рисуются в самих кадрах потока. RECORD_OVERLAYS — рисовать подписи и в записях
+OVERLAY_MODE = os.environ.get('OCTO_OVERLAYS', 'client').lower()
+RECORD_OVERLAYS = os.environ.get('OCTO_RECORD_OVERLAYS', '0') == '1'
+
+# Режим веб-сервера: 'threading' (Werkzeug, поток на соединение) или 'gevent' (кооперативный,
+# для многих зрителей; нужен pip install gevent). Цикл камер в обоих режимах — обычный поток
+ASYNC_MODE = os.environ.get('OCTO_ASYNC', 'threading').lower()
+
+# Структурированный лог logs/YYYY-MM-DD.jsonl рядом с текстовым (для /api/logs/query; '0' — выключить)
+JSON_LOGS = os.environ.get('OCTO_JSON_LOGS', '1') == '1'
+
+
 # Вывод информации при импорте (для отладки)
 if __name__ == '__main__':
     print(f"Операционная система: {SYSTEM}")
@@ -61,4 +98,3 @@ if __name__ == '__main__':
 else:
     from loguru import logger
     logger.info(f"Platform: {SYSTEM}, Camera indices: {CAMERA_INDICES}")
-
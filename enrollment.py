@@ -0,0 +1,235 @@
+import os
+import re
+import time
+import shutil
+import zipfile
+
+import cv2
+import numpy as np
+from loguru import logger
+
+import face_cache
+
+# Параметры отбора кадров при регистрации лица
+TARGET_SAMPLES = 20      # сколько лучших лиц сохранить
+MIN_FACE_SIZE = 80       # минимальная ширина лица в кадре, px
+MIN_SHARPNESS = 60.0     # дисперсия лапласиана лица 100x100 (меньше — смазано)
+MAX_ASYMMETRY = 0.25     # асимметрия левой/правой половины (больше — поворот головы)
+MIN_DIFFERENCE = 8.0     # средняя разница яркости, при которой лица считаются разными
+GOOD_SCORE = 150.0       # при таком качестве всех лиц съёмка заканчивается досрочно
+MAX_DURATION = 30.0      # секунд на съёмку
+DETECT_SCALE = 2         # уменьшение кадра перед поиском лица
+
+# Загрузка фото через веб-интерфейс
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+MAX_UPLOAD_SIDE = 1280          # большие фото уменьшаются перед поиском лица
+MAX_IMAGE_BYTES = 20 * 1024 * 1024  # больший файл внутри ZIP не распаковывается
+DUPLICATE_DISTANCE = 4          # расстояние Хэмминга dHash, при котором лица — дубликаты
+MAX_NAME_LENGTH = 100
+# Имя человека — имя папки в face_cache и dataset: буквы любого алфавита, цифры, пробел, «_-.»
+NAME_UNSAFE_RE = re.compile(r"[^\w .-]+")
+
+
+def person_name(raw):
+    """
+    Имя человека из формы, пригодное как имя папки: без разделителей пути и «..» (кириллица
+    сохраняется, в отличие от secure_filename). None — после очистки ничего не осталось.
+    """
+    name = NAME_UNSAFE_RE.sub("", raw or "")
+    name = " ".join(name.split())[:MAX_NAME_LENGTH].strip(" .")
+    return name or None
+
+
+def sharpness(gray):
+    """Резкость: дисперсия лапласиана"""
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+
+def asymmetry(face):
+    """Разница левой и зеркальной правой половины лица (0 — анфас)"""
+    half = face.shape[1] // 2
+    left = face[:, :half].astype(np.int16)
+    right = np.fliplr(face[:, -half:]).astype(np.int16)
+    return float(np.abs(left - right).mean()) / 255.0
+
+
+class EnrollmentCapture:
+    """Отбор лучших и непохожих друг на друга лиц из непрерывного потока кадров"""
+
+    def __init__(self, target=TARGET_SAMPLES, max_duration=MAX_DURATION):
+        self.target = target
+        self.max_duration = max_duration
+        self.samples = []  # [(оценка, нормализованное лицо)]
+        self.frames_seen = 0
+        self.started = time.time()
+
+    def _detect(self, gray):
+        """Единственное лицо в кадре (x, y, w, h) или None"""
+        small = cv2.resize(gray, (gray.shape[1] // DETECT_SCALE, gray.shape[0] // DETECT_SCALE))
+        min_size = MIN_FACE_SIZE // DETECT_SCALE
+        faces = face_cache._get_face_cascade().detectMultiScale(
+            small, scaleFactor=1.1, minNeighbors=5, minSize=(min_size, min_size)
+        )
+        if len(faces) != 1:
+            return None
+        return [int(v * DETECT_SCALE) for v in faces[0]]
+
+    def score(self, gray, box):
+        """Оценка лица или None, если кадр не годится"""
+        x, y, w, h = box
+        face = cv2.resize(gray[y:y+h, x:x+w], face_cache.FACE_SIZE, interpolation=cv2.INTER_AREA)
+        sharp = sharpness(face)
+        if sharp < MIN_SHARPNESS:
+            return None
+        asym = asymmetry(cv2.equalizeHist(face))
+        if asym > MAX_ASYMMETRY:
+            return None
+        size_factor = min(1.0, w / (2.0 * MIN_FACE_SIZE))
+        return sharp * size_factor * (1.0 - asym)
+
+    def offer(self, frame):
+        """Обработать кадр; возвращает бокс лица (для отрисовки) или None"""
+        self.frames_seen += 1
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        box = self._detect(gray)
+        if box is None:
+            return None
+        score = self.score(gray, box)
+        if score is None:
+            return box
+        x, y, w, h = box
+        face = face_cache.normalize_face(gray[y:y+h, x:x+w])
+        self._keep(score, face)
+        return box
+
+    def _keep(self, score, face):
+        face16 = face.astype(np.int16)
+        for i, (old_score, old_face) in enumerate(self.samples):
+            if np.abs(face16 - old_face).mean() < MIN_DIFFERENCE:
+                # Почти тот же кадр — оставляем лучший из двух
+                if score > old_score:
+                    self.samples[i] = (score, face16)
+                return
+        if len(self.samples) < self.target:
+            self.samples.append((score, face16))
+            return
+        worst = min(range(len(self.samples)), key=lambda i: self.samples[i][0])
+        if score > self.samples[worst][0]:
+            self.samples[worst] = (score, face16)
+
+    @property
+    def done(self):
+        if time.time() - self.started >= self.max_duration:
+            return True
+        return len(self.samples) >= self.target and all(s >= GOOD_SCORE for s, _ in self.samples)
+
+    def best_faces(self):
+        """Отобранные лица, лучшие первыми"""
+        return [face.astype(np.uint8) for _, face in sorted(self.samples, key=lambda s: -s[0])]
+
+
+# ========= Загрузка фото =========
+def dhash(face):
+    """Перцептивный хеш (dHash, 64 бита) лица"""
+    small = cv2.resize(face, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+def _is_duplicate(h, known_hashes):
+    return any(bin(h ^ k).count("1") <= DUPLICATE_DISTANCE for k in known_hashes)
+
+
+def _iter_upload(paths):
+    """(имя, байты или None) для каждого фото; ZIP-архивы раскрываются"""
+    for path in paths:
+        name = os.path.basename(path)
+        if name.lower().endswith('.zip'):
+            try:
+                with zipfile.ZipFile(path) as archive:
+                    for info in archive.infolist():
+                        if info.is_dir() or not info.filename.lower().endswith(IMAGE_EXTENSIONS):
+                            continue
+                        member = f"{name}/{info.filename}"
+                        if info.file_size > MAX_IMAGE_BYTES:
+                            yield member, None
+                        else:
+                            yield member, archive.read(info)
+            except zipfile.BadZipFile:
+                yield name, None
+        else:
+            with open(path, "rb") as f:
+                yield name, f.read()
+
+
+def _count_upload(paths):
+    total = 0
+    for path in paths:
+        if path.lower().endswith('.zip'):
+            try:
+                with zipfile.ZipFile(path) as archive:
+                    total += sum(1 for info in archive.infolist()
+                                 if not info.is_dir() and info.filename.lower().endswith(IMAGE_EXTENSIONS))
+            except zipfile.BadZipFile:
+                total += 1
+        else:
+            total += 1
+    return total
+
+
+def extract_upload_face(data):
+    """Единственное нормализованное лицо из байтов фото -> (лицо, None) или (None, причина отказа)"""
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        return None, "not an image"
+    scale = MAX_UPLOAD_SIDE / max(img.shape)
+    if scale < 1:
+        img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    faces = face_cache._get_face_cascade().detectMultiScale(img, scaleFactor=1.1, minNeighbors=5)
+    if len(faces) == 0:
+        return None, "no face"
+    if len(faces) > 1:
+        return None, "several faces"
+    x, y, w, h = faces[0]
+    crop = cv2.resize(img[y:y+h, x:x+w], face_cache.FACE_SIZE, interpolation=cv2.INTER_AREA)
+    if sharpness(crop) < MIN_SHARPNESS:
+        return None, "blurry"
+    return face_cache.normalize_face(img[y:y+h, x:x+w]), None
+
+
+def process_upload(job, person, paths, staging_dir=None):
+    """
+    Фоновая обработка загруженных фото (и ZIP-архивов): поиск лица, проверка качества,
+    отсев дубликатов по dHash, запись лиц в face_cache. Результат — по каждому файлу.
+    """
+    try:
+        total = _count_upload(paths)
+        shards, _ = face_cache.load_person(person)
+        known_hashes = [dhash(np.asarray(crop)) for crops in shards.values() for crop in crops]
+        del shards
+
+        results = []
+        accepted = []
+        for done, (name, data) in enumerate(_iter_upload(paths), 1):
+            job.check_cancelled()
+            if data is None:
+                face, reason = None, "cannot read file"
+            else:
+                face, reason = extract_upload_face(data)
+            if face is not None:
+                h = dhash(face)
+                if _is_duplicate(h, known_hashes):
+                    face, reason = None, "duplicate"
+                else:
+                    known_hashes.append(h)
+                    accepted.append(face)
+            results.append({'file': name, 'accepted': face is not None, 'reason': reason})
+            job.update(done=done, total=total, accepted=len(accepted))
+
+        if accepted:
+            face_cache.add_captures(person, accepted)
+        logger.info(f"Upload for '{person}': {len(accepted)} of {len(results)} photo(s) accepted")
+        return {'accepted': len(accepted), 'rejected': len(results) - len(accepted), 'files': results}
+    finally:
+        if staging_dir:
+            shutil.rmtree(staging_dir, ignore_errors=True)
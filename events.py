@@ -0,0 +1,103 @@
+import threading
+
+from loguru import logger
+
+# Шина состояния камер для веб-интерфейса: цикл камер сообщает текущее состояние,
+# подписчики (Socket.IO) раз в FLUSH_INTERVAL получают только то, что изменилось.
+FLUSH_INTERVAL = 0.5  # с; чаще состояние не рассылается, промежуточные значения схлопываются
+MAX_EVENTS = 50       # разовых событий на камеру за интервал (остальные отбрасываются)
+SYSTEM_KEY = None     # «камера» для состояния системы в целом
+
+
+class EventBus:
+    """
+    Состояние по камерам (motion, recording, faces, fps, settings...) и разовые события.
+    set() сравнивает значение с последним отправленным: совпадает — ничего не уходит,
+    несколько изменений за интервал — уходит последнее. Подписчик вызывается из потока шины:
+    callback(camera, changes, events), где events — [{'type': ..., ...}].
+    """
+
+    def __init__(self, interval=FLUSH_INTERVAL):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._state = {}     # {camera: {ключ: значение}} — отправленное подписчикам
+        self._pending = {}   # {camera: {ключ: значение}} — изменения с прошлой отправки
+        self._events = {}    # {camera: [событие]}
+        self._subscribers = []
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def subscribe(self, callback):
+        """Подписка; поток рассылки запускается с первым подписчиком"""
+        with self._lock:
+            self._subscribers.append(callback)
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="event-bus", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    # ========= Публикация (цикл камер, API) =========
+    def set(self, camera, **values):
+        """Текущее состояние камеры; уходит, только если отличается от отправленного"""
+        with self._lock:
+            sent = self._state.setdefault(camera, {})
+            pending = self._pending.setdefault(camera, {})
+            for key, value in values.items():
+                if key in sent and sent[key] == value:
+                    pending.pop(key, None)  # вернулось к отправленному до рассылки
+                else:
+                    pending[key] = value
+            if pending:
+                self._wake.set()
+
+    def publish(self, camera, event_type, **data):
+        """Разовое событие (лицо распознано, маски изменились...) — уходит со следующей рассылкой"""
+        with self._lock:
+            events = self._events.setdefault(camera, [])
+            if len(events) < MAX_EVENTS:
+                events.append({'type': event_type, **data})
+            self._wake.set()
+
+    def snapshot(self, camera=SYSTEM_KEY):
+        """Полное состояние камеры (для только что подключившегося клиента)"""
+        with self._lock:
+            return {**self._state.get(camera, {}), **self._pending.get(camera, {})}
+
+    # ========= Рассылка =========
+    def flush(self):
+        """Отдать накопленное подписчикам; возвращает число сообщений"""
+        with self._lock:
+            batch = []
+            for camera in set(self._pending) | set(self._events):
+                changes = self._pending.pop(camera, {})
+                events = self._events.pop(camera, [])
+                if changes or events:
+                    self._state.setdefault(camera, {}).update(changes)
+                    batch.append((camera, changes, events))
+            subscribers = list(self._subscribers)
+            self._wake.clear()
+        for camera, changes, events in batch:
+            for callback in subscribers:
+                try:
+                    callback(camera, changes, events)
+                except Exception as e:
+                    logger.error(f"Event bus subscriber error: {e}")
+        return len(batch)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait()
+            if self._stop.is_set():
+                return
+            self.flush()
+            # Не чаще раза в интервал: изменения за это время схлопнутся
+            self._stop.wait(self.interval)
+
+
+# Общая шина процесса (как motion_logger): публикуют SurveillanceSystem и веб-API
+bus = EventBus()
@@ -1,12 +1,12 @@
 
 import cv2
-import numpy as np
+from face_cache import normalize_face
+from face_model_store import load_face_model
 
 def detect_faces_lbph():
 # Загружаем модель и словарь имён
-    recognizer = cv2.face.LBPHFaceRecognizer_create()
-    recognizer.read("face_model.yml")
-    label_dict = np.load("labels.npy", allow_pickle=True).item()
+    recognizer = load_face_model("face_model.yml", "labels.npy")
+    label_dict = recognizer.names
 
     face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
 
@@ -21,7 +21,7 @@ def detect_faces_lbph():
         faces = face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5)
 
         for (x, y, w, h) in faces:
-            roi = gray[y:y+h, x:x+w]
+            roi = normalize_face(gray[y:y+h, x:x+w])
             label_id, confidence = recognizer.predict(roi)
 
             if confidence < 80:  # чем меньше — тем увереннее
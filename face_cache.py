@@ -0,0 +1,257 @@
+import os
+import re
+import json
+import math
+import hashlib
+import threading
+
+import cv2
+import numpy as np
+from loguru import logger
+
+# Кэш нормализованных лиц для обучения: face_cache/<человек>/crops-NNNNNN.npy + index.json.
+# Каждая запись — новый файл; прежние файлы не переписываются, пока их читают через mmap.
+CACHE_DIR = "face_cache"
+FACE_SIZE = (100, 100)   # размер нормализованного лица (ш, в)
+MAX_EYE_ANGLE = 20       # больший наклон глаз считаем ошибкой детекции
+CAPTURE_PREFIX = "capture-"  # ключи лиц, снятых сразу в кэш (без исходного фото)
+MAX_SHARDS = 32          # больше файлов на человека — слить в один
+SHARD_RE = re.compile(r"^crops(?:-(\d+))?\.npy$")
+
+_lock = threading.Lock()
+# Каскады — свои в каждом потоке: detectMultiScale меняет состояние классификатора,
+# а обучение ищет лица в нескольких потоках сразу
+_cascades = threading.local()
+
+
+def _get_face_cascade():
+    if getattr(_cascades, "face", None) is None:
+        _cascades.face = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+    return _cascades.face
+
+
+def _get_eye_cascade():
+    if getattr(_cascades, "eye", None) is None:
+        _cascades.eye = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_eye.xml")
+    return _cascades.eye
+
+
+def file_hash(path):
+    """SHA-1 содержимого файла (ключ кэша)"""
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _align_by_eyes(face):
+    """Выравнивание лица по линии глаз (если оба глаза найдены)"""
+    h, w = face.shape[:2]
+    eyes = _get_eye_cascade().detectMultiScale(
+        face[:h // 2], scaleFactor=1.1, minNeighbors=5, minSize=(w // 8, w // 8)
+    )
+    if len(eyes) < 2:
+        return face
+    # Два самых крупных глаза, слева направо
+    eyes = sorted(sorted(eyes, key=lambda e: e[2] * e[3], reverse=True)[:2], key=lambda e: e[0])
+    (x1, y1, w1, h1), (x2, y2, w2, h2) = eyes
+    dx = (x2 + w2 / 2) - (x1 + w1 / 2)
+    dy = (y2 + h2 / 2) - (y1 + h1 / 2)
+    angle = math.degrees(math.atan2(dy, dx))
+    if abs(angle) > MAX_EYE_ANGLE:
+        return face
+    m = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+    return cv2.warpAffine(face, m, (w, h), borderMode=cv2.BORDER_REPLICATE)
+
+
+def normalize_face(gray_face):
+    """Нормализация лица: фиксированный размер, выравнивание, выравнивание гистограммы"""
+    face = cv2.resize(gray_face, FACE_SIZE, interpolation=cv2.INTER_AREA)
+    face = _align_by_eyes(face)
+    return cv2.equalizeHist(face)
+
+
+def extract_faces(gray_img):
+    """Поиск лиц на полутоновом изображении -> список нормализованных лиц"""
+    faces = _get_face_cascade().detectMultiScale(gray_img, scaleFactor=1.1, minNeighbors=5)
+    return [normalize_face(gray_img[y:y+h, x:x+w]) for (x, y, w, h) in faces]
+
+
+# ========= Хранилище =========
+def _person_dir(person):
+    return os.path.join(CACHE_DIR, person)
+
+
+def _load_index(person):
+    path = os.path.join(_person_dir(person), "index.json")
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Face cache index for '{person}' is damaged, rebuilding: {e}")
+        return {}
+
+
+def _shard_files(person_dir):
+    """Файлы массивов лиц в папке человека: {имя: номер} (crops.npy старого формата — 0)"""
+    shards = {}
+    if os.path.isdir(person_dir):
+        for fname in os.listdir(person_dir):
+            match = SHARD_RE.match(fname)
+            if match:
+                shards[fname] = int(match.group(1) or 0)
+    return shards
+
+
+def _entry(value):
+    # Старый формат индекса: [начало, кол-во] в crops.npy
+    return ("crops.npy", value[0], value[1]) if len(value) == 2 else tuple(value)
+
+
+def load_person(person):
+    """
+    Лица человека из кэша: ({файл: массив N x H x W, memory-mapped},
+    индекс {ключ: [файл, начало, кол-во]})
+    """
+    person_dir = _person_dir(person)
+    shards = {}
+    index = {}
+    for key, value in _load_index(person).items():
+        name, start, count = _entry(value)
+        if name not in shards:
+            try:
+                shards[name] = np.load(os.path.join(person_dir, name), mmap_mode="r")
+            except (OSError, ValueError):
+                shards[name] = None
+        # Отбрасываем записи индекса, которые не попали в массив (сбой при записи)
+        if shards[name] is not None and start + count <= len(shards[name]):
+            index[key] = [name, start, count]
+    return {name: crops for name, crops in shards.items() if crops is not None}, index
+
+
+def _remove_unused(person_dir, index):
+    """Удалить файлы, на которые индекс больше не ссылается (после слияния)"""
+    used = {value[0] for value in index.values()}
+    for fname in _shard_files(person_dir):
+        if fname not in used:
+            try:
+                os.remove(os.path.join(person_dir, fname))
+            except OSError:
+                pass  # ещё открыт (mmap в Windows) — удалим при следующей записи
+
+
+def add_samples(person, key, crops):
+    """Добавить нормализованные лица под ключом (хеш исходного файла)"""
+    add_many(person, [(key, crops)])
+
+
+def add_many(person, items):
+    """
+    Добавить пачку [(ключ, лица)] новым файлом рядом с прежними: уже записанные массивы
+    не переписываются — они могут быть открыты через mmap (в Windows такой файл не заменить).
+    Когда файлов больше MAX_SHARDS, все лица сливаются в один новый файл.
+    """
+    with _lock:
+        shards, index = load_person(person)
+        person_dir = _person_dir(person)
+        existing = _shard_files(person_dir)
+        name = "crops-%06d.npy" % (max(existing.values(), default=0) + 1)
+        new_parts = []
+        offset = 0
+        for key, crops in items:
+            if key in index:
+                continue
+            crops = np.asarray(crops, dtype=np.uint8).reshape(-1, FACE_SIZE[1], FACE_SIZE[0])
+            index[key] = [name, offset, len(crops)]
+            offset += len(crops)
+            new_parts.append(crops)
+        if not new_parts:
+            return
+
+        if len(shards) >= MAX_SHARDS:
+            merged_index = {}
+            parts = []
+            offset = 0
+            for key, (shard, start, count) in index.items():
+                crops = shards[shard][start:start + count] if shard in shards else None
+                merged_index[key] = [name, offset, count]
+                offset += count
+                parts.append(crops)
+            new_crops = iter(new_parts)
+            parts = [next(new_crops) if part is None else part for part in parts]
+            index = merged_index
+        else:
+            parts = new_parts
+
+        os.makedirs(person_dir, exist_ok=True)
+        np.save(os.path.join(person_dir, name), np.concatenate(parts))
+        del shards, parts
+
+        index_tmp = os.path.join(person_dir, "index.json.tmp")
+        with open(index_tmp, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(index_tmp, os.path.join(person_dir, "index.json"))
+        _remove_unused(person_dir, index)
+
+
+def get_samples(person, key, person_data=None):
+    """Лица по ключу или None, если их нет в кэше"""
+    shards, index = person_data if person_data is not None else load_person(person)
+    if key not in index:
+        return None
+    shard, start, count = index[key]
+    return shards[shard][start:start + count]
+
+
+def extract_file(path):
+    """Декодирование фото и поиск лиц без записи в кэш (для пула потоков); None — не читается"""
+    img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        return None
+    crops = extract_faces(img)
+    return np.array(crops, dtype=np.uint8).reshape(-1, FACE_SIZE[1], FACE_SIZE[0])
+
+
+def capture_key(crop):
+    """Ключ для лица без исходного файла — хеш самого нормализованного лица"""
+    return CAPTURE_PREFIX + hashlib.sha1(np.ascontiguousarray(crop).tobytes()).hexdigest()
+
+
+def add_captures(person, crops):
+    """Сохранить снятые лица (по одному на ключ); возвращает ключи"""
+    items = [(capture_key(crop), crop) for crop in crops]
+    add_many(person, items)
+    return [key for key, _ in items]
+
+
+def list_captures():
+    """Снятые в кэш лица: {человек: [ключи]}"""
+    captures = {}
+    if not os.path.isdir(CACHE_DIR):
+        return captures
+    for person in sorted(os.listdir(CACHE_DIR)):
+        if not os.path.isdir(_person_dir(person)):
+            continue
+        _, index = load_person(person)
+        keys = sorted(k for k in index if k.startswith(CAPTURE_PREFIX))
+        if keys:
+            captures[person] = keys
+    return captures
+
+
+def cache_image(person, path, key=None):
+    """Декодировать фото, найти и нормализовать лица, сохранить в кэш. Возвращает лица."""
+    key = key or file_hash(path)
+    cached = get_samples(person, key)
+    if cached is not None:
+        return cached
+    crops = extract_file(path)
+    if crops is None:
+        logger.warning(f"Cannot read image: {path}")
+        return []
+    # Ключ пишем даже без лиц — чтобы не декодировать фото повторно
+    add_samples(person, key, crops)
+    return crops
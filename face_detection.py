@@ -1,19 +1,29 @@
+import os
 import cv2
+import numpy as np
 from camera_utils import draw_bounding_box
+from loguru import logger
 
-def load_face_detection_model(face_proto, face_model):
+# Модель SSD (res10) для DNN-детектора лиц
+FACE_PROTO = os.path.join("models", "deploy.prototxt")
+FACE_MODEL = os.path.join("models", "res10_300x300_ssd_iter_140000.caffemodel")
+DNN_INPUT_SIZE = (300, 300)
+DNN_MEAN = (104.0, 117.0, 123.0)
+
+def load_face_detection_model(face_proto=FACE_PROTO, face_model=FACE_MODEL):
     """Загрузка модели детектирования лиц"""
     net = cv2.dnn.readNet(face_model, face_proto)
     return net
 
-def detect_faces(net, frame, conf_threshold=0.7):
+def detect_faces(net, frame, conf_threshold=0.7, draw=True):
     """Детектирование лиц на кадре"""
-    frame_opencv_dnn = frame.copy()
+    # Копия нужна только для отрисовки — исходный кадр не трогаем
+    frame_opencv_dnn = frame.copy() if draw else frame
     frame_height = frame_opencv_dnn.shape[0]
     frame_width = frame_opencv_dnn.shape[1]
 
-    blob = cv2.dnn.blobFromImage(frame_opencv_dnn, 1.0, (300, 300), 
-                               [104, 117, 123], True, False)
+    blob = cv2.dnn.blobFromImage(frame_opencv_dnn, 1.0, DNN_INPUT_SIZE,
+                               list(DNN_MEAN), True, False)
     net.setInput(blob)
     detections = net.forward()
     face_boxes = []
@@ -27,7 +37,74 @@ def detect_faces(net, frame, conf_threshold=0.7):
             y2 = int(detections[0, 0, i, 6] * frame_height)
             w, h = x2 - x1, y2 - y1
             face_boxes.append([x1, y1, x2, y2])
-            
-            draw_bounding_box(frame_opencv_dnn, (x1, y1, w, h), f"{confidence:.2f}", (0, 255, 0))
+
+            if draw:
+                draw_bounding_box(frame_opencv_dnn, (x1, y1, w, h), f"{confidence:.2f}", (0, 255, 0))
 
     return frame_opencv_dnn, face_boxes
+
+
+class DNNFaceDetector:
+    """Пакетный DNN-детектор: один forward() на все камеры за тик"""
+
+    def __init__(self, net, max_batch=4, conf_threshold=0.7, swap_rb=True):
+        self.net = net
+        self.max_batch = max_batch
+        self.conf_threshold = conf_threshold
+        self.swap_rb = swap_rb
+        w, h = DNN_INPUT_SIZE
+        # Предвыделенные буферы: уменьшенные кадры и NCHW-блоб
+        self._resized = np.empty((max_batch, h, w, 3), dtype=np.uint8)
+        self._blob = np.empty((max_batch, 3, h, w), dtype=np.float32)
+        # Как и в blobFromImages, среднее вычитается уже после перестановки каналов
+        self._mean = np.array(DNN_MEAN, dtype=np.float32).reshape(1, 3, 1, 1)
+
+    @classmethod
+    def load(cls, face_proto=FACE_PROTO, face_model=FACE_MODEL, **kwargs):
+        """Загрузка детектора; None, если файлов модели нет"""
+        if not (os.path.exists(face_proto) and os.path.exists(face_model)):
+            logger.warning(f"DNN face model not found: {face_model}")
+            return None
+        return cls(load_face_detection_model(face_proto, face_model), **kwargs)
+
+    def _make_blob(self, frames):
+        """Заполняет предвыделенный блоб (аналог blobFromImages без аллокаций)"""
+        n = len(frames)
+        for i, frame in enumerate(frames):
+            cv2.resize(frame, DNN_INPUT_SIZE, dst=self._resized[i])
+        src = self._resized[:n]
+        if self.swap_rb:
+            src = src[..., ::-1]
+        blob = self._blob[:n]
+        np.subtract(src.transpose(0, 3, 1, 2), self._mean, out=blob, casting="unsafe")
+        return blob
+
+    def detect_batch(self, frames):
+        """
+        Детекция лиц на пачке кадров за один проход сети.
+        Возвращает для каждого кадра список нормированных боксов [x1, y1, x2, y2, conf]
+        """
+        results = [[] for _ in frames]
+        for start in range(0, len(frames), self.max_batch):
+            chunk = frames[start:start + self.max_batch]
+            self.net.setInput(self._make_blob(chunk))
+            detections = self.net.forward()
+
+            # detections: [1, 1, N, 7] -> (image_id, label, conf, x1, y1, x2, y2)
+            rows = detections.reshape(-1, 7)
+            rows = rows[rows[:, 2] > self.conf_threshold]
+            for image_id, _, conf, x1, y1, x2, y2 in rows:
+                box = [float(np.clip(v, 0.0, 1.0)) for v in (x1, y1, x2, y2)]
+                results[start + int(image_id)].append(box + [float(conf)])
+        return results
+
+
+def scale_face_boxes(norm_boxes, frame_shape):
+    """Перевод нормированных боксов DNN в пиксели кадра"""
+    h, w = frame_shape[:2]
+    boxes = []
+    for x1, y1, x2, y2, _ in norm_boxes:
+        bx1, by1, bx2, by2 = int(x1 * w), int(y1 * h), int(x2 * w), int(y2 * h)
+        if bx2 > bx1 and by2 > by1:
+            boxes.append([bx1, by1, bx2, by2])
+    return boxes
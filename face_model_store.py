@@ -0,0 +1,204 @@
+import os
+import json
+
+import cv2
+import numpy as np
+from loguru import logger
+
+# Компактное хранилище LBPH-модели: гистограммы и метки в .npy (memory-mapped) + JSON-заголовок
+STORE_DIR = "face_model"
+STORE_FORMAT = 2  # 2 — гистограммы float32 (в формате 1 были float16; такое хранилище пересоздаётся из YAML)
+HEADER_FILE = "header.json"
+HISTOGRAMS_FILE = "histograms.npy"
+LABELS_FILE = "labels.npy"
+DEFAULT_THRESHOLD = 1.7976931348623157e308  # как DBL_MAX у LBPHFaceRecognizer
+PREDICT_BLOCK = 256  # сколько эталонных гистограмм сравнивается за один шаг
+
+
+def lbp_image(gray, radius=1, neighbors=8):
+    """Расширенный (круговой) LBP — тот же алгоритм, что elbp в OpenCV LBPH"""
+    src = gray.astype(np.float32)
+    h, w = src.shape
+    center = src[radius:h - radius, radius:w - radius]
+    result = np.zeros(center.shape, dtype=np.int32)
+    eps = np.finfo(np.float32).eps
+    for n in range(neighbors):
+        x = np.float32(radius * np.cos(2.0 * np.pi * n / neighbors))
+        y = np.float32(-radius * np.sin(2.0 * np.pi * n / neighbors))
+        fx, fy = int(np.floor(x)), int(np.floor(y))
+        cx, cy = int(np.ceil(x)), int(np.ceil(y))
+        ty, tx = y - fy, x - fx
+        w1, w2 = (1 - tx) * (1 - ty), tx * (1 - ty)
+        w3, w4 = (1 - tx) * ty, tx * ty
+
+        def shifted(dy, dx):
+            return src[radius + dy:h - radius + dy, radius + dx:w - radius + dx]
+
+        t = w1 * shifted(fy, fx) + w2 * shifted(fy, cx) + w3 * shifted(cy, fx) + w4 * shifted(cy, cx)
+        result += (((t > center) | (np.abs(t - center) < eps)).astype(np.int32) << n)
+    return result
+
+
+def lbp_histogram(gray, radius=1, neighbors=8, grid_x=8, grid_y=8):
+    """Пространственная гистограмма LBP (вектор grid_x * grid_y * 2^neighbors)"""
+    lbp = lbp_image(gray, radius, neighbors)
+    patterns = 2 ** neighbors
+    cell_h, cell_w = lbp.shape[0] // grid_y, lbp.shape[1] // grid_x
+    hist = np.zeros((grid_y * grid_x, patterns), dtype=np.float32)
+    if cell_h == 0 or cell_w == 0:
+        return hist.ravel()
+    cells = lbp[:cell_h * grid_y, :cell_w * grid_x].reshape(grid_y, cell_h, grid_x, cell_w)
+    cells = cells.transpose(0, 2, 1, 3).reshape(grid_y * grid_x, cell_h * cell_w)
+    # bincount по всем ячейкам сразу: смещаем коды на номер ячейки
+    offsets = (np.arange(grid_y * grid_x) * patterns)[:, None]
+    counts = np.bincount((cells + offsets).ravel(), minlength=grid_y * grid_x * patterns)
+    return (counts / float(cell_h * cell_w)).astype(np.float32)
+
+
+def chi_square_distances(queries, histograms, block=PREDICT_BLOCK):
+    """Матрица расстояний χ² (HISTCMP_CHISQR_ALT) запросов M x D до эталонов N x D -> M x N"""
+    queries = np.asarray(queries, dtype=np.float32)
+    out = np.empty((len(queries), len(histograms)), dtype=np.float64)
+    eps = np.finfo(np.float64).eps
+    for start in range(0, len(histograms), block):
+        ref = np.asarray(histograms[start:start + block], dtype=np.float32)
+        diff = queries[:, None, :] - ref[None, :, :]
+        total = queries[:, None, :] + ref[None, :, :]
+        np.square(diff, out=diff)
+        np.divide(diff, total, out=diff, where=total > eps)
+        diff[total <= eps] = 0
+        out[:, start:start + block] = 2.0 * diff.sum(axis=2, dtype=np.float64)
+    return out
+
+
+class FaceModel:
+    """LBPH-модель из хранилища: predict() совместим с cv2.face.LBPHFaceRecognizer"""
+
+    def __init__(self, histograms, labels, names, radius=1, neighbors=8, grid_x=8, grid_y=8,
+                 threshold=DEFAULT_THRESHOLD):
+        self.histograms = histograms
+        self.labels = labels
+        self.names = names
+        self.radius = radius
+        self.neighbors = neighbors
+        self.grid_x = grid_x
+        self.grid_y = grid_y
+        self.threshold = threshold
+
+    def histogram(self, face):
+        return lbp_histogram(face, self.radius, self.neighbors, self.grid_x, self.grid_y)
+
+    def predict_batch(self, faces):
+        """Распознавание пачки лиц одним вызовом -> (метки, расстояния)"""
+        if len(faces) == 0 or len(self.labels) == 0:
+            return np.full(len(faces), -1, dtype=np.int32), np.full(len(faces), np.inf)
+        queries = np.stack([self.histogram(face) for face in faces])
+        dist = chi_square_distances(queries, self.histograms)
+        best = dist.argmin(axis=1)
+        best_dist = dist[np.arange(len(faces)), best]
+        labels = np.where(best_dist < self.threshold, np.asarray(self.labels)[best], -1)
+        return labels.astype(np.int32), best_dist
+
+    def predict(self, face):
+        labels, dist = self.predict_batch([face])
+        return int(labels[0]), float(dist[0])
+
+
+# ========= Чтение / запись =========
+def _write_npy(store_dir, name, array):
+    tmp_path = os.path.join(store_dir, name + ".tmp.npy")
+    np.save(tmp_path, array)
+    os.replace(tmp_path, os.path.join(store_dir, name))
+
+
+def save_store(histograms, labels, names, params, source_path=None, store_dir=STORE_DIR):
+    """Запись хранилища; заголовок пишется последним и служит признаком целостности"""
+    os.makedirs(store_dir, exist_ok=True)
+    # float32, как в cv2: с float16 расстояния расходятся с OpenCV на ~1e-2 и пороги уверенности,
+    # подобранные по YAML-модели, срабатывают иначе на пограничных лицах
+    histograms = np.asarray(histograms, dtype=np.float32)
+    labels = np.asarray(labels, dtype=np.int32).ravel()
+    _write_npy(store_dir, HISTOGRAMS_FILE, histograms)
+    _write_npy(store_dir, LABELS_FILE, labels)
+
+    header = dict(params)
+    header.update({
+        'format': STORE_FORMAT,
+        'count': int(len(labels)),
+        'dim': int(histograms.shape[1]) if histograms.ndim == 2 else 0,
+        'names': {str(k): v for k, v in names.items()},
+    })
+    if source_path and os.path.exists(source_path):
+        st = os.stat(source_path)
+        header['source_mtime'] = st.st_mtime
+        header['source_size'] = st.st_size
+    tmp_path = os.path.join(store_dir, HEADER_FILE + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(header, f, ensure_ascii=False)
+    os.replace(tmp_path, os.path.join(store_dir, HEADER_FILE))
+
+
+def export_recognizer(recognizer, label_dict, source_path=None, store_dir=STORE_DIR):
+    """Сохранение обученного cv2 LBPH в хранилище (без повторного чтения YAML)"""
+    histograms = recognizer.getHistograms()
+    histograms = (np.vstack([np.asarray(h, dtype=np.float32).reshape(1, -1) for h in histograms])
+                  if len(histograms) else np.zeros((0, 0), dtype=np.float32))
+    params = {
+        'radius': recognizer.getRadius(),
+        'neighbors': recognizer.getNeighbors(),
+        'grid_x': recognizer.getGridX(),
+        'grid_y': recognizer.getGridY(),
+        'threshold': recognizer.getThreshold(),
+    }
+    save_store(histograms, recognizer.getLabels(), label_dict, params, source_path, store_dir)
+
+
+def load_store(store_dir=STORE_DIR):
+    """Загрузка хранилища (гистограммы memory-mapped); None, если его нет или оно повреждено"""
+    header_path = os.path.join(store_dir, HEADER_FILE)
+    if not os.path.exists(header_path):
+        return None, None
+    try:
+        with open(header_path, "r", encoding="utf-8") as f:
+            header = json.load(f)
+        histograms = np.load(os.path.join(store_dir, HISTOGRAMS_FILE), mmap_mode="r")
+        labels = np.load(os.path.join(store_dir, LABELS_FILE))
+    except (OSError, ValueError) as e:
+        logger.warning(f"Face model store is damaged: {e}")
+        return None, None
+    if header.get('format') != STORE_FORMAT or len(labels) != header.get('count') or len(histograms) != len(labels):
+        logger.warning("Face model store is inconsistent, ignoring it")
+        return None, None
+    names = {int(k): v for k, v in header['names'].items()}
+    model = FaceModel(histograms, labels, names, header['radius'], header['neighbors'],
+                      header['grid_x'], header['grid_y'], header['threshold'])
+    return model, header
+
+
+def _is_fresh(header, source_path):
+    """Хранилище соответствует YAML-модели (или YAML нет вовсе)"""
+    if not os.path.exists(source_path):
+        return True
+    st = os.stat(source_path)
+    return header.get('source_mtime') == st.st_mtime and header.get('source_size') == st.st_size
+
+
+def load_face_model(model_path="face_model.yml", labels_path="labels.npy", store_dir=STORE_DIR):
+    """
+    Загрузка модели распознавания. Если хранилища нет или YAML новее —
+    YAML конвертируется автоматически (один раз).
+    """
+    model, header = load_store(store_dir)
+    if model is not None and _is_fresh(header, model_path):
+        return model
+
+    if not (os.path.exists(model_path) and os.path.exists(labels_path)):
+        return model
+
+    logger.info(f"Converting {model_path} to binary face model store")
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    recognizer.read(model_path)
+    label_dict = np.load(labels_path, allow_pickle=True).item()
+    export_recognizer(recognizer, label_dict, model_path, store_dir)
+    model, _ = load_store(store_dir)
+    return model
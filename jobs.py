@@ -0,0 +1,158 @@
+import time
+import uuid
+import queue
+import threading
+
+from loguru import logger
+
+
+class JobCancelled(Exception):
+    """Задача отменена пользователем"""
+
+
+class Job:
+    """Фоновая задача с прогрессом и отменой"""
+
+    def __init__(self, kind):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.status = "queued"  # queued | running | done | failed | cancelled
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def active(self):
+        with self._lock:
+            return self.status in ("queued", "running")
+
+    def cancel(self):
+        self._cancel.set()
+
+    def check_cancelled(self):
+        """Вызывается из задачи в безопасных точках"""
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def update(self, **progress):
+        with self._lock:
+            self.progress.update(progress)
+
+    def set_state(self, **fields):
+        """status/result/error/started/finished — под блокировкой, чтобы to_dict видел их согласованно"""
+        with self._lock:
+            for name, value in fields.items():
+                setattr(self, name, value)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'id': self.id,
+                'kind': self.kind,
+                'status': self.status,
+                'progress': dict(self.progress),
+                'result': self.result,
+                'error': self.error,
+                'created': self.created,
+                'started': self.started,
+                'finished': self.finished,
+                'cancel_requested': self._cancel.is_set(),
+            }
+
+
+class JobRegistry:
+    """Реестр фоновых задач: каждая в своём потоке (submit) или в очереди своего типа (enqueue)"""
+
+    def __init__(self, keep_finished=50):
+        self.keep_finished = keep_finished
+        self._jobs = {}
+        self._queues = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind, target, *args, **kwargs):
+        """Запуск target(job, *args, **kwargs) в фоне; результат target -> job.result"""
+        job = Job(kind)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        self._start(job, target, args, kwargs)
+        return job
+
+    def submit_unique(self, kind, target, *args, **kwargs):
+        """
+        Как submit, но только если нет активной задачи того же типа: проверка и регистрация —
+        под одной блокировкой. Возвращает (задача, True) или (уже идущая задача, False)
+        """
+        with self._lock:
+            active = self._find_active(kind)
+            if active is not None:
+                return active, False
+            job = Job(kind)
+            self._jobs[job.id] = job
+            self._prune()
+        self._start(job, target, args, kwargs)
+        return job, True
+
+    def _start(self, job, target, args, kwargs):
+        threading.Thread(target=self._run, args=(job, target, args, kwargs),
+                         name=f"job-{job.kind}-{job.id}", daemon=True).start()
+
+    def enqueue(self, kind, target, *args, **kwargs):
+        """Как submit, но задачи одного типа выполняются по очереди одним рабочим потоком"""
+        job = Job(kind)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+            jobs_queue = self._queues.get(kind)
+            if jobs_queue is None:
+                jobs_queue = self._queues[kind] = queue.Queue()
+                threading.Thread(target=self._worker, args=(jobs_queue,),
+                                 name=f"jobs-{kind}", daemon=True).start()
+        jobs_queue.put((job, target, args, kwargs))
+        return job
+
+    def _worker(self, jobs_queue):
+        while True:
+            job, target, args, kwargs = jobs_queue.get()
+            if job._cancel.is_set():
+                # Отменена, пока ждала в очереди
+                job.set_state(status="cancelled", finished=time.time())
+                continue
+            self._run(job, target, args, kwargs)
+
+    def _run(self, job, target, args, kwargs):
+        job.set_state(status="running", started=time.time())
+        try:
+            result = target(job, *args, **kwargs)
+            job.set_state(result=result, status="done", finished=time.time())
+        except JobCancelled:
+            job.set_state(status="cancelled", finished=time.time())
+            logger.info(f"Job {job.kind}/{job.id} cancelled")
+        except Exception as e:
+            job.set_state(status="failed", error=str(e), finished=time.time())
+            logger.exception(f"Job {job.kind}/{job.id} failed: {e}")
+
+    def _prune(self):
+        finished = sorted((j for j in self._jobs.values() if not j.active), key=lambda j: j.created)
+        for job in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[job.id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def find_active(self, kind):
+        """Активная задача данного типа (или None)"""
+        with self._lock:
+            return self._find_active(kind)
+
+    def _find_active(self, kind):
+        for job in self._jobs.values():
+            if job.kind == kind and job.active:
+                return job
+        return None
@@ -0,0 +1,249 @@
+import io
+import os
+import re
+import json
+import zipfile
+import threading
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from log_reader import LogFilter, CAMERA_RE
+
+# Поиск по текстовым логам за несколько дней, включая сжатые при ротации (YYYY-MM-DD.log.zip).
+# Архив читается потоково блоками по CHUNK_SIZE — память не зависит от размера дня. Блок, где
+# заведомо нет подходящих строк (нет нужного уровня, [CAMn] или текста), не разбирается на строки.
+# Дни ищутся параллельно; zlib отпускает GIL при распаковке, поэтому потоков достаточно.
+LOGS_DIR = "logs"
+SUMMARY_DIR = os.path.join(LOGS_DIR, "index", "archives")
+CHUNK_SIZE = 1024 * 1024
+SEARCH_WORKERS = min(4, os.cpu_count() or 1)
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+DAY_FILE_RE = re.compile(r"^(\d{4}-\d{2}-\d{2})[^/\\]*\.log(\.zip)?$")
+LEVEL_RE = re.compile(r"^[^|\n]*\|\s*([A-Z]+)\s*\|", re.M)
+
+
+def log_days(logs_dir=LOGS_DIR):
+    """[(дата, [файлы])] от новых к старым: текущий .log и архивы .log.zip"""
+    days = {}
+    if os.path.exists(logs_dir):
+        for fname in os.listdir(logs_dir):
+            match = DAY_FILE_RE.match(fname)
+            if match:
+                days.setdefault(match.group(1), []).append(os.path.join(logs_dir, fname))
+    return [(date, sorted(days[date])) for date in sorted(days, reverse=True)]
+
+
+def open_log(path):
+    """Бинарный поток текста лога: файл как есть или первый (единственный у loguru) файл архива"""
+    if not path.endswith(".zip"):
+        return open(path, "rb")
+    zf = zipfile.ZipFile(path, "r")
+    try:
+        member = zf.open(zf.namelist()[0], "r")
+    except Exception:
+        zf.close()
+        raise
+    # ZipExtFile держит ссылку на архив; закрываем архив вместе с потоком
+    member.close = _closing(member.close, zf.close)
+    return member
+
+
+def _closing(*closers):
+    def close():
+        for fn in closers:
+            fn()
+    return close
+
+
+def iter_lines(path):
+    """Строки лога по одной (для просмотра архива без чтения целиком)"""
+    with open_log(path) as f:
+        yield from io.TextIOWrapper(f, encoding="utf-8", errors="ignore")
+
+
+def iter_chunks(f, size=CHUNK_SIZE):
+    """Блоки текста из целых строк"""
+    rest = b""
+    while True:
+        data = f.read(size)
+        if not data:
+            break
+        data = rest + data
+        cut = data.rfind(b"\n") + 1
+        if cut == 0:
+            rest = data
+            continue
+        rest = data[cut:]
+        yield data[:cut].decode("utf-8", errors="ignore")
+    if rest:
+        yield rest.decode("utf-8", errors="ignore")
+
+
+class ArchiveSummaries:
+    """
+    Сводка по файлу дня: строк всего, по уровням и по камерам. Считается при полном проходе
+    поиска и хранится на диске (logs/index/archives/); по ней следующие запросы пропускают дни,
+    где нет нужного уровня или камеры. Сводка действительна, пока не изменились размер и mtime.
+    """
+
+    def __init__(self, summary_dir=SUMMARY_DIR):
+        self.summary_dir = summary_dir
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def _path(self, path):
+        return os.path.join(self.summary_dir, os.path.basename(path) + ".summary")
+
+    @staticmethod
+    def _stamp(path):
+        st = os.stat(path)
+        return [st.st_size, int(st.st_mtime)]
+
+    def get(self, path):
+        try:
+            stamp = self._stamp(path)
+        except OSError:
+            return None
+        with self._lock:
+            summary = self._cache.get(path)
+        if summary is None:
+            try:
+                with open(self._path(path), "r", encoding="utf-8") as f:
+                    summary = json.load(f)
+            except (OSError, ValueError):
+                return None
+        if summary.get('stamp') != stamp:
+            return None
+        with self._lock:
+            self._cache[path] = summary
+        return summary
+
+    def put(self, path, stamp, lines, levels, cameras):
+        # Текущий .log ещё дописывается — сводка нужна только для закрытых архивов
+        if not path.endswith(".zip"):
+            return
+        summary = {'stamp': stamp, 'lines': lines, 'levels': dict(levels),
+                   'cameras': {str(k): v for k, v in cameras.items()}}
+        os.makedirs(self.summary_dir, exist_ok=True)
+        temp = self._path(path) + ".tmp"
+        with open(temp, "w", encoding="utf-8") as f:
+            json.dump(summary, f)
+        os.replace(temp, self._path(path))
+        with self._lock:
+            self._cache[path] = summary
+
+    def prune(self, paths):
+        """Удалить сводки архивов, которых больше нет"""
+        if not os.path.exists(self.summary_dir):
+            return
+        names = {os.path.basename(p) + ".summary" for p in paths}
+        for fname in os.listdir(self.summary_dir):
+            if fname.endswith(".summary") and fname not in names:
+                os.remove(os.path.join(self.summary_dir, fname))
+
+
+def can_skip(summary, log_filter):
+    """По сводке дня видно, что подходящих строк в нём нет"""
+    if summary is None:
+        return False
+    if log_filter.level is not None and not summary['levels'].get(log_filter.level):
+        return True
+    if log_filter.camera is not None and not summary['cameras'].get(str(log_filter.camera)):
+        return True
+    return False
+
+
+def _chunk_may_match(text, log_filter, level_tag):
+    if level_tag is not None and level_tag not in text:
+        return False
+    if log_filter.camera is not None and f"[CAM{log_filter.camera}]" not in text:
+        return False
+    if log_filter.text is not None and log_filter.text not in text.lower():
+        return False
+    return True
+
+
+def search_file(path, log_filter, limit, newest_first=True, summaries=None, stop=None):
+    """
+    Подходящие строки одного файла дня. newest_first — последние limit строк (проход до конца
+    файла, по пути считается сводка); иначе — первые limit, и чтение прекращается сразу.
+    None — файл пропущен по сводке.
+    """
+    if summaries is not None and can_skip(summaries.get(path), log_filter):
+        return None
+    stamp = ArchiveSummaries._stamp(path)
+    level_tag = f"| {log_filter.level:<8} |" if log_filter.level else None
+    matches = deque(maxlen=limit) if newest_first else []
+    lines, levels, cameras = 0, Counter(), Counter()
+    complete = True
+    with open_log(path) as f:
+        for text in iter_chunks(f):
+            if stop is not None and stop.is_set():
+                complete = False
+                break
+            if newest_first:
+                lines += text.count("\n")
+                levels.update(LEVEL_RE.findall(text))
+                cameras.update(int(c) for c in CAMERA_RE.findall(text))
+            if not _chunk_may_match(text, log_filter, level_tag):
+                continue
+            for line in text.splitlines():
+                line = line.strip()
+                if line and log_filter.matches(line):
+                    matches.append(line)
+                    if not newest_first and len(matches) >= limit:
+                        return matches
+    if newest_first and complete and summaries is not None:
+        summaries.put(path, stamp, lines, levels, cameras)
+    return list(matches)
+
+
+def search_days(days, log_filter=None, limit=DEFAULT_LIMIT, newest_first=True,
+                summaries=None, workers=SEARCH_WORKERS):
+    """
+    Поиск по дням [(дата, [файлы])], упорядоченным в нужном направлении. Одновременно ищутся
+    не больше workers файлов; как только набрано limit строк, следующие дни не читаются.
+    Возвращает (строки от старых к новым, статистика).
+    """
+    log_filter = log_filter or LogFilter()
+    limit = max(1, min(int(limit), MAX_LIMIT))
+    files = [path for _, paths in days for path in (reversed(paths) if newest_first else paths)]
+    stats = {'files': 0, 'skipped': 0}
+    collected = []
+    total = 0
+    stop = threading.Event()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="log-search") as pool:
+        pending = deque()
+        queue_files = iter(files)
+
+        def submit_next():
+            path = next(queue_files, None)
+            if path is not None:
+                pending.append(pool.submit(search_file, path, log_filter, limit, newest_first,
+                                           summaries, stop))
+
+        for _ in range(workers):
+            submit_next()
+        # Результаты разбираются строго в порядке дней — ранний выход не теряет более нужные строки
+        while pending:
+            result = pending.popleft().result()
+            if result is None:
+                stats['skipped'] += 1
+            else:
+                stats['files'] += 1
+                collected.append(result)
+                total += len(result)
+            if total >= limit:
+                stop.set()
+                for future in pending:
+                    future.cancel()
+                break
+            submit_next()
+
+    if newest_first:
+        lines = [line for result in reversed(collected) for line in result][-limit:]
+    else:
+        lines = [line for result in collected for line in result][:limit]
+    return lines, stats
@@ -0,0 +1,280 @@
+import os
+import json
+import time
+import datetime
+import threading
+
+from loguru import logger
+
+from log_archive import open_log
+
+# Индекс структурированного лога (logs/YYYY-MM-DD.jsonl из logger.py). Файл дня делится на блоки
+# по BLOCK_LINES строк; для блока хранятся смещения, интервал времени, уровни и камеры.
+# Запрос «WARNING+ на камере 4 с 02:00 до 03:00» читает только блоки, которые могут подойти.
+# Прошлые дни после ротации сжаты в YYYY-MM-DD.jsonl.zip — их запрос читает потоково (ArchivedDay).
+LOGS_DIR = "logs"
+INDEX_DIR = os.path.join(LOGS_DIR, "index")
+JSON_SUFFIX = ".jsonl"
+ARCHIVE_SUFFIX = JSON_SUFFIX + ".zip"
+BLOCK_LINES = 512
+CHECK_INTERVAL = 30   # секунд между обновлениями индекса в фоне
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+# Номера уровней loguru: запрос по уровню — «этот и серьёзнее»
+LEVELS = {'TRACE': 5, 'DEBUG': 10, 'INFO': 20, 'SUCCESS': 25, 'WARNING': 30, 'ERROR': 40, 'CRITICAL': 50}
+
+
+def level_number(name):
+    """Номер уровня по имени; ValueError для неизвестного"""
+    try:
+        return LEVELS[name.strip().upper()]
+    except KeyError:
+        raise ValueError(f"unknown level: {name}")
+
+
+class DayIndex:
+    """
+    Индекс одного файла .jsonl. Блок: {'offset', 'end', 'lines', 't0', 't1', 'levels', 'cameras'}.
+    Файл только дописывается, поэтому refresh() индексирует лишь новые полные строки
+    (последний неполный блок перечитывается и дополняется).
+    """
+
+    archived = False
+
+    def __init__(self, path, index_path):
+        self.path = path
+        self.index_path = index_path
+        self.size = 0        # проиндексировано байт
+        self.blocks = []
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.size, self.blocks = data['size'], data['blocks']
+        except (OSError, ValueError, KeyError):
+            self.size, self.blocks = 0, []
+
+    def _save(self):
+        temp = self.index_path + ".tmp"
+        with open(temp, "w", encoding="utf-8") as f:
+            json.dump({'size': self.size, 'blocks': self.blocks}, f, separators=(',', ':'))
+        os.replace(temp, self.index_path)
+
+    def refresh(self):
+        """Проиндексировать дописанное с прошлого раза; возвращает число прочитанных строк"""
+        with self._lock:
+            size = os.path.getsize(self.path)
+            if size < self.size:
+                # Файл подменили — индекс с нуля
+                self.size, self.blocks = 0, []
+            if size == self.size:
+                return 0
+            if self.blocks and self.blocks[-1]['lines'] < BLOCK_LINES:
+                self.size = self.blocks.pop()['offset']
+            added = self._index_from(self.size)
+            self._save()
+            return added
+
+    def _index_from(self, offset):
+        added = 0
+        block = None
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break  # строку ещё дописывают
+                start, offset = offset, offset + len(raw)
+                try:
+                    entry = json.loads(raw)
+                except ValueError:
+                    continue
+                if block is None:
+                    block = {'offset': start, 'end': start, 'lines': 0, 't0': entry['time'],
+                             't1': entry['time'], 'levels': [], 'cameras': []}
+                    self.blocks.append(block)
+                block['end'] = offset
+                block['lines'] += 1
+                block['t0'] = min(block['t0'], entry['time'])
+                block['t1'] = max(block['t1'], entry['time'])
+                if entry['levelno'] not in block['levels']:
+                    block['levels'].append(entry['levelno'])
+                if entry.get('camera') is not None and entry['camera'] not in block['cameras']:
+                    block['cameras'].append(entry['camera'])
+                added += 1
+                if block['lines'] >= BLOCK_LINES:
+                    block = None
+        self.size = offset
+        return added
+
+    def candidate_blocks(self, start=None, end=None, min_level=None, camera=None, after=0):
+        """Блоки, в которых могут быть подходящие строки (по порядку файла)"""
+        with self._lock:
+            blocks = list(self.blocks)
+        for block in blocks:
+            if block['end'] <= after:
+                continue
+            if start is not None and block['t1'] < start:
+                continue
+            if end is not None and block['t0'] > end:
+                continue
+            if min_level is not None and max(block['levels']) < min_level:
+                continue
+            if camera is not None and camera not in block['cameras']:
+                continue
+            yield block
+
+    def query(self, start=None, end=None, min_level=None, camera=None, text=None,
+              limit=DEFAULT_LIMIT, after=0):
+        """
+        Записи по порядку времени записи в файл. Возвращает (записи, курсор): курсор — смещение,
+        с которого продолжать (after), или None, если подходящих записей больше нет.
+        """
+        limit = max(1, min(int(limit), MAX_LIMIT))
+        text = text.lower() if text else None
+        self.refresh()
+        entries = []
+        with open(self.path, "rb") as f:
+            for block in self.candidate_blocks(start, end, min_level, camera, after):
+                offset = max(block['offset'], after)
+                f.seek(offset)
+                for raw in f.read(block['end'] - offset).splitlines(keepends=True):
+                    offset += len(raw)
+                    try:
+                        entry = json.loads(raw)
+                    except ValueError:
+                        continue
+                    if not _matches(entry, start, end, min_level, camera, text):
+                        continue
+                    entries.append(entry)
+                    if len(entries) >= limit:
+                        return entries, offset
+        return entries, None
+
+
+class ArchivedDay:
+    """
+    День, сжатый при ротации: индекса нет, архивы читаются потоково от начала. Курсор — смещение
+    в распакованном тексте (по всем архивам дня подряд), как у DayIndex — смещение в файле.
+    """
+
+    archived = True
+
+    def __init__(self, paths):
+        self.paths = paths
+
+    def query(self, start=None, end=None, min_level=None, camera=None, text=None,
+              limit=DEFAULT_LIMIT, after=0):
+        limit = max(1, min(int(limit), MAX_LIMIT))
+        text = text.lower() if text else None
+        entries = []
+        offset = 0
+        for path in self.paths:
+            with open_log(path) as f:
+                for raw in f:
+                    offset += len(raw)
+                    if offset <= after or not raw.endswith(b"\n"):
+                        continue
+                    try:
+                        entry = json.loads(raw)
+                    except ValueError:
+                        continue
+                    if not _matches(entry, start, end, min_level, camera, text):
+                        continue
+                    entries.append(entry)
+                    if len(entries) >= limit:
+                        return entries, offset
+        return entries, None
+
+
+def _matches(entry, start, end, min_level, camera, text):
+    if start is not None and entry['time'] < start:
+        return False
+    if end is not None and entry['time'] > end:
+        return False
+    if min_level is not None and entry['levelno'] < min_level:
+        return False
+    if camera is not None and entry.get('camera') != camera:
+        return False
+    if text is not None and text not in entry['message'].lower():
+        return False
+    return True
+
+
+class LogIndexer:
+    """Индексы всех несжатых файлов .jsonl; фоновый поток держит индекс текущего дня свежим"""
+
+    def __init__(self, logs_dir=LOGS_DIR, index_dir=INDEX_DIR, interval=CHECK_INTERVAL):
+        self.logs_dir = logs_dir
+        self.index_dir = index_dir
+        self.interval = interval
+        self._days = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="log-indexer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def day(self, date):
+        """
+        DayIndex файла дня date (YYYY-MM-DD); ArchivedDay, если день уже сжат при ротации;
+        None, если лога за этот день нет
+        """
+        datetime.date.fromisoformat(date)  # ValueError для кривой даты
+        path = os.path.join(self.logs_dir, date + JSON_SUFFIX)
+        with self._lock:
+            if not os.path.exists(path):
+                self._days.pop(date, None)
+                archives = self.archives(date)
+                return ArchivedDay(archives) if archives else None
+            if date not in self._days:
+                os.makedirs(self.index_dir, exist_ok=True)
+                self._days[date] = DayIndex(path, os.path.join(self.index_dir, date + ".json"))
+            return self._days[date]
+
+    def archives(self, date):
+        """Сжатые файлы дня: YYYY-MM-DD.jsonl.zip (и YYYY-MM-DD.<время>.jsonl.zip при повторной ротации)"""
+        if not os.path.exists(self.logs_dir):
+            return []
+        return sorted(os.path.join(self.logs_dir, fname) for fname in os.listdir(self.logs_dir)
+                      if fname.startswith(date) and fname.endswith(ARCHIVE_SUFFIX))
+
+    def refresh_all(self):
+        if not os.path.exists(self.logs_dir):
+            return
+        dates = sorted(f[:-len(JSON_SUFFIX)] for f in os.listdir(self.logs_dir) if f.endswith(JSON_SUFFIX))
+        for date in dates:
+            try:
+                index = self.day(date)
+                if index is not None:
+                    index.refresh()
+            except (OSError, ValueError) as e:
+                logger.error(f"Log indexing failed for {date}: {e}")
+        self._prune(set(dates))
+
+    def _prune(self, dates):
+        """Удалить индексы файлов, которых уже нет (удалены или сжаты при ротации)"""
+        if not os.path.exists(self.index_dir):
+            return
+        for fname in os.listdir(self.index_dir):
+            if fname.endswith(".json") and fname[:-5] not in dates:
+                os.remove(os.path.join(self.index_dir, fname))
+                with self._lock:
+                    self._days.pop(fname[:-5], None)
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = time.monotonic()
+            self.refresh_all()
+            self._stop.wait(max(0.0, self.interval - (time.monotonic() - started)))
@@ -0,0 +1,110 @@
+import os
+import re
+
+# Чтение текстового лога с конца: файл читается блоками от конца к началу, пока не набрано
+# нужное число подходящих строк. Стоимость запроса зависит от числа строк, а не от размера файла.
+# Курсор — байтовое смещение начала строки: следующая страница читается строго до него.
+BLOCK_SIZE = 64 * 1024
+MAX_SCAN_BYTES = 32 * 1024 * 1024  # за один запрос; дальше — частичный ответ с курсором
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+# Формат файла из logger.py: "YYYY-MM-DD HH:mm:ss | LEVEL    | message"
+CAMERA_RE = re.compile(r"\[CAM(\d+)\]")
+
+
+def parse_line(line):
+    """(время, уровень, сообщение) или None для строк без шапки (продолжение traceback)"""
+    parts = line.split('|', 2)
+    if len(parts) < 3:
+        return None
+    return parts[0].strip(), parts[1].strip().upper(), parts[2].strip()
+
+
+def line_camera(message):
+    """Номер камеры из префикса [CAMn] сообщения или None"""
+    match = CAMERA_RE.search(message)
+    return int(match.group(1)) if match else None
+
+
+class LogFilter:
+    """Фильтр строк: уровень (точное совпадение), камера, подстрока без учёта регистра"""
+
+    def __init__(self, level=None, camera=None, text=None):
+        self.level = level.upper() if level else None
+        self.camera = camera
+        self.text = text.lower() if text else None
+        # Дешёвая проверка по байтам до декодирования строки
+        self._camera_tag = f"[CAM{camera}]".encode() if camera is not None else None
+
+    @property
+    def empty(self):
+        return self.level is None and self.camera is None and self.text is None
+
+    def quick_reject(self, raw):
+        return self._camera_tag is not None and self._camera_tag not in raw
+
+    def matches(self, line):
+        if self.empty:
+            return True
+        parsed = parse_line(line)
+        if parsed is None:
+            return False
+        _, level, message = parsed
+        if self.level is not None and level != self.level:
+            return False
+        if self.camera is not None and line_camera(message) != self.camera:
+            return False
+        if self.text is not None and self.text not in message.lower():
+            return False
+        return True
+
+
+def reverse_lines(f, end, block_size=BLOCK_SIZE):
+    """(смещение начала, байты) строк файла, начинающихся до end, от последней к первой"""
+    pos = end
+    head = b""
+    while pos > 0:
+        size = min(block_size, pos)
+        pos -= size
+        f.seek(pos)
+        chunk = f.read(size) + head
+        lines = chunk.split(b"\n")
+        # Первая строка блока может начинаться в предыдущем блоке — доберём её на следующем шаге
+        head = lines[0]
+        offset = pos + len(chunk)
+        for line in reversed(lines[1:]):
+            start = offset - len(line)
+            yield start, line
+            offset = start - 1
+    if head:
+        yield 0, head
+
+
+def tail(path, limit=DEFAULT_LIMIT, before=None, log_filter=None, max_scan=MAX_SCAN_BYTES):
+    """
+    Последние limit подходящих строк файла до смещения before (по умолчанию — до конца).
+    Возвращает (строки от старых к новым, курсор): курсор — смещение для следующей страницы
+    или None, если начало файла достигнуто.
+    """
+    log_filter = log_filter or LogFilter()
+    limit = max(1, min(int(limit), MAX_LIMIT))
+    size = os.path.getsize(path)
+    end = size if before is None else max(0, min(int(before), size))
+    lines = []
+    cursor = None
+    with open(path, "rb") as f:
+        for start, raw in reverse_lines(f, end):
+            if end - start > max_scan:
+                cursor = start + len(raw) + 1  # эту строку ещё не смотрели
+                break
+            if not raw.strip() or log_filter.quick_reject(raw):
+                continue
+            line = raw.decode("utf-8", errors="ignore").strip()
+            if log_filter.matches(line):
+                lines.append(line)
+                if len(lines) >= limit:
+                    cursor = start if start > 0 else None
+                    break
+    lines.reverse()
+    return lines, cursor
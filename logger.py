@@ -1,12 +1,16 @@
 # logger.py
 import os
 import sys
+import json
 import datetime
 from collections import defaultdict
 
 import cv2
 from loguru import logger
 
+from config import JSON_LOGS
+from log_reader import line_camera
+
 
 LOGS_DIR = "logs"
 os.makedirs(LOGS_DIR, exist_ok=True)
@@ -36,6 +40,39 @@ logger.add(
     format="{time:YYYY-MM-DD HH:mm:ss} | {level:<8} | {message}",
 )
 
+
+def _json_format(record):
+    """Запись лога одной строкой JSON со всеми полями bind() (камера — отдельным полем)"""
+    extra = {k: v for k, v in record["extra"].items() if k != "json"}
+    camera = extra.pop("cam", None)
+    entry = {
+        "time": round(record["time"].timestamp(), 3),
+        "level": record["level"].name,
+        "levelno": record["level"].no,
+        "camera": camera if camera is not None else line_camera(record["message"]),
+        "message": record["message"],
+        "module": record["name"],
+        "extra": extra,
+    }
+    if record["exception"] is not None and record["exception"].type is not None:
+        entry["exception"] = f"{record['exception'].type.__name__}: {record['exception'].value}"
+    # Готовая строка кладётся в extra: скобки JSON не должны разбираться как поля формата
+    record["extra"]["json"] = json.dumps(entry, ensure_ascii=False, default=str)
+    return "{extra[json]}\n"
+
+
+# Файл JSON Lines — те же ротация и хранение; по нему строится индекс (log_index.py)
+if JSON_LOGS:
+    logger.add(
+        os.path.join(LOGS_DIR, "{time:YYYY-MM-DD}.jsonl"),
+        rotation="00:00",
+        retention="30 days",
+        compression="zip",
+        encoding="utf-8",
+        enqueue=True,
+        format=_json_format,
+    )
+
 class MotionLogger:
     """Фасад поверх loguru + счётчики объектов/ID."""
     def __init__(self):
@@ -123,7 +160,7 @@ class MotionLogger:
         now = datetime.datetime.now()
         try:
             for fname in os.listdir(LOGS_DIR):
-                if not (fname.endswith(".log") or fname.endswith(".zip")):
+                if not fname.endswith((".log", ".jsonl", ".zip")):
                     continue
                 path = os.path.join(LOGS_DIR, fname)
                 age_days = (now - datetime.datetime.fromtimestamp(os.path.getmtime(path))).days
@@ -0,0 +1,216 @@
+import os
+import struct
+
+import cv2
+
+# Запись AVI (MJPEG) из готовых JPEG-кадров — без перекодирования и без VideoWriter.
+# Каждый кадр MJPEG — ключевой, поэтому файл можно закончить на любом кадре.
+AVIF_HASINDEX = 0x10
+AVIIF_KEYFRAME = 0x10
+JPEG_QUALITY = 80
+_HEADER_SIZE = 224  # RIFF + hdrl (avih, strl: strh, strf) + заголовок LIST movi
+
+
+def _chunk(fourcc, data):
+    pad = b"\0" if len(data) % 2 else b""
+    return fourcc + struct.pack("<I", len(data)) + data + pad
+
+
+def avi_header(fps, size, frames, max_frame, movi_size, riff_size=0):
+    """Заголовок MJPEG AVI (до данных 'movi'); movi_size — размер списка movi без 8 байт заголовка"""
+    w, h = size
+    scale, rate = 1000, int(round(fps * 1000))
+    usec = int(round(1e6 / fps))
+    avih = struct.pack("<14I", usec, int(max_frame * fps), 0, AVIF_HASINDEX,
+                       frames, 0, 1, max_frame, w, h, 0, 0, 0, 0)
+    strh = (b"vids" + b"MJPG" + struct.pack("<IHHIIIIIIiI", 0, 0, 0, 0, scale, rate, 0,
+                                             frames, max_frame, -1, 0)
+            + struct.pack("<4h", 0, 0, w, h))
+    strf = struct.pack("<IiiHH4sIiiII", 40, w, h, 1, 24, b"MJPG", w * h * 3, 0, 0, 0, 0)
+    strl = b"LIST" + struct.pack("<I", 4 + len(_chunk(b"strh", strh)) + len(_chunk(b"strf", strf))) \
+        + b"strl" + _chunk(b"strh", strh) + _chunk(b"strf", strf)
+    hdrl_body = b"hdrl" + _chunk(b"avih", avih) + strl
+    hdrl = b"LIST" + struct.pack("<I", len(hdrl_body)) + hdrl_body
+    header = (b"RIFF" + struct.pack("<I", riff_size) + b"AVI " + hdrl
+              + b"LIST" + struct.pack("<I", movi_size) + b"movi")
+    assert len(header) == _HEADER_SIZE
+    return header
+
+
+def avi_index(entries):
+    """Чанк idx1 по [(смещение от 'movi', размер)]"""
+    return _chunk(b"idx1", b"".join(struct.pack("<4sIII", b"00dc", AVIIF_KEYFRAME, offset, size)
+                                    for offset, size in entries))
+
+
+def avi_file_size(sizes):
+    """Размер файла MJPEG AVI (заголовок, кадры, idx1) по размерам JPEG-кадров"""
+    return _HEADER_SIZE + sum(8 + s + (s % 2) for s in sizes) + 8 + 16 * len(sizes)
+
+
+def stream_avi(frames, fps, size, sizes=None):
+    """
+    Потоковая сборка MJPEG AVI: генератор байтов по итератору JPEG-кадров, без файла на диске.
+    sizes — размеры всех кадров заранее (тогда заголовок точный: число кадров, размеры RIFF/movi);
+    без них размеры в заголовке нулевые (VLC/ffmpeg читают такой файл по idx1 в конце).
+    """
+    if sizes is not None:
+        movi_size = 4 + sum(8 + s + (s % 2) for s in sizes)
+        yield avi_header(fps, size, len(sizes), max(sizes, default=0), movi_size, avi_file_size(sizes) - 8)
+    else:
+        yield avi_header(fps, size, 0, 0, 0)
+    index = []
+    offset = 4
+    for jpeg in frames:
+        chunk = _chunk(b"00dc", jpeg)
+        index.append((offset, len(jpeg)))
+        offset += len(chunk)
+        yield chunk
+    yield avi_index(index)
+
+
+class AviInfo:
+    """Разбор AVI-файла: кодек, частота, размер кадра и положение кадров (по idx1 или по movi)"""
+
+    def __init__(self, path):
+        self.path = path
+        self.codec = None
+        self.fps = 0.0
+        self.size = (0, 0)
+        self.frames = []          # [(абсолютное смещение данных кадра, размер)]
+        with open(path, "rb") as f:
+            self._parse(f)
+
+    @property
+    def is_mjpeg(self):
+        return (self.codec or "").upper() == "MJPG"
+
+    def _parse(self, f):
+        riff = f.read(12)
+        if len(riff) < 12 or riff[:4] != b"RIFF" or riff[8:12] != b"AVI ":
+            raise ValueError(f"Not an AVI file: {self.path}")
+        file_size = os.fstat(f.fileno()).st_size
+        movi = None
+        index = None
+        pos = 12
+        while pos + 8 <= file_size:
+            f.seek(pos)
+            fourcc, size = struct.unpack("<4sI", f.read(8))
+            if fourcc == b"LIST":
+                kind = f.read(4)
+                if kind == b"hdrl":
+                    self._parse_hdrl(f.read(size - 4))
+                elif kind == b"movi":
+                    movi = (pos + 8, size)
+            elif fourcc == b"idx1":
+                index = f.read(size)
+            if size == 0 and fourcc == b"LIST":
+                break  # незакрытый файл: movi до конца
+            pos += 8 + size + (size % 2)
+        if movi is None:
+            return
+        movi_fourcc = movi[0]
+        if index:
+            entries = [struct.unpack_from("<4sIII", index, i) for i in range(0, len(index) - 15, 16)]
+            entries = [(offset, size) for ckid, _, offset, size in entries if ckid[2:] in (b"dc", b"db")]
+            # Смещения бывают от 'movi' (обычно) или от начала файла
+            base = 0 if entries and entries[0][0] >= movi_fourcc else movi_fourcc
+            self.frames = [(base + offset + 8, size) for offset, size in entries if size]
+        else:
+            # Без idx1 (файл ещё пишется) — кадры по порядку до конца файла
+            self._scan_movi(f, movi_fourcc + 4, file_size)
+
+    def _parse_hdrl(self, data):
+        pos = 0
+        while pos + 8 <= len(data):
+            fourcc, size = struct.unpack_from("<4sI", data, pos)
+            body = data[pos + 8:pos + 8 + size]
+            if fourcc == b"avih":
+                usec, = struct.unpack_from("<I", body, 0)
+                w, h = struct.unpack_from("<II", body, 32)
+                self.fps = 1e6 / usec if usec else 0.0
+                self.size = (w, h)
+            elif fourcc == b"LIST":
+                self._parse_hdrl(body[4:])
+                pos += 8 + size + (size % 2)
+                continue
+            elif fourcc == b"strh" and body[:4] == b"vids":
+                self.codec = body[4:8].decode("ascii", "replace")
+                scale, rate = struct.unpack_from("<II", body, 20)
+                if scale and rate:
+                    self.fps = rate / scale
+            pos += 8 + size + (size % 2)
+
+    def _scan_movi(self, f, pos, end):
+        while pos + 8 <= end:
+            f.seek(pos)
+            fourcc, size = struct.unpack("<4sI", f.read(8))
+            if pos + 8 + size > end:
+                break  # кадр дописан не полностью
+            if fourcc[2:] in (b"dc", b"db") and size:
+                self.frames.append((pos + 8, size))
+            pos += 8 + size + (size % 2)
+
+
+def encode_jpeg(frame, quality=JPEG_QUALITY):
+    ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("JPEG encoding failed")
+    return buf.tobytes()
+
+
+class MJPEGAviWriter:
+    """
+    Потоковая запись MJPEG AVI. write() принимает JPEG-байты (пишутся как есть)
+    или кадр numpy (кодируется в JPEG). Интерфейс как у cv2.VideoWriter: write/release.
+    """
+
+    def __init__(self, path, fps, size, quality=JPEG_QUALITY):
+        self.path = path
+        self.fps = fps
+        self.size = size
+        self.quality = quality
+        self.frames = 0
+        self._index = []          # (смещение от 'movi', размер)
+        self._max_frame = 0
+        self._last_frame = None   # повтор того же кадра не кодируется заново
+        self._last_jpeg = None
+        self._file = open(path, "wb")
+        self._file.write(self._header())
+        self._movi_start = self._file.tell() - 4  # смещения idx1 считаются от fourcc 'movi'
+
+    def isOpened(self):
+        return self._file is not None
+
+    def _header(self):
+        movi_size = 4 + sum(8 + size + (size % 2) for _, size in self._index)
+        return avi_header(self.fps, self.size, self.frames, self._max_frame, movi_size)
+
+    def write(self, frame):
+        """Записать кадр: JPEG-байты или numpy-массив"""
+        if isinstance(frame, (bytes, bytearray, memoryview)):
+            jpeg = bytes(frame)
+        elif frame is self._last_frame:
+            jpeg = self._last_jpeg
+        else:
+            jpeg = encode_jpeg(frame, self.quality)
+            self._last_frame, self._last_jpeg = frame, jpeg
+        offset = self._file.tell() - self._movi_start
+        self._file.write(_chunk(b"00dc", jpeg))
+        self._index.append((offset, len(jpeg)))
+        self._max_frame = max(self._max_frame, len(jpeg))
+        self.frames += 1
+
+    def release(self):
+        """Дописать индекс и заголовки; файл остаётся корректным AVI"""
+        if self._file is None:
+            return
+        self._file.write(avi_index(self._index))
+        riff_size = self._file.tell() - 8
+        self._file.seek(0)
+        self._file.write(self._header())
+        self._file.seek(4)
+        self._file.write(struct.pack("<I", riff_size))
+        self._file.close()
+        self._file = None
+        self._last_frame = self._last_jpeg = None
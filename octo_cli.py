@@ -1,21 +1,28 @@
 import cv2
 import time
 import os
-import queue
 import threading
 import datetime
-from motion_detection import detect_motion, draw_motion_visualization
+from motion_detection import detect_motion
 from camera_utils import (
     initialize_cameras, release_cameras, create_video_grid,
     get_no_signal_frame, get_waiting_frame,
-    MultiMaskCreator, load_mask, overlay_mask,load_lbph_face_recognizer
+    MultiMaskCreator, load_mask, load_lbph_face_recognizer
 )
 from view_logs import view_logs
 from script_save import sv
-from camera_utils import detect_and_recognize_faces, detect_faces_only
+from camera_utils import detect_and_recognize_faces, detect_faces_only, annotate_face_boxes, TARGET_FPS
+from face_detection import DNNFaceDetector, scale_face_boxes
+from recorder import RecorderPool, segment_key, SEGMENT_SECONDS
+from recordings_index import RecordingsIndex, default_index_path, _format_row
+from retention import RetentionManager
+from activity import recording_activity
+from transcoder import Transcoder
+from events import bus
+from overlays import frame_meta, render_base, render_overlay
 from logger import motion_logger
 from loguru import logger
-from config import CAMERA_INDICES, SYSTEM
+from config import CAMERA_INDICES, SYSTEM, FACE_DETECTOR_BACKEND, TRANSCODE_ENABLED
 
 
 print(r"""________  ____________________________        /\ __________.___                   
@@ -33,8 +40,15 @@ class SurveillanceSystem:
         self.recognizer = None
         self.label_dict = None
         self.face_cascade = None
+        # Модель распознавания подменяется на лету после фонового обучения
+        self.face_model_lock = threading.Lock()
         self.masks = {}  # {camera_idx: mask}
 
+        # Детектор лиц: 'haar' или 'dnn' (один forward на все камеры за тик)
+        self.FACE_BACKEND = FACE_DETECTOR_BACKEND
+        self.dnn_detector = None
+        self.dnn_face_boxes = {}
+
         # Состояние камер
         self.motion_detected = {idx: False for idx in self.camera_indices}
         self.prev_frames = {idx: None for idx in self.camera_indices}
@@ -49,6 +63,7 @@ class SurveillanceSystem:
         self.camera_motion = []
         # --- НОВОЕ ---
         self.camera_recording = [] # Камеры, на которых включена запись по событию
+        self.camera_continuous = []  # Камеры с непрерывной записью кусками (события — отрезки в ней)
         # --- /НОВОЕ ---
         self.MOTION_TIMEOUT = 10
         self.MOTION_TIMEOUTS = {idx: 10 for idx in self.camera_indices}
@@ -62,14 +77,36 @@ class SurveillanceSystem:
         self.mask_creator = MultiMaskCreator()
 
         # --- НОВОЕ (для записи видео) ---
-        self.video_writers = {}
-        self.recording_start_time = {}
-        self.frame_queues = {}
-        self.recording_threads = {}
-        self.VIDEO_DURATION = 5  # секунд
-        self.FPS = 20
+        # Файлы пишутся в пуле потоков; цикл камер только ставит команды в очередь
         self.VIDEO_DIR = "recordings"
         os.makedirs(self.VIDEO_DIR, exist_ok=True)
+        # Индекс записей (SQLite) заполняется потоками записи при открытии и закрытии файлов
+        self.recordings_index = RecordingsIndex(default_index_path(self.VIDEO_DIR))
+        self.recorder = RecorderPool(index=self.recordings_index)
+        # Квоты хранения (config.RETENTION_*): старые записи удаляются в фоне
+        self.retention = RetentionManager(self.recordings_index, self.VIDEO_DIR)
+        # Закрытые MJPEG-записи перекодируются в фоне, пока цикл камер успевает
+        self.loop_time = 0.0
+        self.transcoder = Transcoder(self.recordings_index, load=lambda: self.loop_time,
+                                     frame_interval=1.0 / TARGET_FPS)
+        self.recording_start_time = {}
+        self.open_events = {}  # {camera_idx: (событие, начало)} — события непрерывной записи
+        self.event_activity = {}  # {camera_idx: [пик движения, {лица}]} открытого события
+        self.recognized_faces = {}  # {camera_idx: [имена]} на текущем кадре
+        self.face_counts = {}  # {camera_idx: число лиц} на текущем кадре
+        self.fps_counters = {}  # {camera_idx: [кадров, начало окна]} — для FPS в веб-интерфейсе
+        self.face_events = {}  # {(camera_idx, имя): время} последнего события «лицо распознано»
+        self.FACE_EVENT_COOLDOWN = 10  # секунд между событиями об одном и том же лице
+        # Подписи (боксы, лица, время) — метаданные кадра; рисовать ли их в самих пикселях
+        # (окно CLI — да; веб рисует их в браузере, см. OVERLAY_MODE)
+        self.burn_overlays = True
+        self.frame_seq = {}  # {camera_idx: номер последнего кадра}
+        self.frame_meta = {}  # {camera_idx: метаданные последнего кадра}
+        self.face_details = {}  # {camera_idx: [{'box', 'name', 'confidence'}]} на текущем кадре
+        self.VIDEO_DURATION = 5  # секунд без кадров, после которых файл закрывается
+        self.SEGMENT_SECONDS = SEGMENT_SECONDS
+        self.EVENT_PREROLL = 0  # секунд до события, включаемых в его отрезок
+        self.FPS = TARGET_FPS  # частота файла; реальные кадры раскладываются по времени захвата
         # --- /НОВОЕ ---
 
     def main_menu(self):
@@ -103,55 +140,83 @@ class SurveillanceSystem:
                 logger.warning("Invalid choice")
 
     def view_event_videos(self):
-        """Просмотр видео событий из папки recordings"""
-        if not os.path.exists(self.VIDEO_DIR):
-            logger.warning("No recordings folder found")
-            logger.warning("No recordings found")
-            input("Press Enter to continue")
-            return
+        """Просмотр видео событий по индексу записей (постранично, с фильтром по камере)"""
+        page_size = 20
+        page = 0
+        camera = None
 
         print("\nEvent Videos")
-        video_files = []
-        file_paths = []
-
-        # Собираем все .avi файлы
-        for root, dirs, files in os.walk(self.VIDEO_DIR):
-            for file in files:
-                if file.lower().endswith('.avi'):
-                    full_path = os.path.join(root, file)
-                    relative_path = os.path.relpath(full_path, self.VIDEO_DIR)
-                    video_files.append(relative_path)
-                    file_paths.append(full_path)
-
-        if not video_files:
-            logger.warning("No video files found")
-            input("Press Enter to continue")
-            return
-
+        usage = self.retention.usage()
+        days = usage['days_remaining']
+        print(f"Recordings: {usage['total_bytes'] / 1024 ** 3:.1f} GB, "
+              f"free for recordings: {(usage['limit_bytes'] - usage['total_bytes']) / 1024 ** 3:.1f} GB"
+              + (f", ~{days} day(s) at current rate" if days is not None else ""))
         while True:
-            print(f"\nFound {len(video_files)} video(s):")
-            for i, vid in enumerate(video_files, 1):
-                print(f"{i}. {vid}")
+            rows, total = self.recordings_index.query(camera=camera, limit=page_size, offset=page * page_size)
+            if total == 0:
+                print("No recordings in index (use 'r' to rebuild it from the recordings folder)")
+            else:
+                pages = (total + page_size - 1) // page_size
+                print(f"\nFound {total} recording(s), page {page + 1}/{pages}:")
+                for i, row in enumerate(rows, 1):
+                    print(f"{i}. {_format_row(row)}")
 
-            print("\nEnter number to play video, or 'q' to exit:")
+            print("\nEnter number to play video, 'a<number>' - play from first motion, "
+                  "'n'/'p' - next/previous page, 'c' - filter by camera, 'r' - rebuild index, or 'q' to exit:")
             choice = input("  ").strip()
 
             if choice == 'q':
                 break
+            if choice == 'n':
+                if (page + 1) * page_size < total:
+                    page += 1
+                continue
+            if choice == 'p':
+                page = max(0, page - 1)
+                continue
+            if choice == 'c':
+                value = input("Camera index (empty - all cameras): ").strip()
+                camera = int(value) if value.isdigit() else None
+                page = 0
+                continue
+            if choice == 'r':
+                print(f"Indexed {self.recordings_index.rebuild(self.VIDEO_DIR)} recording(s)")
+                page = 0
+                continue
 
             try:
-                idx = int(choice) - 1
-                if idx < 0 or idx >= len(file_paths):
+                to_activity = choice.startswith('a')
+                idx = int(choice[1:] if to_activity else choice) - 1
+                if idx < 0 or idx >= len(rows):
                     logger.error("Invalid selection")
                     continue
 
-                video_path = file_paths[idx]
-                print(f"Playing: {video_path}")
+                row = rows[idx]
+                offset = 0
+                if row['path'] is None:
+                    # Событие непрерывной записи: воспроизводится первый покрывающий его кусок
+                    if not row['segments']:
+                        logger.error("Event has no segments")
+                        continue
+                    video_path = row['segments'][0]['file']
+                    offset = row['segments'][0]['offset']
+                else:
+                    video_path = row['path']
+                if to_activity:
+                    # Переход к первому отрезку активности по .activity.npy
+                    ranges = recording_activity(self.recordings_index, row)
+                    if ranges:
+                        video_path, offset = ranges[0]['file'], ranges[0]['offset']
+                    else:
+                        print("No motion recorded, playing from the start")
+                print(f"Playing: {video_path}" + (f" from {offset:.0f}s" if offset else ""))
 
                 cap = cv2.VideoCapture(video_path)
                 if not cap.isOpened():
                     logger.error("Cannot open video file")
                     continue
+                if offset:
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, int(offset * (cap.get(cv2.CAP_PROP_FPS) or self.FPS)))
 
                 cv2.namedWindow("Event Video Playback", cv2.WINDOW_NORMAL)
                 while True:
@@ -191,6 +256,13 @@ class SurveillanceSystem:
             self.label_dict = None
             self.face_cascade = None
 
+        if self.FACE_BACKEND == "dnn":
+            self.dnn_detector = DNNFaceDetector.load(max_batch=len(self.camera_indices))
+            if self.dnn_detector is None:
+                logger.warning("DNN face detector unavailable, falling back to Haar cascade")
+                self.FACE_BACKEND = "haar"
+            else:
+                motion_logger.log_system_event("DNN face detector loaded")
 
         # Инициализация камер
         self.caps = initialize_cameras(self.camera_indices)
@@ -207,6 +279,7 @@ class SurveillanceSystem:
                 'cameras_faces': self.camera_faces,
                 'cameras_motion': self.camera_motion,
                 'cameras_recording': self.camera_recording,
+                'cameras_continuous': self.camera_continuous,
                 'cameras_triggered': self.camera_triggered,
                 'timeouts': self.MOTION_TIMEOUTS,
                 'threshold': self.MOTION_THRESHOLD,
@@ -215,6 +288,9 @@ class SurveillanceSystem:
             }
             motion_logger.log_settings(settings)
 
+        self.retention.start()
+        if TRANSCODE_ENABLED:
+            self.transcoder.start()
         motion_logger.log_system_event("System initialized")
 
     def load_all_masks(self):
@@ -265,6 +341,13 @@ class SurveillanceSystem:
             self.camera_recording = []
         # --- /НОВОЕ ---
 
+        print(f"\nEnter camera numbers for continuous recording ({self.SEGMENT_SECONDS // 60}-minute segments):")
+        print("Available cameras:", self.camera_indices)
+        try:
+            self.camera_continuous = list(map(int, input("  ").split()))
+        except Exception:
+            self.camera_continuous = []
+
         print("\nEnter camera numbers that activate only on motion:")
         print("Available cameras:", self.camera_indices)
         try:
@@ -296,6 +379,7 @@ class SurveillanceSystem:
             'cameras_motion': self.camera_motion,
             # --- НОВОЕ ---
             'cameras_recording': self.camera_recording,
+            'cameras_continuous': self.camera_continuous,
             # --- /НОВОЕ ---
             'cameras_triggered': self.camera_triggered,
             'timeouts': self.MOTION_TIMEOUTS,   # <-- changed
@@ -311,8 +395,13 @@ class SurveillanceSystem:
         if camera_idx not in self.camera_recording:
             return # Камера не настроена для записи по событию
 
+        # При непрерывной записи событие — отрезок в ней, а не отдельный файл
+        if camera_idx in self.camera_continuous:
+            self.begin_event(camera_idx, event_name)
+            return
+
         # Если запись уже идёт, не запускаем новую
-        if camera_idx in self.video_writers:
+        if self.recorder.is_recording(camera_idx):
             # Обновляем время начала, чтобы продлить запись
             self.recording_start_time[camera_idx] = time.time()
             return
@@ -328,75 +417,160 @@ class SurveillanceSystem:
         filename = f"recording_{now.strftime('%H-%M-%S')}.avi"
         filepath = os.path.join(camera_dir, filename)
 
-        # Подготовка VideoWriter
-        fourcc = cv2.VideoWriter_fourcc(*'XVID')
-        writer = cv2.VideoWriter(filepath, fourcc, self.FPS, (initial_frame.shape[1], initial_frame.shape[0]))
-        
-        # Инициализация очереди и добавление первого кадра
-        frame_queue = queue.Queue()
-        frame_queue.put(initial_frame)
-
-        # Сохранение объектов
-        self.video_writers[camera_idx] = writer
+        # VideoWriter открывается в потоке записи, первый кадр пишется туда же
+        size = (initial_frame.shape[1], initial_frame.shape[0])
+        self.recorder.start(camera_idx, filepath, 'XVID', self.FPS, size,
+                            frames=[(time.time(), initial_frame.copy())], idle_timeout=self.VIDEO_DURATION,
+                            event=event_name)
         self.recording_start_time[camera_idx] = time.time()
-        self.frame_queues[camera_idx] = frame_queue
-
-        # Запуск потока записи
-        recording_thread = threading.Thread(target=self._write_video_thread, args=(camera_idx,))
-        recording_thread.daemon = True
-        recording_thread.start()
-        self.recording_threads[camera_idx] = recording_thread
 
         motion_logger.log_system_event(f"Started recording for camera {camera_idx} on event '{event_name}' -> {filepath}")
 
 
-    def stop_recording(self, camera_idx):
-        """Останавливает запись видео для указанной камеры."""
-        if camera_idx in self.video_writers:
-            # Добавляем специальный сигнал в очередь для остановки потока
-            self.frame_queues[camera_idx].put(None)
-            
-            # Ждем завершения потока
-            if camera_idx in self.recording_threads:
-                self.recording_threads[camera_idx].join()
-                del self.recording_threads[camera_idx]
-
-            # Освобождаем VideoWriter
-            self.video_writers[camera_idx].release()
-            del self.video_writers[camera_idx]
-            del self.recording_start_time[camera_idx]
-            del self.frame_queues[camera_idx]
+    def begin_event(self, camera_idx, event_name="motion_detected", start_time=None):
+        """Начало события в непрерывной записи (start_time — с учётом презаписи)"""
+        start_time = start_time or time.time() - self.EVENT_PREROLL
+        if camera_idx in self.open_events:
+            # Уже открыто — только сдвигаем начало назад, если известна презапись
+            name, start = self.open_events[camera_idx]
+            self.open_events[camera_idx] = (name, min(start, start_time))
+            return
+        self.open_events[camera_idx] = (event_name, start_time)
+        self.event_activity[camera_idx] = [0.0, set()]
+        motion_logger.log_system_event(f"Event '{event_name}' started in continuous recording of camera {camera_idx}")
+
+    def is_event_recording(self, camera_idx):
+        """Идёт запись события: отдельный файл или отрезок непрерывной записи"""
+        return camera_idx in self.open_events or self.recorder.is_recording(camera_idx)
+
+    def record_continuous(self, camera_idx, frame, timestamp=None):
+        """Кадр в непрерывную запись; поток записи открывается/закрывается по настройке камеры"""
+        recording = self.recorder.is_recording(segment_key(camera_idx))
+        if camera_idx not in self.camera_continuous:
+            if recording:
+                self.recorder.stop_segments(camera_idx)
+            return
+        if not recording:
+            size = (frame.shape[1], frame.shape[0])
+            self.recorder.start_segments(camera_idx, self.VIDEO_DIR, self.FPS, size, self.SEGMENT_SECONDS)
+        # Копия не делается: вызывающий не должен менять кадр после передачи
+        self.recorder.write_segment(camera_idx, frame, timestamp)
 
+    def stop_recording(self, camera_idx):
+        """Останавливает запись видео (без ожидания: файл закрывается в потоке записи)."""
+        if camera_idx in self.open_events:
+            event_name, start = self.open_events.pop(camera_idx)
+            peak_motion, faces = self.event_activity.pop(camera_idx, (0.0, ()))
+            self.recorder.add_event(camera_idx, event_name, start, time.time(), peak_motion, faces)
+            motion_logger.log_system_event(f"Event '{event_name}' in continuous recording of camera {camera_idx} finished")
+            return
+        if self.recorder.stop(camera_idx):
+            self.recording_start_time.pop(camera_idx, None)
             motion_logger.log_system_event(f"Recording for camera {camera_idx} stopped")
 
-
-    def _write_video_thread(self, camera_idx):
-        """Поток для записи видео из очереди."""
-        writer = self.video_writers[camera_idx]
-        frame_queue = self.frame_queues[camera_idx]
-        start_time = self.recording_start_time[camera_idx]
-        
-        while True:
-            try:
-                frame = frame_queue.get(timeout=1)
-                if frame is None: # Сигнал остановки
-                    break
-                writer.write(frame)
-            except queue.Empty:
-                # Проверяем, пора ли останавливать запись
-                elapsed = time.time() - start_time
-                if elapsed >= self.VIDEO_DURATION:
-                    break
-                continue
-
-        # Запись завершена
-        writer.release()
-        motion_logger.log_system_event(f"Video file for camera {camera_idx} closed")
+    def note_loop_time(self, seconds):
+        """Сглаженная длительность одного прохода цикла камер"""
+        self.loop_time = 0.8 * self.loop_time + 0.2 * seconds
+
+    def recording_stats(self):
+        """Очередь, отброшенные кадры и задержка записи по камерам"""
+        return self.recorder.stats()
+
+    def publish_state(self, camera_idx, current_time):
+        """Состояние камеры — в шину событий (в веб уходит только изменившееся)"""
+        faces = sorted(set(self.recognized_faces.get(camera_idx, [])))
+        for name in faces:
+            if current_time - self.face_events.get((camera_idx, name), 0) >= self.FACE_EVENT_COOLDOWN:
+                self.face_events[(camera_idx, name)] = current_time
+                bus.publish(camera_idx, 'face_recognized', name=name, time=current_time)
+        counter = self.fps_counters.setdefault(camera_idx, [0, current_time])
+        counter[0] += 1
+        values = {}
+        if current_time - counter[1] >= 1.0:
+            values['fps'] = round(counter[0] / (current_time - counter[1]))
+            self.fps_counters[camera_idx] = [0, current_time]
+        bus.set(camera_idx,
+                motion=bool(self.motion_detected.get(camera_idx)),
+                recording=self.is_event_recording(camera_idx),
+                continuous=self.recorder.is_recording(segment_key(camera_idx)),
+                faces=faces,
+                **values)
+
+    def note_activity(self, camera_idx, frame_area=640 * 480):
+        """Движение (доля площади кадра), объекты и лица текущего кадра — в идущие записи"""
+        faces = self.recognized_faces.pop(camera_idx, [])
+        face_count = self.face_counts.pop(camera_idx, 0)
+        continuous = self.recorder.is_recording(segment_key(camera_idx))
+        if not (self.is_event_recording(camera_idx) or continuous):
+            return
+        contours = self.motion_contours.get(camera_idx) or []
+        motion = min(1.0, sum(cv2.contourArea(c) for c in contours) / frame_area)
+        if motion == 0 and not face_count:
+            return
+        self.recorder.annotate(camera_idx, motion, faces, len(contours), face_count > 0)
+        activity = self.event_activity.get(camera_idx)
+        if activity is not None:
+            activity[0] = max(activity[0], motion)
+            activity[1].update(faces)
     # --- /НОВОЕ ---
 
+    def needs_face_detection(self, camera_idx):
+        """Нужна ли детекция лиц на текущем кадре камеры"""
+        if camera_idx not in self.camera_faces:
+            return False
+        if camera_idx in self.camera_triggered or camera_idx in self.camera_motion:
+            return self.motion_detected[camera_idx]
+        return True
+
+    def detect_faces_batch(self, frames):
+        """Один DNN-проход по кадрам всех камер с детекцией лиц ({camera_idx: frame})"""
+        self.dnn_face_boxes = {}
+        if self.dnn_detector is None:
+            return
+        cams = [idx for idx, frame in frames.items()
+                if frame is not None and self.needs_face_detection(idx)]
+        if not cams:
+            return
+        results = self.dnn_detector.detect_batch([frames[idx] for idx in cams])
+        self.dnn_face_boxes = dict(zip(cams, results))
+
+    def swap_face_model(self, recognizer, label_dict, face_cascade=None):
+        """Атомарная подмена модели распознавания без остановки камер"""
+        with self.face_model_lock:
+            self.recognizer, self.label_dict = recognizer, label_dict
+            if face_cascade is not None and self.face_cascade is None:
+                self.face_cascade = face_cascade
+        motion_logger.log_system_event("Face recognition model reloaded")
+
+    def apply_face_detection(self, camera_idx, display_frame):
+        """Детекция/распознавание лиц выбранным бэкендом"""
+        # Согласованная пара модель/словарь, даже если её сейчас подменяют
+        with self.face_model_lock:
+            recognizer, label_dict = self.recognizer, self.label_dict
+        # Кадр не размечается: лица уходят в метаданные кадра
+        faces_info = self.face_details[camera_idx] = []
+        if self.dnn_detector is not None:
+            # Боксы уже посчитаны пакетно в detect_faces_batch (нормированные координаты)
+            boxes = scale_face_boxes(self.dnn_face_boxes.get(camera_idx, []), display_frame.shape)
+            result = annotate_face_boxes(display_frame, boxes, recognizer, label_dict,
+                                         recognized=self.recognized_faces.setdefault(camera_idx, []),
+                                         faces_info=faces_info, draw=False)
+        elif recognizer is not None:
+            # Модель обучена - распознавание лиц
+            result = detect_and_recognize_faces(
+                recognizer, label_dict, self.face_cascade, display_frame,
+                recognized=self.recognized_faces.setdefault(camera_idx, []),
+                faces_info=faces_info, draw=False
+            )
+        else:
+            # Модель НЕ обучена - только детекция (все лица красные)
+            result = detect_faces_only(display_frame, faces_info=faces_info, draw=False)
+        self.face_counts[camera_idx] = len(result[1])
+        return result
+
     def process_triggered_camera(self, camera_idx, frame, current_time):
+        """Кадр для показа (без подписей — они в метаданных кадра, см. process_camera_frame)"""
         mask = self.masks.get(camera_idx)
-        display_frame = frame.copy()
 
         if self.motion_detected[camera_idx]:
             # Активный режим
@@ -419,7 +593,6 @@ class SurveillanceSystem:
 
             time_since_last_motion = current_time - self.last_motion_time[camera_idx]
             timeout = self.MOTION_TIMEOUTS.get(camera_idx, self.MOTION_TIMEOUT)
-            time_left = int(timeout - time_since_last_motion)
             if time_since_last_motion > timeout:
                 if camera_idx in self.active_motion_cameras:
                     duration = current_time - self.motion_start_time[camera_idx]
@@ -429,34 +602,16 @@ class SurveillanceSystem:
                 self.last_check_time[camera_idx] = current_time
                 motion_logger.log_camera_status(camera_idx, "Transition to standby")
                 # --- НОВОЕ ---
-                if camera_idx in self.video_writers:
+                if self.is_event_recording(camera_idx):
                     self.stop_recording(camera_idx)
                 # --- /НОВОЕ ---
                 return get_waiting_frame(camera_idx)
 
-            display_frame = draw_motion_visualization(frame, [], camera_idx, mask, time_left)
-
             # Face recognition / detection
             if camera_idx in self.camera_faces:
-                if self.recognizer:
-                    # Модель обучена - распознавание лиц
-                    display_frame, face_boxes = detect_and_recognize_faces(
-                        self.recognizer, self.label_dict, self.face_cascade, display_frame
-                    )
-                else:
-                    # Модель НЕ обучена - только детекция (все лица красные)
-                    display_frame, face_boxes = detect_faces_only(display_frame)
-                
-                if face_boxes:
-                    cv2.putText(display_frame, f"Faces: {len(face_boxes)}", (15, 145),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-
-            # Timestamp
-            timestamp = datetime.datetime.now().strftime("%H:%M:%S")
-            cv2.putText(display_frame, timestamp, (10, display_frame.shape[0] - 10),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 0, 0), 2)
+                self.apply_face_detection(camera_idx, frame)
 
-            return display_frame
+            return frame
 
         else:
             # Режим ожидания
@@ -480,29 +635,16 @@ class SurveillanceSystem:
                         motion_logger.log_motion_detected(camera_idx, is_triggered=True)
                         self.active_motion_cameras.add(camera_idx)
                         self.prev_frames[camera_idx] = frame.copy()
-                        display_frame = draw_motion_visualization(frame, [], camera_idx, mask, self.MOTION_TIMEOUT)
-                        timestamp = datetime.datetime.now().strftime("%H:%M:%S")
-                        cv2.putText(display_frame, timestamp, (10, display_frame.shape[0] - 10),
-                                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 0, 0), 2)
-                        return display_frame
+                        return frame
                 self.last_check_time[camera_idx] = current_time
                 self.prev_frames[camera_idx] = frame.copy()
 
-            waiting_frame = get_waiting_frame(camera_idx)
-            if mask is not None:
-                waiting_frame = overlay_mask(waiting_frame, mask)
-
-            # Timestamp на кадре ожидания
-            timestamp = datetime.datetime.now().strftime("%H:%M:%S")
-            cv2.putText(waiting_frame, timestamp, (10, waiting_frame.shape[0] - 10),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 0, 0), 2)
-
-            return waiting_frame
+            return get_waiting_frame(camera_idx)
 
 
     def process_motion_camera(self, camera_idx, frame, current_time):
+        """Кадр для показа; контуры движения — в self.motion_contours (рисуются по метаданным)"""
         mask = self.masks.get(camera_idx)
-        display_frame = frame.copy()
     
         if self.motion_detected[camera_idx]:
             threshold = self.MOTION_THRESHOLDS.get(camera_idx, self.MOTION_THRESHOLD)
@@ -524,7 +666,6 @@ class SurveillanceSystem:
     
             time_since_last_motion = current_time - self.last_motion_time[camera_idx]
             timeout = self.MOTION_TIMEOUTS.get(camera_idx, self.MOTION_TIMEOUT)
-            time_left = int(timeout - time_since_last_motion)
             if time_since_last_motion > timeout:
                 if camera_idx in self.active_motion_cameras:
                     duration = current_time - self.motion_start_time[camera_idx]
@@ -536,33 +677,18 @@ class SurveillanceSystem:
                 self.last_check_time[camera_idx] = current_time
                 motion_logger.log_camera_status(camera_idx, "Transition to standby")
                 # --- НОВОЕ ---
-                if camera_idx in self.video_writers:
+                if self.is_event_recording(camera_idx):
                     self.stop_recording(camera_idx)
                 # --- /НОВОЕ ---
                 return get_waiting_frame(camera_idx)
     
             self.prev_frames[camera_idx] = frame.copy()
-            display_frame = draw_motion_visualization(frame, self.motion_contours[camera_idx], camera_idx, mask, time_left)
     
             # Face recognition / detection
             if camera_idx in self.camera_faces:
-                if self.recognizer:
-                    display_frame, face_boxes = detect_and_recognize_faces(
-                        self.recognizer, self.label_dict, self.face_cascade, display_frame
-                    )
-                else:
-                    display_frame, face_boxes = detect_faces_only(display_frame)
-                
-                if face_boxes:
-                    cv2.putText(display_frame, f"Faces: {len(face_boxes)}", (15, 145),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-    
-            # Timestamp
-            timestamp = datetime.datetime.now().strftime("%H:%M:%S")
-            cv2.putText(display_frame, timestamp, (10, display_frame.shape[0] - 10),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 0, 0), 2)
+                self.apply_face_detection(camera_idx, frame)
     
-            return display_frame
+            return frame
 
         else:
             # Камера ждёт движения
@@ -590,53 +716,19 @@ class SurveillanceSystem:
                         motion_logger.log_motion_summary(camera_idx, objects_info)
                         self.active_motion_cameras.add(camera_idx)
                         self.prev_frames[camera_idx] = frame.copy()
-                        display_frame = draw_motion_visualization(frame, contours, camera_idx, mask, self.MOTION_TIMEOUT)
-                        timestamp = datetime.datetime.now().strftime("%H:%M:%S")
-                        cv2.putText(display_frame, timestamp, (10, display_frame.shape[0] - 10),
-                                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 0, 0), 2)
-                        return display_frame
+                        return frame
 
                 self.last_check_time[camera_idx] = current_time
                 self.prev_frames[camera_idx] = frame.copy()
 
-            waiting_frame = get_waiting_frame(camera_idx)
-            if mask is not None:
-                waiting_frame = overlay_mask(waiting_frame, mask)
-
-            # Timestamp на кадре ожидания
-            timestamp = datetime.datetime.now().strftime("%H:%M:%S")
-            cv2.putText(waiting_frame, timestamp, (10, waiting_frame.shape[0] - 10),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 0, 0), 2)
-
-            return waiting_frame
+            return get_waiting_frame(camera_idx)
 
 
     def process_static_camera(self, camera_idx, frame):
-        display_frame = frame.copy()
-        mask = self.masks.get(camera_idx)
-        if mask is not None:
-            display_frame = overlay_mask(display_frame, mask)
-
         # Face recognition / detection
         if camera_idx in self.camera_faces:
-            if self.recognizer is not None:
-                display_frame, face_boxes = detect_and_recognize_faces(
-                    self.recognizer, self.label_dict, self.face_cascade, display_frame
-                )
-            else:
-                display_frame, face_boxes = detect_faces_only(display_frame)
-            
-            if face_boxes:
-                cv2.putText(display_frame, f"Faces: {len(face_boxes)}",
-                            (15, 145), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 0, 0), 2)
-
-        # Добавляем timestamp
-        timestamp = datetime.datetime.now().strftime("%H:%M:%S")
-        cv2.putText(display_frame, timestamp, 
-                    (10, display_frame.shape[0] - 10), 
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 0, 0), 2)
-
-        return display_frame
+            self.apply_face_detection(camera_idx, frame)
+        return frame
 
 
     def process_camera_frame(self, camera_idx, frame, current_time):
@@ -668,22 +760,43 @@ class SurveillanceSystem:
         if camera_idx in self.camera_triggered and camera_idx in self.camera_motion:
             if self.motion_detected[camera_idx]:
                 # Камера уже активирована → работаем как motion-камера
-                return self.process_motion_camera(camera_idx, frame, current_time)
+                display_frame = self.process_motion_camera(camera_idx, frame, current_time)
             else:
                 # Камера ждёт движения → используем поведение triggered
-                return self.process_triggered_camera(camera_idx, frame, current_time)
+                display_frame = self.process_triggered_camera(camera_idx, frame, current_time)
 
         # Только TRIGGERED
         elif camera_idx in self.camera_triggered:
-            return self.process_triggered_camera(camera_idx, frame, current_time)
+            display_frame = self.process_triggered_camera(camera_idx, frame, current_time)
 
         # Только MOTION
         elif camera_idx in self.camera_motion:
-            return self.process_motion_camera(camera_idx, frame, current_time)
+            display_frame = self.process_motion_camera(camera_idx, frame, current_time)
 
         # Статическая (обычный режим)
         else:
-            return self.process_static_camera(camera_idx, frame)
+            display_frame = self.process_static_camera(camera_idx, frame)
+
+        # Метаданные кадра: подписи рисует браузер (маска и время — render_base) или render_overlay
+        if camera_idx not in self.camera_triggered and camera_idx not in self.camera_motion:
+            mode = 'static'
+        else:
+            mode = 'active' if self.motion_detected[camera_idx] else 'waiting'
+        contours = (self.motion_contours.get(camera_idx) or []) if mode == 'active' else []
+        seq = self.frame_seq[camera_idx] = self.frame_seq.get(camera_idx, 0) + 1
+        h, w = display_frame.shape[:2]
+        meta = self.frame_meta[camera_idx] = frame_meta(
+            seq, camera_idx, current_time, (w, h), mode, contours,
+            self.face_details.pop(camera_idx, []), camera_idx in self.masks)
+        if self.burn_overlays:
+            display_frame = render_overlay(display_frame, meta, self.masks.get(camera_idx), contours)
+        else:
+            display_frame = render_base(display_frame, meta, self.masks.get(camera_idx))
+
+        # Состояние — в веб-интерфейс, пик движения и лица — в индекс записей
+        self.publish_state(camera_idx, current_time)
+        self.note_activity(camera_idx)
+        return display_frame
 
 
     def setup_masks(self):
@@ -838,29 +951,38 @@ class SurveillanceSystem:
             while True:
                 frames = []
                 current_time = time.time()
+
+                # Сначала читаем все камеры, чтобы детекция лиц шла одним пакетом
+                raw_frames = {}
+                frame_times = {}
                 for idx, cap in enumerate(self.caps):
                     camera_idx = self.camera_indices[idx]
                     if cap.isOpened():
                         ret, frame = cap.read()
-                        if ret:
-                            processed_frame = self.process_camera_frame(camera_idx, frame, current_time)
-                        else:
-                            processed_frame = get_no_signal_frame(camera_idx)
+                        raw_frames[camera_idx] = frame if ret else None
+                        frame_times[camera_idx] = time.time()
+                        if not ret:
                             motion_logger.log_camera_status(camera_idx, "No signal")
                     else:
-                        processed_frame = get_no_signal_frame(camera_idx)
                         logger.critical(f"Camera {camera_idx}: not found")
+                self.detect_faces_batch(raw_frames)
+
+                for idx, cap in enumerate(self.caps):
+                    camera_idx = self.camera_indices[idx]
+                    frame = raw_frames.get(camera_idx)
+                    if frame is not None:
+                        processed_frame = self.process_camera_frame(camera_idx, frame, current_time)
+                    else:
+                        processed_frame = get_no_signal_frame(camera_idx)
                     
                     # --- НОВОЕ ---
                     # Добавляем кадр в очередь записи, если запись активна
-                    if camera_idx in self.video_writers:
-                        try:
-                            # Копируем кадр, чтобы избежать проблем с изменением в других потоках
-                            frame_copy = processed_frame.copy()
-                            self.frame_queues[camera_idx].put_nowait(frame_copy)
-                        except queue.Full:
-                            # Если очередь полна, пропускаем кадр
-                            pass
+                    # (копия — кадр дальше меняется; при переполнении кадр отбрасывается и учитывается)
+                    if self.recorder.is_recording(camera_idx):
+                        self.recorder.write(camera_idx, processed_frame.copy(), frame_times.get(camera_idx))
+                    # Непрерывная запись — исходный кадр камеры, без заставок и наложений
+                    if frame is not None:
+                        self.record_continuous(camera_idx, frame.copy(), frame_times.get(camera_idx))
                     # --- /НОВОЕ ---
 
                     frames.append(cv2.resize(processed_frame, (320, 240)))
@@ -868,6 +990,7 @@ class SurveillanceSystem:
                 grid = create_video_grid(frames, (2, 2), (640, 480))
                 self.add_status_info(grid, current_time)
                 cv2.imshow("Multi-Camera Surveillance System", grid)
+                self.note_loop_time(time.time() - current_time)
 
                 key = cv2.waitKey(1) & 0xFF
                 if key == ord('q'):
@@ -967,9 +1090,12 @@ class SurveillanceSystem:
             motion_logger.log_motion_stopped(cam_idx, duration, total_objects)
 
         # --- НОВОЕ ---
-        # Остановка всех активных записей
-        for cam_idx in list(self.video_writers.keys()):
+        # Остановка всех активных записей и ожидание закрытия файлов
+        for cam_idx in list(self.open_events):
             self.stop_recording(cam_idx)
+        self.recorder.shutdown()
+        self.retention.stop()
+        self.transcoder.stop()
         # --- /НОВОЕ ---
 
         motion_logger.log_system_event("Surveillance system shutdown")
@@ -1,15 +1,20 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+# Первым: в режиме OCTO_ASYNC=gevent сокеты патчатся до импорта Flask
+from serving import ASYNC_MODE, call_in_server, frame_signal, run_blocking, iter_blocking
+
 import cv2
 import time
 import os
 import queue
 import threading
 import datetime
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, send_from_directory, Response
-from flask_socketio import SocketIO, emit
+import mimetypes
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, send_from_directory, Response, send_file, stream_with_context
+from flask_socketio import SocketIO, emit, join_room, leave_room
 from werkzeug.security import check_password_hash, generate_password_hash
+from werkzeug.utils import secure_filename
 from functools import wraps
 import numpy as np
 
@@ -24,8 +29,20 @@ from camera_utils import (
 )
 from logger import motion_logger
 from loguru import logger
-from AI_face import learning
-from config import CAMERA_INDICES, SYSTEM
+from AI_face import learning, MODEL_PATH, LABELS_PATH
+from enrollment import process_upload, person_name, IMAGE_EXTENSIONS
+from jobs import JobRegistry
+from recordings_index import RecordingsIndex
+from previews import preview_path, POSTER_SUFFIX, SPRITE_SUFFIX, SPRITE_INFO_SUFFIX
+from activity import recording_activity, ACTIVITY_THRESHOLD
+from clip_export import plan_export, export_stream, MAX_EXPORT_SECONDS
+from events import bus, SYSTEM_KEY
+from overlays import render_overlay
+from stream_hub import FrameHub
+from log_reader import LogFilter, tail as tail_log, DEFAULT_LIMIT as DEFAULT_LOG_LINES
+from log_index import LogIndexer, level_number
+from log_archive import ArchiveSummaries, log_days, search_days
+from config import CAMERA_INDICES, SYSTEM, OVERLAY_MODE, RECORD_OVERLAYS, JSON_LOGS
 
 # === PARAMIKO ДЛЯ SSH/SFTP ===
 try:
@@ -38,16 +55,17 @@ except ImportError:
 # === КОНСТАНТЫ ОПТИМИЗАЦИИ ===
 POST_MOTION_DURATION = 5  # секунд записи после движения
 PRE_RECORD_SECONDS = 4    # секунды презаписи
-MAX_FRAME_QUEUE_SIZE = int(TARGET_FPS * 10)  # 10 сек буфера
 JPEG_QUALITY = 70         # качество JPEG для потока
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-change-this-in-production'
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 0
+# За nginx/Apache файлы отдаёт сам веб-сервер (X-Sendfile), Range тоже обрабатывает он
+app.config['USE_X_SENDFILE'] = os.environ.get('OCTO_X_SENDFILE') == '1'
 
-# Используем threading режим для стабильности на Pi
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
+# threading — для стабильности на Pi; gevent (OCTO_ASYNC=gevent) — для многих зрителей
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode=ASYNC_MODE)
 
 @app.after_request
 def add_header(response):
@@ -67,13 +85,14 @@ USERS = {
 system_state = {
     'running': False,
     'system': None,
-    'camera_settings': {i: {'faces': False, 'motion': False, 'recording': True, 'triggered': False} for i in CAMERA_INDICES},
+    'camera_settings': {i: {'faces': False, 'motion': False, 'recording': True, 'triggered': False,
+                            'continuous': False} for i in CAMERA_INDICES},
     'timeouts': {i: 10 for i in CAMERA_INDICES},
     'motion_sensitivity': {i: 25 for i in CAMERA_INDICES}
 }
 
-# Буферы для видеопотоков (маленькие!)
-video_buffers = {i: queue.Queue(maxsize=2) for i in CAMERA_INDICES}
+# Живой поток: кадр камеры сжимается один раз для всех зрителей (MJPEG и WebSocket)
+frame_hub = FrameHub(quality=JPEG_QUALITY, signal=frame_signal())
 
 # Презапись — динамический размер под TARGET_FPS
 pre_record_buffers = {
@@ -81,6 +100,21 @@ pre_record_buffers = {
     for i in CAMERA_INDICES
 }
 
+# Фоновые задачи (обучение модели)
+jobs = JobRegistry()
+
+# Индекс структурированного лога (logs/*.jsonl) для /api/logs/query
+log_indexer = LogIndexer()
+# Сводки сжатых дней лога — поиск пропускает дни без нужного уровня/камеры
+log_summaries = ArchiveSummaries()
+MAX_LOG_SEARCH_DAYS = 31
+
+# Индекс записей для API (отдельное соединение; работает и при остановленной системе)
+recordings_index = RecordingsIndex()
+RECORDINGS_ROOT = os.path.realpath('recordings')
+PREVIEW_MAX_AGE = 24 * 3600  # превью не меняются после закрытия файла
+RECORDINGS_PER_PAGE = 50
+
 # === ДЕКОРАТОРЫ ===
 def login_required(f):
     @wraps(f)
@@ -141,9 +175,12 @@ def start_system():
         system.camera_motion = [i for i in CAMERA_INDICES if system_state['camera_settings'][i]['motion']]
         system.camera_recording = CAMERA_INDICES.copy()
         system.camera_triggered = [i for i in CAMERA_INDICES if system_state['camera_settings'][i]['triggered']]
+        system.camera_continuous = [i for i in CAMERA_INDICES if system_state['camera_settings'][i]['continuous']]
         system.MOTION_TIMEOUTS = system_state['timeouts'].copy()
         system.MOTION_THRESHOLDS = system_state['motion_sensitivity'].copy()
         system.FPS = TARGET_FPS  # важно!
+        system.EVENT_PREROLL = PRE_RECORD_SECONDS  # события в непрерывной записи — с презаписью
+        system.burn_overlays = OVERLAY_MODE == 'burn'  # иначе подписи рисует браузер
 
         logger.info(f"Настройки: faces={system.camera_faces}, motion={system.camera_motion}")
 
@@ -152,6 +189,7 @@ def start_system():
         system_state['running'] = True
 
         threading.Thread(target=process_cameras_loop, daemon=True).start()
+        bus.set(SYSTEM_KEY, running=True)
         motion_logger.log_system_event("Система запущена через веб")
         return jsonify({'success': True})
     except Exception as e:
@@ -168,6 +206,9 @@ def stop_system():
             system_state['system'].cleanup()
             system_state['system'] = None
         system_state['running'] = False
+        bus.set(SYSTEM_KEY, running=False)
+        for camera_id in CAMERA_INDICES:
+            bus.set(camera_id, motion=False, recording=False, continuous=False, faces=[], fps=0)
         motion_logger.log_system_event("Система остановлена")
         return jsonify({'success': True})
     except Exception as e:
@@ -182,6 +223,24 @@ def system_status():
         'settings': system_state['camera_settings']
     })
 
+@app.route('/api/recording/stats', methods=['GET'])
+@login_required
+def recording_stats():
+    """Очередь записи, отброшенные кадры и задержка записи по камерам"""
+    system = system_state['system']
+    if not system_state['running'] or system is None:
+        return jsonify({'running': False, 'cameras': {}})
+    return jsonify({'running': True, 'cameras': system.recording_stats()})
+
+@app.route('/api/recording/usage', methods=['GET'])
+@login_required
+def recording_usage():
+    """Место под записи, скорость заполнения и прогноз в днях"""
+    system = system_state['system']
+    if not system_state['running'] or system is None:
+        return jsonify({'running': False})
+    return jsonify({'running': True, **system.retention.usage(), 'transcoding': system.transcoder.stats()})
+
 # === НАСТРОЙКИ КАМЕР ===
 @app.route('/api/settings/cameras', methods=['GET', 'POST'])
 @admin_required
@@ -199,10 +258,11 @@ def camera_settings():
     value = data.get('value')
     timeout = data.get('timeout')
     
-    if camera_id is not None and setting_type in ['faces', 'motion', 'recording', 'triggered']:
+    if camera_id is not None and setting_type in ['faces', 'motion', 'recording', 'triggered', 'continuous']:
         system_state['camera_settings'][camera_id][setting_type] = bool(value)
     elif setting_type == 'timeout' and timeout is not None:
         system_state['timeouts'][camera_id] = int(timeout)
+    publish_camera_settings(camera_id)
     
     return jsonify({'success': True})
 
@@ -213,11 +273,13 @@ def set_sensitivity():
     camera_id = data.get('camera_id')
     sensitivity = data.get('sensitivity')
     if camera_id is not None and sensitivity is not None:
+        camera_id = int(camera_id)
         sens = max(5, min(100, int(sensitivity)))
         system_state['motion_sensitivity'][camera_id] = sens
         if system_state['running'] and system_state['system']:
             system_state['system'].MOTION_THRESHOLDS[camera_id] = sens
         motion_logger.log_settings({f'camera_{camera_id}_sensitivity': sens})
+        publish_camera_settings(camera_id)
         return jsonify({'success': True, 'sensitivity': sens})
     return jsonify({'error': 'Нет данных'}), 400
 
@@ -250,6 +312,7 @@ def delete_mask():
     mask_path = os.path.join("masks", filename)
     if os.path.exists(mask_path):
         os.remove(mask_path)
+        bus.publish(SYSTEM_KEY, 'masks_changed')
         return jsonify({'success': True})
     return jsonify({'error': 'Mask not found'}), 404
 
@@ -270,54 +333,156 @@ def create_mask():
 @app.route('/api/logs', methods=['GET'])
 @login_required
 def get_logs():
+    """
+    Последние строки лога дня (по умолчанию — самого свежего). Файл читается с конца,
+    параметры: status, camera, q (подстрока), limit, before — курсор из прошлого ответа.
+    Сжатый день (.log.zip) читается потоково целиком, без курсора.
+    """
     logs_dir = "logs"
-    logs = []
-    
-    # Получаем параметры фильтрации
     status_filter = request.args.get('status', '').strip().upper()
     date_filter = request.args.get('date', '').strip()  # формат: YYYY-MM-DD
-    
+    log_filter = LogFilter(
+        level=status_filter or None,
+        camera=request.args.get('camera', type=int),
+        text=request.args.get('q', '').strip() or None,
+    )
+    limit = request.args.get('limit', DEFAULT_LOG_LINES, type=int)
+    before = request.args.get('before', type=int)
+
+    log_file = None
     if os.path.exists(logs_dir):
         # Если указана дата, ищем конкретный файл
         if date_filter:
-            target_file = f"{date_filter}.log"
-            log_files = [target_file] if os.path.exists(os.path.join(logs_dir, target_file)) else []
+            target_file = f"{secure_filename(date_filter)}.log"
+            if os.path.exists(os.path.join(logs_dir, target_file)):
+                log_file = target_file
         else:
-            log_files = sorted([f for f in os.listdir(logs_dir) if f.endswith('.log')], reverse=True)[:1]
-        
-        for log_file in log_files:
-            log_path = os.path.join(logs_dir, log_file)
-            try:
-                with open(log_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    all_lines = [line.strip() for line in f.readlines() if line.strip()]
-                    
-                    # Фильтрация по статусу
-                    if status_filter:
-                        # Формат строки: "YYYY-MM-DD HH:mm:ss | LEVEL    | message"
-                        filtered_lines = []
-                        for line in all_lines:
-                            parts = line.split('|')
-                            if len(parts) >= 2:
-                                level = parts[1].strip().upper()
-                                if level == status_filter:
-                                    filtered_lines.append(line)
-                        logs = filtered_lines[-100:]
-                    else:
-                        logs = all_lines[-100:]
-            except Exception as e:
-                logger.error(f"Ошибка чтения лога: {e}")
-    
-    return jsonify({'logs': logs})
+            log_files = sorted(f for f in os.listdir(logs_dir) if f.endswith('.log'))
+            log_file = log_files[-1] if log_files else None
+
+    logs, cursor = [], None
+    try:
+        if log_file:
+            logs, cursor = tail_log(os.path.join(logs_dir, log_file), limit=limit, before=before,
+                                    log_filter=log_filter)
+        elif date_filter and before is None:
+            days = [day for day in log_days(logs_dir) if day[0] == date_filter]
+            if days:
+                logs, _ = run_blocking(search_days, days, log_filter, limit=limit, summaries=log_summaries)
+                log_file = ', '.join(os.path.basename(path) for path in days[0][1])
+    except Exception as e:
+        logger.error(f"Ошибка чтения лога: {e}")
+
+    return jsonify({'logs': logs, 'file': log_file, 'before': cursor})
+
+@app.route('/api/logs/search', methods=['GET'])
+@login_required
+def search_logs():
+    """
+    Поиск по текстовым логам последних days дней, включая сжатые архивы: status, camera, q,
+    limit, order=newest|oldest. Дни ищутся параллельно, чтение прекращается, когда набрано limit
+    """
+    log_filter = LogFilter(
+        level=request.args.get('status', '').strip().upper() or None,
+        camera=request.args.get('camera', type=int),
+        text=request.args.get('q', '').strip() or None,
+    )
+    days_back = min(MAX_LOG_SEARCH_DAYS, max(1, request.args.get('days', 7, type=int)))
+    newest_first = request.args.get('order', 'newest') != 'oldest'
+    all_days = log_days()
+    log_summaries.prune([path for _, paths in all_days for path in paths if path.endswith('.zip')])
+    days = all_days[:days_back]
+    if not newest_first:
+        days.reverse()
+    logs, stats = run_blocking(search_days, days, log_filter,
+                               limit=request.args.get('limit', DEFAULT_LOG_LINES, type=int),
+                               newest_first=newest_first, summaries=log_summaries)
+    return jsonify({'logs': logs, 'days': [date for date, _ in days], **stats})
+
+def _day_time(date, value):
+    """'HH:MM[:SS]' дня date -> timestamp (None, если не задано)"""
+    if not value:
+        return None
+    return datetime.datetime.combine(date, datetime.time.fromisoformat(value)).timestamp()
+
+@app.route('/api/logs/query', methods=['GET'])
+@login_required
+def query_logs():
+    """
+    Поиск по структурированному логу дня через индекс: date, start/end (HH:MM), level (этот
+    и серьёзнее), camera, q, limit, after — курсор из прошлого ответа
+    """
+    try:
+        date = datetime.date.fromisoformat(request.args.get('date') or datetime.date.today().isoformat())
+        start = _day_time(date, request.args.get('start', '').strip())
+        end = _day_time(date, request.args.get('end', '').strip())
+        level = request.args.get('level', '').strip()
+        min_level = level_number(level) if level else None
+    except ValueError as e:
+        return jsonify({'error': f'Неверный параметр: {e}'}), 400
+
+    index = log_indexer.day(date.isoformat())
+    if index is None:
+        # Не путать с «ничего не найдено»: лога за этот день нет вовсе
+        return jsonify({'error': 'Нет лога за эту дату'}), 404
+    # Сжатый день читается потоково целиком — вне хаба gevent
+    entries, cursor = run_blocking(
+        index.query, start=start, end=end, min_level=min_level,
+        camera=request.args.get('camera', type=int),
+        text=request.args.get('q', '').strip() or None,
+        limit=request.args.get('limit', DEFAULT_LOG_LINES, type=int),
+        after=request.args.get('after', 0, type=int),
+    )
+    return jsonify({'entries': entries, 'after': cursor, 'archived': index.archived})
+
+def run_training_job(job, incremental=True):
+    """Обучение в фоне и подмена модели в работающей системе"""
+    def on_progress(done, total, rate, eta):
+        job.update(stage='images', done=done, total=total, rate=round(rate, 1), eta=round(eta))
+        job.check_cancelled()
+
+    job.update(stage='scanning')
+    # Отмена проверяется внутри learning() до записи файлов модели. Если модель уже сохранена,
+    # её нужно загрузить в любом случае — иначе на диске новая модель, а в системе старая
+    learning(incremental=incremental, progress=on_progress, check_cancelled=job.check_cancelled)
+
+    # Загрузка новой модели — здесь, а не в цикле камер
+    job.update(stage='loading')
+    recognizer, label_dict, face_cascade = load_lbph_face_recognizer(MODEL_PATH, LABELS_PATH)
+    system = system_state['system']
+    reloaded = recognizer is not None and system_state['running'] and system is not None
+    if reloaded:
+        system.swap_face_model(recognizer, label_dict, face_cascade)
+    job.update(stage='finished')
+    return {'people': len(label_dict or {}), 'reloaded': reloaded}
 
 @app.route('/api/biometric/train', methods=['POST'])
 @admin_required
 def train_model():
-    try:
-        learning()
-        return jsonify({'success': True})
-    except Exception as e:
-        logger.error(f"Ошибка обучения: {e}")
-        return jsonify({'error': str(e)}), 500
+    data = request.get_json(silent=True) or {}
+    # Проверка «уже идёт» и запуск — одной операцией: два одновременных POST не запустят два обучения
+    job, started = jobs.submit_unique('train', run_training_job, incremental=not data.get('full', False))
+    if not started:
+        return jsonify({'error': 'Обучение уже выполняется', 'job_id': job.id}), 409
+    logger.info(f"Обучение запущено в фоне: {job.id}")
+    return jsonify({'success': True, 'job_id': job.id}), 202
+
+@app.route('/api/biometric/train/<job_id>', methods=['GET'])
+@admin_required
+def train_status(job_id):
+    job = jobs.get(job_id)
+    if not job or job.kind != 'train':
+        return jsonify({'error': 'Задача не найдена'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/biometric/train/<job_id>/cancel', methods=['POST'])
+@admin_required
+def train_cancel(job_id):
+    job = jobs.get(job_id)
+    if not job or job.kind != 'train':
+        return jsonify({'error': 'Задача не найдена'}), 404
+    job.cancel()
+    return jsonify({'success': True, 'status': job.status})
 
 @app.route('/api/settings/apply', methods=['POST'])
 @admin_required
@@ -360,6 +525,14 @@ def apply_settings():
             else:
                 if camera_id in system.camera_triggered:
                     system.camera_triggered.remove(camera_id)
+
+            # Непрерывная запись включается/выключается со следующего кадра
+            if settings['continuous']:
+                if camera_id not in system.camera_continuous:
+                    system.camera_continuous.append(camera_id)
+            else:
+                if camera_id in system.camera_continuous:
+                    system.camera_continuous.remove(camera_id)
             
             # Обновляем timeout и чувствительность
             system.MOTION_TIMEOUTS[camera_id] = system_state['timeouts'][camera_id]
@@ -368,6 +541,7 @@ def apply_settings():
             logger.info(f"Настройки камеры {camera_id} применены к работающей системе")
         
         motion_logger.log_settings({f'camera_{camera_id}_settings': settings})
+        bus.publish(camera_id, 'settings_applied')
         return jsonify({'success': True, 'message': f'Настройки камеры {camera_id} применены'})
     
     except Exception as e:
@@ -380,18 +554,34 @@ def upload_photos():
     if 'files' not in request.files:
         return jsonify({'error': 'No files selected'}), 400
     files = request.files.getlist('files')
-    user_name = request.form.get('user_name', 'unknown')
+    # Имя — папка в face_cache/dataset: без «../» и разделителей пути
+    user_name = person_name(request.form.get('user_name', 'unknown'))
+    if not user_name:
+        return jsonify({'error': 'Недопустимое имя пользователя'}), 400
     if not files:
         return jsonify({'error': 'No files provided'}), 400
-    user_dir = os.path.join('dataset', user_name)
-    os.makedirs(user_dir, exist_ok=True)
-    saved_count = 0
-    for file in files:
-        if file.filename and file.filename.lower().endswith(('.png', '.jpg', '.jpeg')):
-            filepath = os.path.join(user_dir, file.filename)
+    # В запросе файлы только сохраняются как есть; декодирование и поиск лиц — в фоновой очереди
+    staging_dir = os.path.join(app.config['UPLOAD_FOLDER'], f"enroll_{time.time_ns()}")
+    os.makedirs(staging_dir, exist_ok=True)
+    paths = []
+    for i, file in enumerate(files):
+        if file.filename and file.filename.lower().endswith(IMAGE_EXTENSIONS + ('.zip',)):
+            filepath = os.path.join(staging_dir, f"{i:04d}_{secure_filename(file.filename)}")
             file.save(filepath)
-            saved_count += 1
-    return jsonify({'success': True, 'message': f'Загружено {saved_count} фото'})
+            paths.append(filepath)
+    if not paths:
+        os.rmdir(staging_dir)
+        return jsonify({'error': 'Нет фото или ZIP-архивов'}), 400
+    job = jobs.enqueue('upload', process_upload, user_name, paths, staging_dir)
+    return jsonify({'success': True, 'job_id': job.id, 'files': len(paths)}), 202
+
+@app.route('/api/biometric/upload/<job_id>', methods=['GET'])
+@admin_required
+def upload_status(job_id):
+    job = jobs.get(job_id)
+    if not job or job.kind != 'upload':
+        return jsonify({'error': 'Задача не найдена'}), 404
+    return jsonify(job.to_dict())
 
 # === АРХИВ: НАСТРОЙКИ ПОДКЛЮЧЕНИЯ ===
 archive_settings = {
@@ -642,38 +832,321 @@ def download_archive_file(filename):
     return send_file(
         file_path,
         as_attachment=True,
-        download_name=filename
+        download_name=filename,
+        conditional=True  # Range и докачка
     )
 
+# === ЛОКАЛЬНЫЕ ЗАПИСИ ===
+def _local_recording_path(path):
+    """Абсолютный путь к файлу записи; None, если он вне recordings/ или его нет"""
+    full = os.path.realpath(path)
+    if os.path.commonpath([full, RECORDINGS_ROOT]) != RECORDINGS_ROOT or not os.path.isfile(full):
+        return None
+    return full
+
+def _recording_json(row):
+    item = dict(row)
+    base = f"/api/recordings/{row['id']}"
+    item['file'] = os.path.relpath(row['path'], 'recordings') if row['path'] else None
+    item['urls'] = {
+        'video': f"{base}/file" if row['path'] else None,
+        'poster': f"{base}/poster",
+        'sprite': f"{base}/sprite",
+        'activity': f"{base}/activity",
+    }
+    del item['path']
+    return item
+
+@app.route('/api/recordings', methods=['GET'])
+@login_required
+def list_recordings():
+    """
+    Записи из индекса, новые первыми. Фильтры: camera, event, kind, face,
+    date (ГГГГ-ММ-ДД) или start/end (Unix-время); страницы: page (с 1), per_page
+    """
+    start = request.args.get('start', type=float)
+    end = request.args.get('end', type=float)
+    date = request.args.get('date')
+    if date:
+        try:
+            day = datetime.datetime.strptime(date, '%Y-%m-%d')
+        except ValueError:
+            return jsonify({'error': 'Неверная дата'}), 400
+        start, end = day.timestamp(), (day + datetime.timedelta(days=1)).timestamp()
+    page = max(1, request.args.get('page', 1, type=int))
+    per_page = min(200, max(1, request.args.get('per_page', RECORDINGS_PER_PAGE, type=int)))
+    rows, total = recordings_index.query(
+        camera=request.args.get('camera', type=int), start=start, end=end,
+        event=request.args.get('event') or None, kind=request.args.get('kind') or None,
+        face=request.args.get('face') or None, limit=per_page, offset=(page - 1) * per_page)
+    return jsonify({'items': [_recording_json(row) for row in rows], 'total': total,
+                    'page': page, 'per_page': per_page})
+
+@app.route('/api/recordings/<int:recording_id>/file')
+@login_required
+def recording_file(recording_id):
+    """
+    Видео записи. Range-запросы (206 Partial Content) и условные запросы (ETag,
+    If-Modified-Since) обрабатывает send_file — браузер и VLC перематывают без скачивания целиком.
+    ?download=1 — отдать как вложение.
+    """
+    row = recordings_index.get(recording_id)
+    path = _local_recording_path(row['path']) if row and row['path'] else None
+    if path is None:
+        return jsonify({'error': 'Файл записи не найден'}), 404
+    response = send_file(path, mimetype=mimetypes.guess_type(path)[0] or 'application/octet-stream', conditional=True,
+                         as_attachment=request.args.get('download') == '1',
+                         download_name=os.path.basename(path))
+    # Запись может ещё дописываться — каждый раз сверяться с сервером по ETag
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+def _parse_time(value):
+    """Unix-время или ISO 'ГГГГ-ММ-ДДTЧЧ:ММ:СС' (местное время) -> Unix-время"""
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.datetime.fromisoformat(value).timestamp()
+
+@app.route('/api/recordings/export', methods=['GET'])
+@login_required
+def export_recording():
+    """
+    Отрезок камеры одним MJPEG AVI: ?camera=2&start=2025-01-15T14:03:10&end=2025-01-15T14:05:00.
+    Файл собирается из записей на лету и отдаётся по мере сборки, без временного файла.
+    """
+    camera = request.args.get('camera', type=int)
+    try:
+        start = _parse_time(request.args.get('start', ''))
+        end = _parse_time(request.args.get('end', ''))
+    except ValueError:
+        return jsonify({'error': 'Неверное время начала или конца'}), 400
+    if camera is None or end <= start:
+        return jsonify({'error': 'Укажите камеру и отрезок времени'}), 400
+    if end - start > MAX_EXPORT_SECONDS:
+        return jsonify({'error': f'Отрезок длиннее {MAX_EXPORT_SECONDS // 3600} ч'}), 400
+
+    # Разбор файлов и перекодирование (cv2) — вне хаба gevent (serving.run_blocking)
+    parts = run_blocking(plan_export, recordings_index, camera, start, end)
+    if not parts:
+        return jsonify({'error': 'За этот отрезок записей нет'}), 404
+    stream, total = export_stream(parts)
+    begin = datetime.datetime.fromtimestamp(start)
+    filename = f"cam{camera}_{begin:%Y-%m-%d_%H-%M-%S}_{datetime.datetime.fromtimestamp(end):%H-%M-%S}.avi"
+    headers = {'Content-Disposition': f'attachment; filename="{filename}"'}
+    if total is not None:
+        headers['Content-Length'] = str(total)
+    logger.info(f"Экспорт камеры {camera}: {len(parts)} файл(ов) -> {filename}")
+    return Response(stream_with_context(iter_blocking(stream)), mimetype='video/x-msvideo', headers=headers)
+
+# === ПРЕВЬЮ ЗАПИСЕЙ ===
+def _send_preview(recording_id, suffix, mimetype):
+    """Файл превью записи из индекса; у события — превью первого куска"""
+    row = recordings_index.get(recording_id)
+    if row is None:
+        return jsonify({'error': 'Запись не найдена'}), 404
+    video = row['path'] or (row['segments'][0]['file'] if row['segments'] else None)
+    path = preview_path(video, suffix) if video else None
+    if path is None or not os.path.exists(path):
+        return jsonify({'error': 'Превью ещё нет'}), 404
+    response = send_file(os.path.abspath(path), mimetype=mimetype, max_age=PREVIEW_MAX_AGE, conditional=True)
+    response.cache_control.public = False
+    response.cache_control.private = True  # только для вошедшего пользователя
+    return response
+
+@app.route('/api/recordings/<int:recording_id>/poster')
+@login_required
+def recording_poster(recording_id):
+    return _send_preview(recording_id, POSTER_SUFFIX, 'image/jpeg')
+
+@app.route('/api/recordings/<int:recording_id>/sprite')
+@login_required
+def recording_sprite(recording_id):
+    return _send_preview(recording_id, SPRITE_SUFFIX, 'image/jpeg')
+
+@app.route('/api/recordings/<int:recording_id>/sprite.json')
+@login_required
+def recording_sprite_info(recording_id):
+    """Раскладка спрайта: колонки, размер миниатюры, время каждой миниатюры"""
+    return _send_preview(recording_id, SPRITE_INFO_SUFFIX, 'application/json')
+
+@app.route('/api/recordings/<int:recording_id>/activity')
+@login_required
+def recording_activity_ranges(recording_id):
+    """Отрезки активности записи (движение выше threshold или лицо) с файлом и смещением"""
+    row = recordings_index.get(recording_id)
+    if row is None:
+        return jsonify({'error': 'Запись не найдена'}), 404
+    threshold = request.args.get('threshold', ACTIVITY_THRESHOLD, type=float)
+    return jsonify({'id': recording_id, 'threshold': threshold,
+                    'ranges': recording_activity(recordings_index, row, threshold)})
+
+# === SOCKET.IO: СОСТОЯНИЕ КАМЕР ===
+# Клиент входит в комнату «system» при подключении и в комнаты «camera_<id>» по subscribe;
+# изменения приходят из шины событий (events.bus) не чаще раза в FLUSH_INTERVAL.
+def _state_room(camera):
+    return 'system' if camera is SYSTEM_KEY else f'camera_{camera}'
+
+def _state_message(camera, changes, events=()):
+    return {'camera': camera, 'changes': changes, 'events': list(events)}
+
+def push_state(camera, changes, events):
+    name = 'system_state' if camera is SYSTEM_KEY else 'camera_state'
+    # Вызывается из потока шины — в режиме gevent отправка передаётся в поток сервера
+    call_in_server(socketio.emit, name, _state_message(camera, changes, events), to=_state_room(camera))
+
+bus.subscribe(push_state)
+
+last_frame_meta = {}  # {camera_idx: последние отправленные метаданные без seq/time}
+
+def push_frame_meta(camera_idx, meta):
+    """Метаданные кадра — в комнату камеры; кадр без изменений (кроме номера и времени) не шлётся"""
+    if meta is None:
+        return
+    content = {key: value for key, value in meta.items() if key not in ('seq', 'time')}
+    if last_frame_meta.get(camera_idx) == content:
+        return
+    last_frame_meta[camera_idx] = content
+    call_in_server(socketio.emit, 'frame_meta', meta, to=_state_room(camera_idx))
+
+def publish_camera_settings(camera_id):
+    """Настройки камеры — всем открытым панелям"""
+    if camera_id not in system_state['camera_settings']:
+        return
+    bus.set(camera_id,
+            settings=dict(system_state['camera_settings'][camera_id]),
+            timeout=system_state['timeouts'][camera_id],
+            sensitivity=system_state['motion_sensitivity'][camera_id])
+
+@socketio.on('connect')
+def socket_connect():
+    if 'user' not in session:
+        return False  # отклонить подключение без входа
+    join_room(_state_room(SYSTEM_KEY))
+    emit('system_state', _state_message(SYSTEM_KEY, {'running': system_state['running'],
+                                                     **bus.snapshot(SYSTEM_KEY)}))
+
+@socketio.on('subscribe')
+def socket_subscribe(data):
+    """Подписка на камеры: сразу приходит их полное текущее состояние"""
+    for camera_id in (data or {}).get('cameras', []):
+        if camera_id not in CAMERA_INDICES:
+            continue
+        join_room(_state_room(camera_id))
+        emit('camera_state', _state_message(camera_id, bus.snapshot(camera_id)))
+
+@socketio.on('unsubscribe')
+def socket_unsubscribe(data):
+    for camera_id in (data or {}).get('cameras', []):
+        leave_room(_state_room(camera_id))
+
 # === ВИДЕОПОТОК ===
 @app.route('/video_feed/<int:camera_id>')
 @login_required
 def video_feed(camera_id):
+    if camera_id not in CAMERA_INDICES:
+        return jsonify({'error': 'Камера не найдена'}), 404
     return Response(
         generate_video_stream(camera_id),
         mimetype='multipart/x-mixed-replace; boundary=frame'
     )
 
 def generate_video_stream(camera_id):
+    # Кадр "ожидание" в правильном разрешении — сжимается один раз на поток
+    ret, buffer = cv2.imencode('.jpg', get_waiting_frame(camera_id, size=TARGET_RESOLUTION),
+                               [int(cv2.IMWRITE_JPEG_QUALITY), JPEG_QUALITY])
+    wait_jpeg = buffer.tobytes()
+    version = 0
+    with frame_hub.viewer(camera_id):
+        while True:
+            # Уже сжатый общий кадр; пока клиент принимал прошлый, промежуточные пропускаются
+            frame = frame_hub.wait(camera_id, version, timeout=2)
+            if frame is None:
+                jpeg = wait_jpeg
+            else:
+                version, jpeg = frame.version, frame.jpeg
+            yield (b'--frame\r\n'
+                   b'Content-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n')
+
+# === SOCKET.IO: ПОТОК КАДРОВ ===
+# Альтернатива /video_feed: клиент подписывается на камеры (stream_subscribe) и получает по одному
+# соединению события 'frame' с JPEG в бинарном виде. На каждый кадр клиент отвечает frame_ack;
+# пока не подтверждено STREAM_WINDOW кадров камеры, новые кадры этому клиенту пропускаются.
+STREAM_WINDOW = 2
+STREAM_ACK_TIMEOUT = 5  # с; потерянное подтверждение не останавливает поток
+stream_clients = {}     # {sid: {camera_id: {'pending': [id кадров], 'sent_at': время, 'skipped': n}}}
+stream_lock = threading.Lock()
+stream_sender = None
+
+def stream_frames_loop():
+    known = {}
     while True:
-        try:
-            if camera_id in video_buffers:
-                frame = video_buffers[camera_id].get(timeout=2)
-                # Сжимаем с пониженным качеством
-                ret, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), JPEG_QUALITY])
-                if ret:
-                    yield (b'--frame\r\n'
-                           b'Content-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n')
-        except queue.Empty:
-            # Отправляем кадр "ожидание" в правильном разрешении
-            wait_frame = get_waiting_frame(camera_id, size=TARGET_RESOLUTION)
-            ret, buffer = cv2.imencode('.jpg', wait_frame, [int(cv2.IMWRITE_JPEG_QUALITY), JPEG_QUALITY])
-            if ret:
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n')
-        except Exception as e:
-            logger.error(f"Поток {camera_id} ошибка: {e}")
-            time.sleep(0.5)
+        updates = frame_hub.wait_any(known, timeout=1.0)
+        for camera_id, frame in updates.items():
+            known[camera_id] = frame.version
+            now = time.time()
+            targets = []
+            with stream_lock:
+                for sid, cameras in stream_clients.items():
+                    state = cameras.get(camera_id)
+                    if state is None:
+                        continue
+                    if len(state['pending']) >= STREAM_WINDOW:
+                        if now - state['sent_at'] < STREAM_ACK_TIMEOUT:
+                            state['skipped'] += 1
+                            continue
+                        state['pending'].clear()
+                    state['pending'].append(frame.version)
+                    state['sent_at'] = now
+                    targets.append(sid)
+            if not targets:
+                continue
+            message = {'camera': camera_id, 'id': frame.version, 'seq': frame.seq,
+                       'time': round(frame.time, 3), 'jpeg': frame.jpeg}
+            for sid in targets:
+                socketio.emit('frame', message, to=sid)
+
+@socketio.on('stream_subscribe')
+def stream_subscribe(data):
+    global stream_sender
+    sid = request.sid
+    with stream_lock:
+        cameras = stream_clients.setdefault(sid, {})
+        added = [camera_id for camera_id in (data or {}).get('cameras', [])
+                 if camera_id in CAMERA_INDICES and camera_id not in cameras]
+        for camera_id in added:
+            cameras[camera_id] = {'pending': [], 'sent_at': 0.0, 'skipped': 0}
+        if stream_sender is None:
+            stream_sender = socketio.start_background_task(stream_frames_loop)
+    for camera_id in added:
+        frame_hub.add_viewer(camera_id)
+
+@socketio.on('stream_unsubscribe')
+def stream_unsubscribe(data):
+    sid = request.sid
+    with stream_lock:
+        cameras = stream_clients.get(sid, {})
+        removed = [camera_id for camera_id in (data or {}).get('cameras', [])
+                   if cameras.pop(camera_id, None) is not None]
+    for camera_id in removed:
+        frame_hub.remove_viewer(camera_id)
+
+@socketio.on('frame_ack')
+def stream_frame_ack(data):
+    """Клиент показал кадр id камеры camera: подтверждены он и все более ранние"""
+    with stream_lock:
+        state = stream_clients.get(request.sid, {}).get((data or {}).get('camera'))
+        if state is not None:
+            frame_id = data.get('id', 0)
+            state['pending'] = [pending for pending in state['pending'] if pending > frame_id]
+
+@socketio.on('disconnect')
+def socket_disconnect(*args):
+    with stream_lock:
+        cameras = stream_clients.pop(request.sid, {})
+    for camera_id in cameras:
+        frame_hub.remove_viewer(camera_id)
 
 # === ОСНОВНОЙ ЦИКЛ ОБРАБОТКИ ===
 def process_cameras_loop():
@@ -688,54 +1161,59 @@ def process_cameras_loop():
         try:
             current_time = time.time()
 
+            # Читаем все камеры, чтобы детекция лиц (DNN) шла одним пакетом
+            raw_frames = {}
+            frame_times = {}
             for idx, cap in enumerate(system.caps):
-                if not cap or not cap.isOpened():
-                    camera_idx = system.camera_indices[idx]
-                    no_signal = get_no_signal_frame(camera_idx, size=TARGET_RESOLUTION)
-                    try:
-                        video_buffers[camera_idx].put_nowait(no_signal)
-                    except queue.Full:
-                        pass
-                    continue
-
-                ret, raw_frame = cap.read()
+                camera_idx = system.camera_indices[idx]
+                ret, raw_frame = (cap.read() if cap and cap.isOpened() else (False, None))
+                frame_times[camera_idx] = time.time()
                 if not ret:
-                    camera_idx = system.camera_indices[idx]
-                    no_signal = get_no_signal_frame(camera_idx, size=TARGET_RESOLUTION)
-                    try:
-                        video_buffers[camera_idx].put_nowait(no_signal)
-                    except queue.Full:
-                        pass
+                    frame_hub.put(camera_idx, get_no_signal_frame(camera_idx, size=TARGET_RESOLUTION))
                     continue
+                raw_frames[camera_idx] = raw_frame
 
-                camera_idx = system.camera_indices[idx]
+            system.detect_faces_batch(raw_frames)
+
+            for camera_idx, raw_frame in raw_frames.items():
+                # === Обработка кадра ===
+                processed_frame = system.process_camera_frame(camera_idx, raw_frame, current_time)
+                meta = system.frame_meta.get(camera_idx)
+                push_frame_meta(camera_idx, meta)
+
+                # В записи — чистый кадр или с подписями (OCTO_RECORD_OVERLAYS); дальше он не меняется.
+                # Копия — только если кадр кому-то нужен: презапись/запись или непрерывная запись
+                record_frame = None
+                if camera_idx in system.camera_recording or camera_idx in system.camera_continuous:
+                    if RECORD_OVERLAYS and meta is not None:
+                        record_frame = render_overlay(raw_frame, meta, system.masks.get(camera_idx))
+                    else:
+                        record_frame = raw_frame.copy()
 
-                # === Презапись ===
+                # === Презапись (с временем захвата — запись идёт с постоянной частотой) ===
                 if camera_idx in system.camera_recording:
+                    item = (frame_times[camera_idx], record_frame)
                     try:
-                        pre_record_buffers[camera_idx].put_nowait(raw_frame.copy())
+                        pre_record_buffers[camera_idx].put_nowait(item)
                     except queue.Full:
                         try:
                             pre_record_buffers[camera_idx].get_nowait()
-                            pre_record_buffers[camera_idx].put_nowait(raw_frame.copy())
+                            pre_record_buffers[camera_idx].put_nowait(item)
                         except queue.Empty:
                             pass
 
-                # === Обработка кадра ===
-                processed_frame = system.process_camera_frame(camera_idx, raw_frame, current_time)
-
                 # === Управление записью ===
                 if camera_idx in system.camera_recording:
                     motion_now = system.motion_detected.get(camera_idx, False)
 
-                    if motion_now and camera_idx not in system.video_writers:
+                    if motion_now and not system.is_event_recording(camera_idx):
                         prerecord = []
                         while not pre_record_buffers[camera_idx].empty():
                             prerecord.append(pre_record_buffers[camera_idx].get())
                         if prerecord:
                             start_recording_with_prerecord(system, camera_idx, prerecord)
 
-                    if camera_idx in system.video_writers:
+                    if system.is_event_recording(camera_idx):
                         if motion_now:
                             motion_stop_time[camera_idx] = current_time + POST_MOTION_DURATION
                             last_motion_state[camera_idx] = True
@@ -747,20 +1225,18 @@ def process_cameras_loop():
                             system.stop_recording(camera_idx)
                             motion_stop_time[camera_idx] = 0
 
-                        try:
-                            system.frame_queues[camera_idx].put_nowait(raw_frame.copy())
-                        except (queue.Full, KeyError):
-                            pass
+                        if system.recorder.is_recording(camera_idx):
+                            system.recorder.write(camera_idx, record_frame, frame_times[camera_idx])
 
-                # === Веб-поток ===
-                try:
-                    video_buffers[camera_idx].put_nowait(processed_frame)
-                except queue.Full:
-                    try:
-                        video_buffers[camera_idx].get_nowait()
-                        video_buffers[camera_idx].put_nowait(processed_frame)
-                    except queue.Empty:
-                        pass
+                # === Непрерывная запись (без кадра — только закрыть поток, если его выключили) ===
+                system.record_continuous(camera_idx, record_frame, frame_times[camera_idx])
+
+                # === Веб-поток (сжатие — в потоке хаба и только если есть зрители) ===
+                frame_hub.put(camera_idx, processed_frame, seq=meta and meta['seq'],
+                              timestamp=frame_times[camera_idx])
+
+            # Длительность цикла — по ней фоновые задачи (перекодирование) уступают камерам
+            system.note_loop_time(time.time() - current_time)
 
             # Сон в соответствии с TARGET_FPS
             time.sleep(1.0 / TARGET_FPS)
@@ -771,7 +1247,12 @@ def process_cameras_loop():
 
 # === ЗАПИСЬ С ПРЕЗАПИСЬЮ ===
 def start_recording_with_prerecord(system, camera_idx, pre_record_frames):
-    if camera_idx in system.video_writers:
+    # При непрерывной записи презапись уже в ней — событие отмечается отрезком времени
+    if camera_idx in system.camera_continuous:
+        system.begin_event(camera_idx, "motion_detected", start_time=pre_record_frames[0][0])
+        return
+
+    if system.is_event_recording(camera_idx):
         return
 
     now = datetime.datetime.now()
@@ -779,24 +1260,11 @@ def start_recording_with_prerecord(system, camera_idx, pre_record_frames):
     os.makedirs(camera_dir, exist_ok=True)
     filepath = os.path.join(camera_dir, f"recording_{now.strftime('%H-%M-%S')}.avi")
 
-    h, w = pre_record_frames[0].shape[:2]
-    # Используем MJPG — быстрее на Pi
-    fourcc = cv2.VideoWriter_fourcc(*'MJPG')
-    writer = cv2.VideoWriter(filepath, fourcc, TARGET_FPS, (w, h))
-
-    for frame in pre_record_frames:
-        writer.write(frame)
-
-    frame_queue = queue.Queue(maxsize=MAX_FRAME_QUEUE_SIZE)
-    frame_queue.put(pre_record_frames[-1].copy())
-
-    system.video_writers[camera_idx] = writer
+    h, w = pre_record_frames[0][1].shape[:2]
+    # Используем MJPG — быстрее на Pi. Файл открывается и презапись пишется в пуле записи
+    system.recorder.start(camera_idx, filepath, 'MJPG', TARGET_FPS, (w, h), frames=pre_record_frames,
+                           event="motion_detected")
     system.recording_start_time[camera_idx] = time.time()
-    system.frame_queues[camera_idx] = frame_queue
-
-    thread = threading.Thread(target=system._write_video_thread, args=(camera_idx,), daemon=True)
-    thread.start()
-    system.recording_threads[camera_idx] = thread
 
     motion_logger.log_system_event(f"Запись начата: {filepath}")
 
@@ -807,11 +1275,16 @@ def main():
     os.makedirs('dataset', exist_ok=True)
     os.makedirs('recordings', exist_ok=True)
 
+    if JSON_LOGS:
+        log_indexer.start()
+
     port = int(os.environ.get('PORT', 5000))
-    logger.info(f"Сервер запущен: http://<IP>:{port}/login")
+    logger.info(f"Сервер запущен ({ASYNC_MODE}): http://<IP>:{port}/login")
     
-    # Отключаем use_reloader — стабильность на Pi
-    app.run(host='0.0.0.0', port=port, debug=False, threaded=True, use_reloader=False)
+    # Отключаем use_reloader — стабильность на Pi. Через socketio.run — чтобы работал WebSocket;
+    # в режиме gevent сервер — gevent.pywsgi, цикл камер по-прежнему в обычном потоке
+    socketio.run(app, host='0.0.0.0', port=port, debug=False, use_reloader=False,
+                 allow_unsafe_werkzeug=True)
 
 if __name__ == '__main__':
     main()
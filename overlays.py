@@ -0,0 +1,103 @@
+import datetime
+
+import cv2
+
+from camera_utils import overlay_mask, draw_bounding_box
+
+# Метаданные кадра вместо нарисованных поверх пикселей подписей: боксы движения, лица, состояние.
+# В браузере они рисуются на canvas поверх чистого потока; render_overlay — то же самое на сервере
+# (окно CLI, режим OCTO_OVERLAYS=burn, запись с подписями OCTO_RECORD_OVERLAYS=1).
+# Маска и время в режиме client остаются в кадре (render_base): они не зависят от детекции,
+# а время меняется каждый кадр, тогда как метаданные шлются только при изменениях.
+MOTION_COLOR = (0, 0, 255)
+CONTOUR_COLOR = (0, 255, 255)
+KNOWN_FACE_COLOR = (0, 255, 0)
+UNKNOWN_FACE_COLOR = (0, 0, 255)
+TEXT_COLOR = (255, 0, 0)
+TRACK_GRID = 10  # шаг сетки для ID объекта (как в motion_logger.track_objects)
+
+
+def track_id(camera_idx, rect, grid_size=TRACK_GRID):
+    """ID объекта по клетке центра бокса — тот же, что в журнале новых объектов"""
+    x, y, w, h = rect
+    return f"{camera_idx}_{(x + w // 2) // grid_size}_{(y + h // 2) // grid_size}"
+
+
+def frame_meta(seq, camera_idx, timestamp, size, mode, contours=(), faces=(), mask=False):
+    """
+    Запись метаданных кадра. mode: 'static' — камера без детекции, 'active' — идёт движение,
+    'waiting' — ждёт движения (в потоке кадр ожидания). Координаты — в пикселях кадра size (w, h).
+    """
+    objects = []
+    for i, contour in enumerate(contours):
+        rect = [int(v) for v in cv2.boundingRect(contour)]
+        objects.append({'id': i + 1, 'track': track_id(camera_idx, rect), 'box': rect})
+    return {
+        'seq': seq,
+        'camera': camera_idx,
+        'time': round(timestamp, 3),
+        'size': [int(size[0]), int(size[1])],
+        'mode': mode,
+        'motion': mode == 'active',
+        'objects': objects,
+        'faces': list(faces),
+        'mask': bool(mask),
+    }
+
+
+def _scale_rect(rect, sx, sy):
+    return [int(rect[0] * sx), int(rect[1] * sy), int(rect[2] * sx), int(rect[3] * sy)]
+
+
+def render_base(frame, meta, mask=None):
+    """Маска и время кадра на копии кадра (то, что в режиме client не рисует браузер)"""
+    output = frame.copy()
+    h, w = output.shape[:2]
+    if mask is not None and mask.size:
+        if mask.shape[:2] != (h, w):
+            mask = cv2.resize(mask, (w, h), interpolation=cv2.INTER_NEAREST)
+        output = overlay_mask(output, mask)
+    timestamp = datetime.datetime.fromtimestamp(meta['time']).strftime("%H:%M:%S")
+    cv2.putText(output, timestamp, (10, h - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, TEXT_COLOR, 2)
+    return output
+
+
+def render_overlay(frame, meta, mask=None, contours=None):
+    """Нарисовать метаданные на копии кадра; кадр другого размера — координаты масштабируются"""
+    output = render_base(frame, meta, mask)
+    h, w = output.shape[:2]
+    sx, sy = w / meta['size'][0], h / meta['size'][1]
+
+    if meta['mode'] == 'active':
+        for obj in meta['objects']:
+            x, y, bw, bh = _scale_rect(obj['box'], sx, sy)
+            draw_bounding_box(output, (x, y, bw, bh), label=str(obj['id']), color=MOTION_COLOR)
+            cv2.putText(output, f"{obj['box'][2]}x{obj['box'][3]}", (x, y - 5),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.4, CONTOUR_COLOR, 1)
+        # Контуры — только если кадр того же размера, что и у детекции
+        if contours is not None and (sx, sy) == (1, 1):
+            cv2.drawContours(output, list(contours), -1, CONTOUR_COLOR, 1)
+        if meta['objects']:
+            cv2.putText(output, f"Motion: {len(meta['objects'])} objects", (15, 105),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, MOTION_COLOR, 2)
+            cv2.putText(output, f"Cam {meta['camera']}", (130, h - 10),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, TEXT_COLOR, 2)
+            if meta['mask']:
+                cv2.putText(output, "Mask active", (15, 70), cv2.FONT_HERSHEY_SIMPLEX, 0.6, MOTION_COLOR, 2)
+        else:
+            cv2.putText(output, "No motion", (15, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.7, MOTION_COLOR, 2)
+
+    for face in meta['faces']:
+        x1, y1, x2, y2 = face['box']
+        x1, x2 = int(x1 * sx), int(x2 * sx)
+        y1, y2 = int(y1 * sy), int(y2 * sy)
+        color = KNOWN_FACE_COLOR if face['name'] else UNKNOWN_FACE_COLOR
+        label = face['name'] or "NE RASPOZNAN"
+        if face['confidence'] is not None:
+            label = f"{label} ({face['confidence']})"
+        cv2.rectangle(output, (x1, y1), (x2, y2), color, 1)
+        cv2.putText(output, label, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.4, color, 1)
+    if meta['faces']:
+        cv2.putText(output, f"Faces: {len(meta['faces'])}", (15, 145),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, KNOWN_FACE_COLOR, 2)
+    return output
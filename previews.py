@@ -0,0 +1,93 @@
+import os
+import json
+
+import cv2
+import numpy as np
+
+# Превью записи: постер (кадр с пиком движения) и спрайт из равномерно расставленных миниатюр.
+# Строятся из кадров, которые поток записи и так держит в памяти — видео заново не читается.
+POSTER_SUFFIX = ".poster.jpg"
+SPRITE_SUFFIX = ".sprite.jpg"
+SPRITE_INFO_SUFFIX = ".sprite.json"
+POSTER_WIDTH = 480
+THUMB_WIDTH = 160
+SPRITE_TILES = 20
+SPRITE_COLUMNS = 5
+PREVIEW_QUALITY = 75
+
+
+def preview_path(video_path, suffix):
+    return os.path.splitext(video_path)[0] + suffix
+
+
+def _as_image(frame):
+    """Кадр numpy как есть; готовый JPEG декодируется (только для выбранных кадров)"""
+    if isinstance(frame, (bytes, bytearray, memoryview)):
+        return cv2.imdecode(np.frombuffer(frame, dtype=np.uint8), cv2.IMREAD_COLOR)
+    return frame
+
+
+def _resize(image, width):
+    h, w = image.shape[:2]
+    if w <= width:
+        return image
+    return cv2.resize(image, (width, int(h * width / w)), interpolation=cv2.INTER_AREA)
+
+
+class PreviewBuilder:
+    """
+    Накопление превью по ходу записи. Миниатюры берутся через каждые step кадров;
+    когда их становится вдвое больше нужного, каждая вторая отбрасывается, а шаг удваивается —
+    так без знания длины записи остаются равномерно расставленные кадры.
+    """
+
+    def __init__(self, tiles=SPRITE_TILES):
+        self.tiles = tiles
+        self.step = 1
+        self.count = 0
+        self.thumbs = []          # [(время, миниатюра)]
+        self.poster = None        # (время, кадр) — кадр с пиком движения
+        self.poster_motion = -1.0
+
+    def add(self, frame, timestamp):
+        if self.poster is None:
+            self.poster = (timestamp, frame)
+        if self.count % self.step == 0:
+            image = _as_image(frame)
+            if image is not None:
+                self.thumbs.append((timestamp, _resize(image, THUMB_WIDTH)))
+            if len(self.thumbs) >= 2 * self.tiles:
+                self.thumbs = self.thumbs[::2]
+                self.step *= 2
+        self.count += 1
+
+    def mark_peak(self, frame, timestamp, motion):
+        """Кадр с новым пиком движения становится постером"""
+        if frame is not None and motion > self.poster_motion:
+            self.poster_motion = motion
+            self.poster = (timestamp, frame)
+
+    def save(self, video_path):
+        """Записать постер, спрайт и его описание рядом с видео"""
+        if self.poster is None:
+            return
+        poster = _as_image(self.poster[1])
+        if poster is not None:
+            cv2.imwrite(preview_path(video_path, POSTER_SUFFIX), _resize(poster, POSTER_WIDTH),
+                        [cv2.IMWRITE_JPEG_QUALITY, PREVIEW_QUALITY])
+        if not self.thumbs:
+            return
+        picks = np.linspace(0, len(self.thumbs) - 1, min(self.tiles, len(self.thumbs))).round().astype(int)
+        chosen = [self.thumbs[i] for i in sorted(set(picks))]
+        th, tw = chosen[0][1].shape[:2]
+        columns = min(SPRITE_COLUMNS, len(chosen))
+        rows = (len(chosen) + columns - 1) // columns
+        sprite = np.zeros((rows * th, columns * tw, 3), dtype=np.uint8)
+        for i, (_, thumb) in enumerate(chosen):
+            r, c = divmod(i, columns)
+            sprite[r * th:r * th + thumb.shape[0], c * tw:c * tw + thumb.shape[1]] = thumb[:th, :tw]
+        cv2.imwrite(preview_path(video_path, SPRITE_SUFFIX), sprite, [cv2.IMWRITE_JPEG_QUALITY, PREVIEW_QUALITY])
+        info = {'columns': columns, 'tile': [tw, th], 'poster_time': round(self.poster[0], 3),
+                'times': [round(ts, 3) for ts, _ in chosen]}
+        with open(preview_path(video_path, SPRITE_INFO_SUFFIX), "w", encoding="utf-8") as f:
+            json.dump(info, f)
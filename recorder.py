@@ -0,0 +1,464 @@
+import os
+import json
+import time
+import queue
+import datetime
+import threading
+from collections import deque
+
+import cv2
+from loguru import logger
+
+from mjpeg_avi import MJPEGAviWriter, JPEG_QUALITY
+from previews import PreviewBuilder
+from activity import ActivitySeries
+
+# Пул записи: фиксированное число потоков, каждый владеет VideoWriter'ами своих камер
+RECORDER_WORKERS = 2
+MAX_PENDING_FRAMES = 80  # кадров в очереди одной камеры (10 с при 8 FPS); лишние отбрасываются
+MAX_GAP_SECONDS = 10     # дольше этого пауза в кадрах не заполняется повторами
+IDLE_CHECK_INTERVAL = 1  # с; проверка записей без кадров (idle_timeout) по таймеру, не по пустой очереди
+TIMESTAMPS_SUFFIX = ".timestamps.csv"  # реальное время каждого кадра: <имя видео>.timestamps.csv
+# Непрерывная запись: куски фиксированной длины, события — отрезки времени в events.jsonl
+SEGMENT_SECONDS = 300
+EVENTS_FILE = "events.jsonl"
+RECENT_SEGMENTS = 64     # сколько последних кусков помнит поток (для привязки событий)
+
+
+def timestamps_path(video_path):
+    return os.path.splitext(video_path)[0] + TIMESTAMPS_SUFFIX
+
+
+def segment_key(camera_idx):
+    """Ключ потока непрерывной записи камеры (у записи по событию ключ — сам camera_idx)"""
+    return f"{camera_idx}:continuous"
+
+
+def continuous_dir(base_dir, camera_idx, timestamp):
+    day = datetime.datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d")
+    return os.path.join(base_dir, day, "continuous", f"cam{camera_idx}")
+
+
+class CameraStats:
+    """Статистика записи одной камеры"""
+
+    def __init__(self):
+        self.pending = 0          # кадров в очереди
+        self.written = 0          # кадров с камеры записано
+        self.dropped = 0          # отброшено при переполнении очереди
+        self.duplicated = 0       # повторов, вставленных для постоянной частоты
+        self.skipped = 0          # кадров сверх частоты файла
+        self.latency_sum = 0.0    # от постановки в очередь до записи, с
+        self.latency_max = 0.0
+        self.files = 0
+        self.path = None
+
+    def to_dict(self, recording):
+        processed = max(self.written + self.skipped, 1)
+        return {
+            'recording': recording,
+            'file': self.path,
+            'queue_depth': self.pending,
+            'frames_written': self.written,
+            'frames_dropped': self.dropped,
+            'frames_duplicated': self.duplicated,
+            'frames_skipped': self.skipped,
+            'latency_avg_ms': round(self.latency_sum / processed * 1000, 1),
+            'latency_max_ms': round(self.latency_max * 1000, 1),
+            'files': self.files,
+        }
+
+
+class _Recording:
+    """
+    Открытый файл записи (живёт только в рабочем потоке).
+    Кадры приходят с временем захвата и раскладываются по сетке постоянной частоты:
+    пропуски заполняются повтором предыдущего кадра, лишние кадры отбрасываются.
+    Если задан index — файл попадает в индекс записей при первом кадре и при закрытии.
+    """
+
+    def __init__(self, path, writer, fps, idle_timeout, index=None, kind="clip", camera=None, event=None):
+        self.path = path
+        self.writer = writer
+        self.fps = fps
+        self.idle_timeout = idle_timeout
+        self.generation = None  # номер start в RecorderPool
+        self.last_frame = time.time()
+        self.t0 = None
+        self.emitted = 0
+        self.prev = None
+        self.timestamps = open(timestamps_path(path), "w", encoding="utf-8")
+        self.timestamps.write("frame,timestamp\n")
+        self.index = index
+        self.info = (kind, camera, event)
+        self.first_ts = self.last_ts = None
+        self.peak_motion = 0.0
+        self.faces = set()
+        self.previews = PreviewBuilder()
+        self.activity = ActivitySeries()
+
+    def note_activity(self, motion, faces, objects=0, face_present=False):
+        """Учесть движение (доля площади кадра), число объектов и лица на последнем кадре"""
+        self.peak_motion = max(self.peak_motion, motion)
+        self.faces.update(faces)
+        self.previews.mark_peak(self.prev, self.last_ts, motion)
+        if self.last_ts is not None:
+            self.activity.add(self.last_ts, motion, objects, face_present or bool(faces))
+
+    def _index_call(self, method, *args, **kwargs):
+        if self.index is None:
+            return
+        try:
+            getattr(self.index, method)(*args, **kwargs)
+        except Exception as e:
+            logger.error(f"Recordings index error for {self.path}: {e}")
+
+    def emit(self, frame, timestamp):
+        """Записать кадр; возвращает (повторов, отброшен ли кадр)"""
+        if self.t0 is None:
+            self.t0 = timestamp
+            self.first_ts = timestamp
+            self.activity.start = timestamp
+            kind, camera, event = self.info
+            self._index_call("recording_started", self.path, kind, camera, event, timestamp)
+        self.last_ts = timestamp
+        index = int(round((timestamp - self.t0) * self.fps))
+        if index < self.emitted:
+            return 0, True
+        gap = index - self.emitted
+        max_gap = int(MAX_GAP_SECONDS * self.fps)
+        if gap > max_gap:
+            # Камера надолго пропала — не раздуваем файл, сдвигаем начало сетки
+            self.t0 += (gap - max_gap) / self.fps
+            gap = max_gap
+        if self.prev is None:
+            gap = 0
+        for _ in range(gap):
+            self.writer.write(self.prev)
+        self.emitted += gap
+        self.writer.write(frame)
+        self.previews.add(frame, timestamp)
+        self.timestamps.write(f"{self.emitted},{timestamp:.3f}\n")
+        self.emitted += 1
+        self.prev = frame
+        self.last_frame = time.time()
+        return gap, False
+
+    def close(self):
+        self.writer.release()
+        self.timestamps.close()
+        try:
+            self.previews.save(self.path)
+            if self.first_ts is not None:
+                self.activity.save(self.path, duration=self.emitted / self.fps)
+        except Exception as e:
+            logger.error(f"Cannot save previews for {self.path}: {e}")
+        if self.first_ts is not None:
+            size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+            end = self.first_ts + self.emitted / self.fps
+            self._index_call("recording_finished", self.path, self.first_ts, end, self.emitted, size,
+                             self.peak_motion, self.faces)
+
+
+class _SegmentedRecording:
+    """
+    Непрерывная запись кусками по segment_seconds (границы кратны длине куска).
+    Куски пишутся в MJPEG AVI: JPEG-кадры сохраняются как есть, каждый кадр ключевой,
+    поэтому смена куска не теряет кадров.
+    """
+
+    idle_timeout = None
+
+    def __init__(self, camera_idx, base_dir, fps, size, segment_seconds, quality, index=None):
+        self.camera_idx = camera_idx
+        self.index = index
+        self.base_dir = base_dir
+        self.fps = fps
+        self.size = size
+        self.segment_seconds = segment_seconds
+        self.quality = quality
+        self.current = None
+        self.segment_end = 0
+        self.segments = deque(maxlen=RECENT_SEGMENTS)  # [начало, конец, путь]
+        self.last_frame = time.time()
+
+    @property
+    def path(self):
+        return self.current.path if self.current else None
+
+    def _rotate(self, timestamp):
+        self._finish()
+        start = timestamp - timestamp % self.segment_seconds
+        camera_dir = continuous_dir(self.base_dir, self.camera_idx, timestamp)
+        os.makedirs(camera_dir, exist_ok=True)
+        name = datetime.datetime.fromtimestamp(timestamp).strftime("segment_%H-%M-%S.avi")
+        path = os.path.join(camera_dir, name)
+        writer = MJPEGAviWriter(path, self.fps, self.size, self.quality)
+        self.current = _Recording(path, writer, self.fps, None, self.index, "segment", self.camera_idx,
+                                  "continuous")
+        self.segment_end = start + self.segment_seconds
+        self.segments.append([timestamp, timestamp, path])
+
+    def _finish(self):
+        if self.current is not None:
+            self.current.close()
+            logger.info(f"Segment for camera {self.camera_idx} closed: {self.current.path}")
+            self.current = None
+
+    def emit(self, frame, timestamp):
+        if self.current is None or timestamp >= self.segment_end:
+            self._rotate(timestamp)
+        self.segments[-1][1] = timestamp
+        self.last_frame = time.time()
+        return self.current.emit(frame, timestamp)
+
+    def note_activity(self, *args):
+        if self.current is not None:
+            self.current.note_activity(*args)
+
+    def add_event(self, event_name, start, end, peak_motion=0.0, faces=()):
+        """Событие — отрезок времени со ссылками на куски, которые его покрывают"""
+        covered = [{'file': path, 'offset': round(max(start, seg_start) - seg_start, 3)}
+                   for seg_start, seg_end, path in self.segments
+                   if seg_start <= end and seg_end >= start]
+        record = {'camera': self.camera_idx, 'event': event_name,
+                  'start': round(start, 3), 'end': round(end, 3), 'segments': covered}
+        camera_dir = continuous_dir(self.base_dir, self.camera_idx, start)
+        os.makedirs(camera_dir, exist_ok=True)
+        record['peak_motion'] = round(peak_motion, 4)
+        record['faces'] = sorted(faces)
+        with open(os.path.join(camera_dir, EVENTS_FILE), "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+        if self.index is not None:
+            try:
+                self.index.add_event(self.camera_idx, event_name, start, end, covered, peak_motion, faces)
+            except Exception as e:
+                logger.error(f"Recordings index error for camera {self.camera_idx} event: {e}")
+
+    def close(self):
+        self._finish()
+
+
+class RecorderPool:
+    """
+    Запись видео в пуле потоков. start/write/stop не блокируют цикл камер:
+    это команды в очередь рабочего потока камеры, файлы открываются и закрываются там же.
+    index — RecordingsIndex (или None): файлы и события заносятся в него из рабочих потоков.
+    """
+
+    def __init__(self, workers=RECORDER_WORKERS, max_pending=MAX_PENDING_FRAMES, index=None):
+        self.max_pending = max_pending
+        self.index = index
+        self._queues = [queue.Queue() for _ in range(max(1, workers))]
+        self._active = set()      # камеры с активной записью (с точки зрения цикла камер)
+        self._generations = {}    # номер последнего start по камере: простой закрывает только свою запись
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._threads = []
+        for i, commands in enumerate(self._queues):
+            thread = threading.Thread(target=self._worker, args=(commands,), name=f"recorder-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _queue_for(self, camera_idx):
+        return self._queues[hash(camera_idx) % len(self._queues)]
+
+    def _camera_stats(self, camera_idx):
+        stats = self._stats.get(camera_idx)
+        if stats is None:
+            stats = self._stats[camera_idx] = CameraStats()
+        return stats
+
+    # ========= Команды (вызываются из цикла камер) =========
+    def is_recording(self, camera_idx):
+        return camera_idx in self._active
+
+    def start(self, camera_idx, path, fourcc, fps, size, frames=(), idle_timeout=None, event=None):
+        """
+        Начать запись в path с постоянной частотой fps.
+        frames — [(время захвата, кадр)], которые пишутся первыми (презапись).
+        idle_timeout — закрыть файл, если кадров нет дольше стольких секунд.
+        event — тип события для индекса записей.
+        """
+        with self._lock:
+            if camera_idx in self._active:
+                return False
+            self._active.add(camera_idx)
+            generation = self._generations[camera_idx] = self._generations.get(camera_idx, 0) + 1
+            stats = self._camera_stats(camera_idx)
+            stats.pending += len(frames)
+        params = (path, fourcc, fps, size, idle_timeout, event)
+        self._queue_for(camera_idx).put(('start', camera_idx, params, list(frames), time.time(), generation))
+        return True
+
+    def write(self, camera_idx, frame, timestamp=None):
+        """
+        Поставить кадр в очередь записи; timestamp — время захвата (по умолчанию — сейчас).
+        False — записи нет или очередь переполнена.
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._lock:
+            if camera_idx not in self._active:
+                return False
+            stats = self._camera_stats(camera_idx)
+            if stats.pending >= self.max_pending:
+                stats.dropped += 1
+                return False
+            stats.pending += 1
+        self._queue_for(camera_idx).put(('frame', camera_idx, (timestamp, frame), time.time()))
+        return True
+
+    def start_segments(self, camera_idx, base_dir, fps, size, segment_seconds=SEGMENT_SECONDS,
+                       quality=JPEG_QUALITY):
+        """Начать непрерывную запись камеры кусками в base_dir/<дата>/continuous/cam<N>/"""
+        key = segment_key(camera_idx)
+        with self._lock:
+            if key in self._active:
+                return False
+            self._active.add(key)
+            self._camera_stats(key)
+        params = (camera_idx, base_dir, fps, size, segment_seconds, quality)
+        self._queue_for(key).put(('segments', key, params))
+        return True
+
+    def write_segment(self, camera_idx, frame, timestamp=None):
+        """Кадр (numpy или готовый JPEG) в непрерывную запись"""
+        return self.write(segment_key(camera_idx), frame, timestamp)
+
+    def stop_segments(self, camera_idx):
+        return self.stop(segment_key(camera_idx))
+
+    def add_event(self, camera_idx, event_name, start, end, peak_motion=0.0, faces=()):
+        """Отметить событие в непрерывной записи камеры (без отдельного файла)"""
+        key = segment_key(camera_idx)
+        self._queue_for(key).put(('event', key, (event_name, start, end, peak_motion, set(faces))))
+
+    def annotate(self, camera_idx, motion=0.0, faces=(), objects=0, face_present=False):
+        """
+        Передать в идущие записи камеры активность последнего кадра: доля площади в движении,
+        распознанные лица, число движущихся объектов, было ли лицо (для индекса, превью, .activity.npy)
+        """
+        for key in (camera_idx, segment_key(camera_idx)):
+            if key in self._active:
+                self._queue_for(key).put(('activity', key, (motion, set(faces), objects, face_present)))
+
+    def stop(self, camera_idx):
+        """Остановить запись; файл дописывается и закрывается в рабочем потоке"""
+        with self._lock:
+            if camera_idx not in self._active:
+                return False
+            self._active.discard(camera_idx)
+        self._queue_for(camera_idx).put(('stop', camera_idx))
+        return True
+
+    def stop_all(self):
+        for camera_idx in list(self._active):
+            self.stop(camera_idx)
+
+    def shutdown(self, timeout=5.0):
+        """Остановить все записи и дождаться закрытия файлов (при завершении программы)"""
+        self.stop_all()
+        for commands in self._queues:
+            commands.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def stats(self):
+        """Статистика по камерам: глубина очереди, отброшенные кадры, задержка записи"""
+        with self._lock:
+            return {str(key): stats.to_dict(key in self._active)
+                    for key, stats in self._stats.items()}
+
+    # ========= Рабочий поток =========
+    def _worker(self, commands):
+        recordings = {}
+        next_idle_check = time.monotonic() + IDLE_CHECK_INTERVAL
+        while True:
+            # Поток обслуживает несколько камер: очередь может не пустеть из-за одной камеры,
+            # поэтому простаивающие файлы других закрываются по таймеру
+            now = time.monotonic()
+            if now >= next_idle_check:
+                self._close_idle(recordings)
+                next_idle_check = now + IDLE_CHECK_INTERVAL
+            try:
+                command = commands.get(timeout=max(0.0, next_idle_check - now))
+            except queue.Empty:
+                continue
+            if command is None:
+                break
+            kind, camera_idx = command[0], command[1]
+            try:
+                if kind == 'start':
+                    self._open(recordings, camera_idx, *command[2:])
+                elif kind == 'segments':
+                    self._close(recordings, camera_idx)
+                    recordings[camera_idx] = _SegmentedRecording(*command[2], index=self.index)
+                elif kind == 'frame':
+                    self._write(recordings, camera_idx, command[2], command[3])
+                elif kind == 'event':
+                    recording = recordings.get(camera_idx)
+                    if isinstance(recording, _SegmentedRecording):
+                        recording.add_event(*command[2])
+                elif kind == 'activity':
+                    recording = recordings.get(camera_idx)
+                    if recording is not None:
+                        recording.note_activity(*command[2])
+                elif kind == 'stop':
+                    self._close(recordings, camera_idx)
+            except Exception as e:
+                logger.error(f"Recorder error on camera {camera_idx}: {e}")
+        for camera_idx in list(recordings):
+            self._close(recordings, camera_idx)
+
+    def _open(self, recordings, camera_idx, params, frames, queued_at, generation):
+        path, fourcc, fps, size, idle_timeout, event = params
+        if camera_idx in recordings:
+            self._close(recordings, camera_idx)
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, size)
+        if not writer.isOpened():
+            logger.error(f"Cannot open video file for camera {camera_idx}: {path}")
+        recordings[camera_idx] = _Recording(path, writer, fps, idle_timeout, self.index, "clip", camera_idx, event)
+        recordings[camera_idx].generation = generation
+        for item in frames:
+            self._write(recordings, camera_idx, item, queued_at)
+
+    def _write(self, recordings, camera_idx, item, queued_at):
+        timestamp, frame = item
+        recording = recordings.get(camera_idx)
+        duplicated, skipped = 0, False
+        if recording is not None:
+            duplicated, skipped = recording.emit(frame, timestamp)
+        latency = time.time() - queued_at
+        with self._lock:
+            stats = self._camera_stats(camera_idx)
+            stats.pending = max(0, stats.pending - 1)
+            if recording is not None:
+                if stats.path != recording.path:
+                    stats.path = recording.path
+                    stats.files += 1
+                stats.duplicated += duplicated
+                if skipped:
+                    stats.skipped += 1
+                else:
+                    stats.written += 1
+                stats.latency_sum += latency
+                stats.latency_max = max(stats.latency_max, latency)
+
+    def _close(self, recordings, camera_idx):
+        recording = recordings.pop(camera_idx, None)
+        if recording is None:
+            return
+        path = recording.path
+        recording.close()
+        logger.info(f"Video file for camera {camera_idx} closed: {path}")
+
+    def _close_idle(self, recordings):
+        now = time.time()
+        for camera_idx, recording in list(recordings.items()):
+            if recording.idle_timeout and now - recording.last_frame >= recording.idle_timeout:
+                # Цикл камер мог уже остановить эту запись и начать новую (start в очереди) —
+                # флаг новой записи не трогаем
+                with self._lock:
+                    if self._generations.get(camera_idx) == recording.generation:
+                        self._active.discard(camera_idx)
+                self._close(recordings, camera_idx)
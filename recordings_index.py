@@ -0,0 +1,401 @@
+import os
+import re
+import sys
+import json
+import sqlite3
+import datetime
+import threading
+
+import cv2
+from loguru import logger
+
+from activity import load_activity
+
+# Индекс записей (SQLite): поиск по камере, времени и событию без обхода recordings/
+RECORDINGS_DIR = "recordings"
+INDEX_FILE = "index.db"
+PAGE_SIZE = 50
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS recordings (
+    id          INTEGER PRIMARY KEY,
+    path        TEXT UNIQUE,          -- NULL у событий непрерывной записи
+    kind        TEXT NOT NULL,        -- clip | segment | event
+    camera      INTEGER NOT NULL,
+    event       TEXT,
+    start       REAL NOT NULL,
+    end         REAL,                 -- NULL, пока запись идёт
+    duration    REAL,
+    size        INTEGER,
+    frames      INTEGER,
+    peak_motion REAL DEFAULT 0,
+    faces       TEXT DEFAULT '[]',
+    segments    TEXT,                 -- JSON: куски, покрывающие событие
+    transcode   TEXT                  -- NULL | done | skipped | failed (transcoder.py)
+);
+CREATE INDEX IF NOT EXISTS idx_recordings_camera_start ON recordings(camera, start);
+CREATE INDEX IF NOT EXISTS idx_recordings_event_start ON recordings(event, start);
+CREATE INDEX IF NOT EXISTS idx_recordings_start ON recordings(start);
+CREATE TABLE IF NOT EXISTS recording_faces (
+    recording_id INTEGER NOT NULL REFERENCES recordings(id) ON DELETE CASCADE,
+    name         TEXT NOT NULL,
+    PRIMARY KEY (recording_id, name)
+);
+CREATE INDEX IF NOT EXISTS idx_recording_faces_name ON recording_faces(name);
+"""
+
+_CLIP_RE = re.compile(r"recording_(\d{2})-(\d{2})-(\d{2})\.(?:avi|mp4)$")
+_SEGMENT_RE = re.compile(r"segment_(\d{2})-(\d{2})-(\d{2})\.(?:avi|mp4)$")
+
+
+def default_index_path(recordings_dir=RECORDINGS_DIR):
+    return os.path.join(recordings_dir, INDEX_FILE)
+
+
+class RecordingsIndex:
+    """Индекс записей; одно соединение на процесс, обращения под блокировкой"""
+
+    def __init__(self, path=None):
+        self.path = path or default_index_path()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA foreign_keys=ON")
+            self._conn.executescript(_SCHEMA)
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(recordings)")}
+            if "transcode" not in columns:  # индекс, созданный до перекодирования
+                self._conn.execute("ALTER TABLE recordings ADD COLUMN transcode TEXT")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # ========= Запись =========
+    def recording_started(self, path, kind, camera, event, start):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO recordings (path, kind, camera, event, start) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(path) DO UPDATE SET kind=excluded.kind, camera=excluded.camera, "
+                "event=excluded.event, start=excluded.start, end=NULL",
+                (path, kind, camera, event, start))
+
+    def recording_finished(self, path, start, end, frames, size, peak_motion=0.0, faces=()):
+        faces = sorted(set(faces))
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT id FROM recordings WHERE path = ?", (path,)).fetchone()
+            if row is None:
+                return
+            self._conn.execute(
+                "UPDATE recordings SET start=?, end=?, duration=?, frames=?, size=?, peak_motion=?, faces=? "
+                "WHERE id=?",
+                (start, end, max(0.0, end - start), frames, size, peak_motion, json.dumps(faces), row["id"]))
+            self._set_faces(row["id"], faces)
+
+    def add_event(self, camera, event, start, end, segments, peak_motion=0.0, faces=()):
+        """Событие непрерывной записи: отрезок времени со ссылками на куски"""
+        faces = sorted(set(faces))
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                "INSERT INTO recordings (kind, camera, event, start, end, duration, peak_motion, faces, segments) "
+                "VALUES ('event', ?, ?, ?, ?, ?, ?, ?, ?)",
+                (camera, event, start, end, max(0.0, end - start), peak_motion, json.dumps(faces),
+                 json.dumps(segments)))
+            self._set_faces(cur.lastrowid, faces)
+
+    def _set_faces(self, recording_id, faces):
+        self._conn.execute("DELETE FROM recording_faces WHERE recording_id = ?", (recording_id,))
+        self._conn.executemany("INSERT INTO recording_faces (recording_id, name) VALUES (?, ?)",
+                               [(recording_id, name) for name in faces])
+
+    def remove(self, path):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM recordings WHERE path = ?", (path,))
+
+    # ========= Перекодирование =========
+    def transcode_candidates(self, finished_before, limit=PAGE_SIZE):
+        """Закрытые клипы и куски, которые ещё не перекодировались (старые первыми)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path, camera, start, size FROM recordings WHERE path IS NOT NULL AND end IS NOT NULL "
+                "AND end < ? AND transcode IS NULL ORDER BY start ASC LIMIT ?",
+                (finished_before, limit)).fetchall()
+        return [dict(row) for row in rows]
+
+    def set_transcode(self, path, status, new_path=None, size=None):
+        """Отметить результат перекодирования; new_path — файл заменён другим (ссылки событий тоже)"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE recordings SET transcode = ?, path = COALESCE(?, path), size = COALESCE(?, size) "
+                "WHERE path = ?", (status, new_path, size, path))
+            if new_path and new_path != path:
+                self._conn.execute(
+                    "UPDATE recordings SET segments = REPLACE(segments, ?, ?) "
+                    "WHERE kind = 'event' AND segments LIKE ?",
+                    (json.dumps(path)[1:-1], json.dumps(new_path)[1:-1], f"%{json.dumps(path)[1:-1]}%"))
+
+    def prune_events(self, removed_paths):
+        """Убрать из событий ссылки на удалённые куски; события без кусков удаляются"""
+        removed = set(removed_paths)
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                "SELECT id, segments FROM recordings WHERE kind = 'event' AND segments IS NOT NULL").fetchall()
+            for row in rows:
+                segments = json.loads(row["segments"])
+                kept = [seg for seg in segments if seg["file"] not in removed]
+                if not kept:
+                    self._conn.execute("DELETE FROM recordings WHERE id = ?", (row["id"],))
+                elif len(kept) != len(segments):
+                    self._conn.execute("UPDATE recordings SET segments = ? WHERE id = ?",
+                                       (json.dumps(kept), row["id"]))
+
+    # ========= Объём (для retention) =========
+    def usage(self):
+        """{камера: (байт, файлов, начало самой старой записи)} по закрытым файлам"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT camera, SUM(size), COUNT(*), MIN(start) FROM recordings "
+                "WHERE path IS NOT NULL AND end IS NOT NULL GROUP BY camera").fetchall()
+        return {row[0]: (row[1] or 0, row[2], row[3]) for row in rows}
+
+    def has_files_under(self, directory):
+        """Есть ли в индексе файлы в папке directory (в том же виде пути, что и в индексе)"""
+        prefix = os.path.join(directory, "")
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM recordings WHERE path IS NOT NULL AND substr(path, 1, ?) = ? LIMIT 1",
+                (len(prefix), prefix)).fetchone()
+        return row is not None
+
+    def bytes_since(self, since):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM recordings WHERE path IS NOT NULL AND start >= ?",
+                (since,)).fetchone()[0]
+
+    def oldest_files(self, camera=None, before=None, protect_faces_since=None, limit=PAGE_SIZE):
+        """
+        Закрытые файлы от старых к новым. protect_faces_since — не отдавать записи
+        с распознанными лицами, начатые после этого времени (лица неизвестны, faces IS NULL, —
+        тоже: так помечаются записи, восстановленные rebuild без сведений о лицах).
+        """
+        where, args = ["path IS NOT NULL", "end IS NOT NULL"], []
+        if camera is not None:
+            where.append("camera = ?")
+            args.append(camera)
+        if before is not None:
+            where.append("start < ?")
+            args.append(before)
+        if protect_faces_since is not None:
+            where.append("NOT ((faces IS NULL OR faces != '[]') AND start >= ?)")
+            args.append(protect_faces_since)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT path, camera, start, size FROM recordings WHERE {' AND '.join(where)} "
+                f"ORDER BY start ASC LIMIT ?", args + [limit]).fetchall()
+        return [dict(row) for row in rows]
+
+    # ========= Поиск =========
+    def get(self, recording_id):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM recordings WHERE id = ?", (recording_id,)).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def find(self, path):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM recordings WHERE path = ?", (path,)).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def query(self, camera=None, start=None, end=None, event=None, kind=None, face=None,
+              limit=PAGE_SIZE, offset=0, newest_first=True):
+        """
+        Записи, пересекающиеся с отрезком [start, end] (Unix-время), с фильтрами.
+        Возвращает (список словарей, общее число найденных).
+        """
+        where, args = [], []
+        if camera is not None:
+            where.append("r.camera = ?")
+            args.append(camera)
+        if event is not None:
+            where.append("r.event = ?")
+            args.append(event)
+        if kind is not None:
+            where.append("r.kind = ?")
+            args.append(kind)
+        if start is not None:
+            where.append("COALESCE(r.end, r.start) >= ?")
+            args.append(start)
+        if end is not None:
+            where.append("r.start <= ?")
+            args.append(end)
+        if face is not None:
+            where.append("r.id IN (SELECT recording_id FROM recording_faces WHERE name = ?)")
+            args.append(face)
+        clause = ("WHERE " + " AND ".join(where)) if where else ""
+        order = "DESC" if newest_first else "ASC"
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(*) FROM recordings r {clause}", args).fetchone()[0]
+            rows = self._conn.execute(
+                f"SELECT r.* FROM recordings r {clause} ORDER BY r.start {order} LIMIT ? OFFSET ?",
+                args + [limit, offset]).fetchall()
+        return [self._row_to_dict(row) for row in rows], total
+
+    @staticmethod
+    def _row_to_dict(row):
+        item = dict(row)
+        item["faces"] = json.loads(item["faces"] or "[]")
+        item["segments"] = json.loads(item["segments"]) if item["segments"] else None
+        return item
+
+    # ========= Восстановление по файлам =========
+    def rebuild(self, recordings_dir=RECORDINGS_DIR):
+        """Пересоздать индекс по содержимому папки записей; возвращает число записей"""
+        items, events = _scan_recordings(recordings_dir)
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM recording_faces")
+            self._conn.execute("DELETE FROM recordings")
+            for item in items:
+                cur = self._conn.execute(
+                    "INSERT INTO recordings (path, kind, camera, event, start, end, duration, size, frames, "
+                    "transcode, peak_motion, faces) VALUES (:path, :kind, :camera, :event, :start, :end, "
+                    ":duration, :size, :frames, :transcode, :peak_motion, :faces)",
+                    {**item, "faces": json.dumps(item["faces"]) if item["faces"] is not None else None})
+                self._set_faces(cur.lastrowid, item["faces"] or [])
+            for ev in events:
+                cur = self._conn.execute(
+                    "INSERT INTO recordings (kind, camera, event, start, end, duration, peak_motion, faces, segments) "
+                    "VALUES ('event', ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (ev["camera"], ev["event"], ev["start"], ev["end"], max(0.0, ev["end"] - ev["start"]),
+                     ev.get("peak_motion", 0.0), json.dumps(ev.get("faces", [])),
+                     json.dumps(ev.get("segments", []))))
+                self._set_faces(cur.lastrowid, ev.get("faces", []))
+        logger.info(f"Recordings index rebuilt: {len(items)} file(s), {len(events)} event(s)")
+        return len(items) + len(events)
+
+
+def _read_timestamps(video_path):
+    """Первое и последнее время кадра и число кадров из .timestamps.csv (или None)"""
+    path = os.path.splitext(video_path)[0] + ".timestamps.csv"
+    if not os.path.exists(path):
+        return None
+    first = last = None
+    frames = 0
+    with open(path, "r", encoding="utf-8") as f:
+        next(f, None)
+        for line in f:
+            parts = line.strip().split(",")
+            if len(parts) != 2:
+                continue
+            ts = float(parts[1])
+            first = ts if first is None else first
+            last = ts
+            frames = int(parts[0]) + 1
+    return (first, last, frames) if first is not None else None
+
+
+def _scan_recordings(recordings_dir):
+    items, events = [], []
+    if not os.path.isdir(recordings_dir):
+        return items, events
+    for root, _, files in os.walk(recordings_dir):
+        rel = os.path.relpath(root, recordings_dir).split(os.sep)
+        if len(rel) != 3 or not rel[2].startswith("cam"):
+            continue
+        day, event, camera_dir = rel
+        try:
+            camera = int(camera_dir[3:])
+            date = datetime.datetime.strptime(day, "%Y-%m-%d")
+        except ValueError:
+            continue
+        for name in files:
+            path = os.path.join(root, name)
+            if name == "events.jsonl":
+                with open(path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            events.append(json.loads(line))
+                        except ValueError:
+                            continue
+                continue
+            match = _SEGMENT_RE.match(name) or _CLIP_RE.match(name)
+            if not match:
+                continue
+            h, m, s = map(int, match.groups())
+            start = date.replace(hour=h, minute=m, second=s).timestamp()
+            stamps = _read_timestamps(path)
+            if stamps:
+                start, end, frames = stamps
+            else:
+                cap = cv2.VideoCapture(path)
+                frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+                fps = cap.get(cv2.CAP_PROP_FPS) or 1.0
+                cap.release()
+                end = start + frames / fps
+            peak_motion, had_face = _read_activity(path)
+            items.append({
+                "path": path,
+                "kind": "segment" if event == "continuous" else "clip",
+                "camera": camera,
+                "event": event,
+                "start": start,
+                "end": end,
+                "duration": max(0.0, end - start),
+                "size": os.path.getsize(path),
+                "frames": frames,
+                "transcode": None if path.endswith(".avi") else "done",
+                "peak_motion": peak_motion,
+                # Имена лиц клипа нигде, кроме индекса, не хранятся: было лицо — «неизвестно» (NULL)
+                "faces": None if had_face else [],
+            })
+    # Перекодированный кусок сменил расширение — ссылки событий ищутся по имени без расширения
+    by_stem = {os.path.splitext(item["path"])[0]: item for item in items}
+    for ev in events:
+        for segment in ev.get("segments", []):
+            item = by_stem.get(os.path.splitext(segment["file"])[0])
+            if item is None:
+                continue
+            if not os.path.exists(segment["file"]):
+                segment["file"] = item["path"]
+            # Лица куска — из событий, которые на него ссылаются
+            if ev.get("faces"):
+                item["faces"] = sorted(set(item["faces"] or []) | set(ev["faces"]))
+            if ev.get("peak_motion") is not None:
+                item["peak_motion"] = max(item["peak_motion"] or 0.0, ev["peak_motion"])
+    return items, events
+
+
+def _read_activity(video_path):
+    """
+    (пиковое движение, было ли лицо) из .activity.npy. Без файла — (None, True): значения
+    неизвестны, и retention должен считать запись защищённой, а не пустой
+    """
+    try:
+        series = load_activity(video_path)
+    except (OSError, ValueError):
+        series = None
+    if series is None or len(series) == 0:
+        return None, True
+    return round(float(series['motion'].max()), 4), bool(series['face'].any())
+
+
+def _format_row(item):
+    start = datetime.datetime.fromtimestamp(item["start"]).strftime("%Y-%m-%d %H:%M:%S")
+    duration = f"{item['duration']:.0f}s" if item["duration"] is not None else "recording"
+    faces = f" faces: {', '.join(item['faces'])}" if item["faces"] else ""
+    return f"{start}  cam{item['camera']}  {item['kind']:<7} {item['event'] or '':<16} {duration:>8}{faces}"
+
+
+if __name__ == "__main__":
+    # python recordings_index.py rebuild | list [камера]
+    command = sys.argv[1] if len(sys.argv) > 1 else "list"
+    index = RecordingsIndex()
+    if command == "rebuild":
+        print(f"Indexed: {index.rebuild()}")
+    else:
+        camera = int(sys.argv[2]) if len(sys.argv) > 2 else None
+        rows, total = index.query(camera=camera)
+        for row in rows:
+            print(_format_row(row))
+        print(f"Shown {len(rows)} of {total}")
@@ -0,0 +1,212 @@
+import os
+import time
+import shutil
+import datetime
+import threading
+
+from loguru import logger
+
+import config
+from recorder import EVENTS_FILE, TIMESTAMPS_SUFFIX
+from activity import ACTIVITY_SUFFIX
+from previews import POSTER_SUFFIX, SPRITE_SUFFIX, SPRITE_INFO_SUFFIX
+
+# Удаление старых записей по квотам. Кандидаты берутся из индекса записей (от старых к новым),
+# за проход удаляется ограниченное число файлов с паузами — диск не занимается целиком.
+GB = 1024 ** 3
+DAY = 86400
+CHECK_INTERVAL = 60       # секунд между проходами
+MAX_DELETES = 200         # файлов за проход; остальное — в следующем (через RETRY_INTERVAL)
+RETRY_INTERVAL = 1
+DELETE_PAUSE = 0.02       # пауза между удалениями, с
+BATCH = 50                # кандидатов за один запрос к индексу
+# Файлы рядом с видео (<имя>.<суффикс>), которые удаляются вместе с ним. Не маска «<имя>.*»:
+# под ней и временный файл перекодировщика (<имя>.transcoding.<ext>), который ещё пишется
+SIDECAR_SUFFIXES = (TIMESTAMPS_SUFFIX, ACTIVITY_SUFFIX, POSTER_SUFFIX, SPRITE_SUFFIX, SPRITE_INFO_SUFFIX)
+
+
+class RetentionManager:
+    """
+    Квоты хранения записей: общие и по камерам (байты и дни), минимум свободного места.
+    face_days — записи с распознанными лицами не удаляются по сроку раньше стольких дней
+    и по объёму удаляются в последнюю очередь.
+    """
+
+    def __init__(self, index, recordings_dir,
+                 max_bytes=config.RETENTION_MAX_GB * GB,
+                 max_days=config.RETENTION_MAX_DAYS,
+                 camera_bytes=None, camera_days=None,
+                 face_days=config.RETENTION_FACE_DAYS,
+                 min_free_percent=config.RETENTION_MIN_FREE_PERCENT):
+        self.index = index
+        self.recordings_dir = recordings_dir
+        self.max_bytes = max_bytes
+        self.max_days = max_days
+        if camera_bytes is None:
+            camera_bytes = {cam: gb * GB for cam, gb in config.RETENTION_CAMERA_GB.items()}
+        self.camera_bytes = camera_bytes
+        self.camera_days = config.RETENTION_CAMERA_DAYS if camera_days is None else camera_days
+        self.face_days = face_days
+        self.min_free_percent = min_free_percent
+        self.deleted_files = 0
+        self.deleted_bytes = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ========= Фоновый поток =========
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="retention", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                finished = self.run_once()
+            except Exception as e:
+                logger.error(f"Retention error: {e}")
+                finished = True
+            self._stop.wait(CHECK_INTERVAL if finished else RETRY_INTERVAL)
+
+    # ========= Проход =========
+    def run_once(self, max_deletes=MAX_DELETES):
+        """Один проход по правилам; False — лимит удалений исчерпан, нужен ещё проход"""
+        self._budget = max_deletes
+        self._removed = []
+        now = time.time()
+        protect = now - self.face_days * DAY if self.face_days else None
+        try:
+            # 1. Срок хранения
+            if self.max_days:
+                self._evict(before=now - self.max_days * DAY, protect=protect)
+            for camera, days in self.camera_days.items():
+                self._evict(camera=camera, before=now - days * DAY, protect=protect)
+
+            # 2. Квоты камер
+            usage = self.index.usage()
+            for camera, quota in self.camera_bytes.items():
+                used = usage.get(camera, (0, 0, None))[0]
+                if used > quota:
+                    self._evict_bytes(used - quota, camera=camera, protect=protect)
+
+            # 3. Общая квота и свободное место на диске
+            total = sum(item[0] for item in self.index.usage().values())
+            excess = total - self.max_bytes if self.max_bytes else 0
+            disk = shutil.disk_usage(self.recordings_dir)
+            excess = max(excess, disk.total * self.min_free_percent / 100 - disk.free)
+            if excess > 0:
+                self._evict_bytes(excess, protect=protect)
+        finally:
+            if self._removed:
+                self.index.prune_events(self._removed)
+        return self._budget > 0
+
+    def _evict(self, camera=None, before=None, protect=None):
+        """Удалить все подходящие файлы (в пределах лимита прохода)"""
+        while self._budget > 0:
+            rows = self.index.oldest_files(camera, before, protect, min(BATCH, self._budget))
+            if not rows:
+                return
+            for row in rows:
+                self._delete(row)
+
+    def _evict_bytes(self, excess, camera=None, protect=None):
+        """Удалять старые файлы, пока не освободится excess байт; лица — в последнюю очередь"""
+        freed = 0
+        for protect_faces in ((protect, None) if protect is not None else (None,)):
+            while freed < excess and self._budget > 0:
+                rows = self.index.oldest_files(camera, None, protect_faces, min(BATCH, self._budget))
+                if not rows:
+                    break
+                for row in rows:
+                    freed += self._delete(row)
+                    if freed >= excess or self._budget <= 0:
+                        break
+        return freed
+
+    def _delete(self, row):
+        """Удалить видео и его файлы SIDECAR_SUFFIXES (.timestamps.csv, превью и т.п.); вернуть байты"""
+        path = row["path"]
+        stem = os.path.splitext(path)[0]
+        freed = 0
+        for sidecar in [path] + [stem + suffix for suffix in SIDECAR_SUFFIXES]:
+            if not os.path.exists(sidecar):
+                continue
+            try:
+                freed += os.path.getsize(sidecar)
+                os.remove(sidecar)
+            except OSError as e:
+                logger.warning(f"Retention: cannot delete {sidecar}: {e}")
+        self.index.remove(path)
+        self._removed.append(path)
+        self._budget -= 1
+        self.deleted_files += 1
+        self.deleted_bytes += freed
+        logger.info(f"Retention: deleted {path} ({freed / 1024 / 1024:.1f} MB)")
+        self._remove_empty_dirs(os.path.dirname(path))
+        time.sleep(DELETE_PAUSE)
+        return freed
+
+    def _remove_empty_dirs(self, directory):
+        """
+        Убрать опустевшие папки прошлых дней (сегодняшние могут понадобиться записи).
+        Папка пуста, если в индексе под ней нет записей и в ней не осталось ничего, кроме
+        events.jsonl; незнакомые файлы не удаляются — тогда папка остаётся.
+        """
+        today = datetime.date.today().strftime("%Y-%m-%d")
+        root = os.path.abspath(self.recordings_dir)
+        indexed = directory  # путь в том виде, в каком он хранится в индексе
+        directory = os.path.abspath(directory)
+        rel = os.path.relpath(directory, root).split(os.sep)
+        if rel[0] in ("..", ".", today):
+            return
+        while directory != root:
+            if self.index.has_files_under(indexed):
+                return
+            entries = os.listdir(directory) if os.path.isdir(directory) else []
+            if any(name != EVENTS_FILE for name in entries):
+                return
+            # events.jsonl без кусков больше не нужен
+            for name in entries:
+                os.remove(os.path.join(directory, name))
+            os.rmdir(directory)
+            directory = os.path.dirname(directory)
+            indexed = os.path.dirname(indexed)
+
+    # ========= Состояние =========
+    def usage(self):
+        """Занятое место, свободное место и прогноз, на сколько дней его хватит"""
+        now = time.time()
+        per_camera = self.index.usage()
+        total = sum(item[0] for item in per_camera.values())
+        disk = shutil.disk_usage(self.recordings_dir)
+        limit = total + disk.free - disk.total * self.min_free_percent / 100
+        if self.max_bytes:
+            limit = min(limit, self.max_bytes)
+        oldest = min((item[2] for item in per_camera.values() if item[2]), default=None)
+        # Скорость записи: за последние сутки, а если истории меньше — средняя
+        if oldest is not None and now - oldest >= DAY:
+            per_day = self.index.bytes_since(now - DAY)
+        elif oldest is not None:
+            per_day = total / max((now - oldest) / DAY, 1 / 24)
+        else:
+            per_day = 0
+        days_remaining = round(max(0, limit - total) / per_day, 1) if per_day else None
+        return {
+            'total_bytes': total,
+            'limit_bytes': int(max(limit, 0)),
+            'disk_free_bytes': disk.free,
+            'disk_total_bytes': disk.total,
+            'bytes_per_day': int(per_day),
+            'days_remaining': days_remaining,
+            'oldest': oldest,
+            'deleted_files': self.deleted_files,
+            'deleted_bytes': self.deleted_bytes,
+            'cameras': {str(cam): {'bytes': used, 'files': files, 'oldest': first}
+                        for cam, (used, files, first) in per_camera.items()},
+        }
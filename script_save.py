@@ -1,8 +1,9 @@
 import cv2
-import time 
 import os
 from directory import directory
 from AI_face import learning
+import face_cache
+from enrollment import EnrollmentCapture
 from loguru import logger
 def sv():
     print("You need to create a dataset directory (y/n)")
@@ -51,25 +52,32 @@ def sv():
                 cv2.destroyAllWindows()
                 exit()
     
-        # --- Съёмка кадров ---
-        for i in range(20):
+        # --- Съёмка: кадры читаются непрерывно, сохраняются только лучшие лица ---
+        capture = EnrollmentCapture()
+        while not capture.done:
             ret, frame = cap.read()
             if not ret:
                 logger.error("Frame reading error")
                 break
-            
-            filename = os.path.join(save_dir, f"photo_{i+1}.png")
-            cv2.imwrite(filename, frame)
     
+            box = capture.offer(frame)
+            if box is not None:
+                x, y, w, h = box
+                cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
+            cv2.putText(frame, f"{len(capture.samples)}/{capture.target}", (10, 30),
+                        cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
             cv2.imshow("Camera", frame)
-            time.sleep(0.5)
     
             if cv2.waitKey(1) & 0xFF == ord('q'):
                 break
             
         cap.release()
         cv2.destroyAllWindows()
-        logger.success("All photos are saved in a folder:", save_dir)
+    
+        # Нормализованные лица — сразу в кэш обучения (face_cache), без полноразмерных фото
+        faces = capture.best_faces()
+        face_cache.add_captures(fio, faces)
+        logger.success(f"Saved {len(faces)} face(s) of {capture.frames_seen} frame(s) for '{fio}'")
     
         print("To train the model, enter (y/n)")
         checking=input(str())
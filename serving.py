@@ -0,0 +1,122 @@
+import threading
+import queue
+
+from loguru import logger
+
+import config
+
+# Режим веб-сервера. Импортируется первым в octo_web: в режиме gevent сокеты и time патчатся
+# до импорта Flask, а потоки (threading) остаются настоящими — цикл камер, кодер потока
+# и фоновые задачи не делят один поток с гринлетами зрителей.
+ASYNC_MODE = config.ASYNC_MODE
+
+if ASYNC_MODE == 'gevent':
+    try:
+        from gevent import monkey
+        monkey.patch_all(thread=False)
+        import gevent
+        from gevent.event import Event as GreenletEvent
+    except ImportError:
+        logger.warning("gevent не установлен, веб-сервер работает в режиме threading. Установите: pip install gevent")
+        ASYNC_MODE = 'threading'
+elif ASYNC_MODE != 'threading':
+    logger.warning(f"Неизвестный режим OCTO_ASYNC={ASYNC_MODE}, используется threading")
+    ASYNC_MODE = 'threading'
+
+
+class HubDispatcher:
+    """
+    Вызов функций в потоке gevent-хаба из обычных потоков: объекты gevent (очереди Socket.IO)
+    нельзя трогать из чужого потока. Вызовы копятся в очереди, хаб будится async-watcher'ом.
+    """
+
+    def __init__(self):
+        self._thread = threading.get_ident()
+        self._calls = queue.SimpleQueue()
+        self._watcher = gevent.get_hub().loop.async_()
+        self._watcher.start(self._drain)
+
+    def in_hub_thread(self):
+        return threading.get_ident() == self._thread
+
+    def call(self, fn, *args, **kwargs):
+        if self.in_hub_thread():
+            return fn(*args, **kwargs)
+        self._calls.put((fn, args, kwargs))
+        self._watcher.send()
+
+    def _drain(self):
+        # Колбэк цикла событий не должен блокироваться — каждый вызов в своём гринлете
+        while True:
+            try:
+                fn, args, kwargs = self._calls.get_nowait()
+            except queue.Empty:
+                return
+            gevent.spawn(self._safe_call, fn, args, kwargs)
+
+    @staticmethod
+    def _safe_call(fn, args, kwargs):
+        try:
+            fn(*args, **kwargs)
+        except Exception as e:
+            logger.error(f"Hub call {getattr(fn, '__name__', fn)} failed: {e}")
+
+
+class GreenletSignal:
+    """
+    «Есть новые кадры» для гринлетов (FrameHub): notify() — из любого потока,
+    wait() — только в потоке хаба. Каждое срабатывание будит всех ждущих.
+    """
+
+    def __init__(self, dispatcher):
+        self._dispatcher = dispatcher
+        self._event = GreenletEvent()
+
+    def in_hub_thread(self):
+        return self._dispatcher.in_hub_thread()
+
+    def notify(self):
+        self._dispatcher.call(self._fire)
+
+    def _fire(self):
+        event, self._event = self._event, GreenletEvent()
+        event.set()
+
+    def wait(self, timeout=None):
+        self._event.wait(timeout)
+
+
+dispatcher = HubDispatcher() if ASYNC_MODE == 'gevent' else None
+
+
+def call_in_server(fn, *args, **kwargs):
+    """Выполнить fn там, где можно работать с Socket.IO (в gevent — в потоке хаба)"""
+    if dispatcher is None:
+        return fn(*args, **kwargs)
+    return dispatcher.call(fn, *args, **kwargs)
+
+
+def run_blocking(fn, *args, **kwargs):
+    """
+    Блокирующая работа (ожидание потоков, cv2, чтение больших файлов) из обработчика запроса.
+    В gevent — в пуле потоков хаба, чтобы не останавливать остальные соединения
+    """
+    if dispatcher is None or not dispatcher.in_hub_thread():
+        return fn(*args, **kwargs)
+    return gevent.get_hub().threadpool.spawn(fn, *args, **kwargs).get()
+
+
+def iter_blocking(iterable):
+    """Генератор, каждый шаг которого выполняется через run_blocking (потоковые ответы)"""
+    iterator = iter(iterable)
+    done = object()
+    while True:
+        item = run_blocking(next, iterator, done)
+        if item is done:
+            return
+        yield item
+
+
+def frame_signal():
+    """Сигнал новых кадров для гринлетов или None (режим threading: хватает Condition)"""
+    return GreenletSignal(dispatcher) if dispatcher is not None else None
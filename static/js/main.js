@@ -238,9 +238,16 @@ document.addEventListener('DOMContentLoaded', function () {
     if (refreshLogsBtn) refreshLogsBtn.addEventListener('click', loadLogs);
     if (statusFilter) statusFilter.addEventListener('change', loadLogs);
     if (dateFilter) dateFilter.addEventListener('change', loadLogs);
+    const logCameraFilter = document.getElementById('logCameraFilter');
+    const logTextFilter = document.getElementById('logTextFilter');
+    const olderLogsBtn = document.getElementById('olderLogsBtn');
+    if (logCameraFilter) logCameraFilter.addEventListener('change', loadLogs);
+    if (logTextFilter) logTextFilter.addEventListener('keydown', (e) => { if (e.key === 'Enter') loadLogs(); });
+    if (olderLogsBtn) olderLogsBtn.addEventListener('click', () => loadLogs(true));
 
     // ========== БИОМЕТРИЯ ==========
     const trainModelBtn = document.getElementById('trainModelBtn');
+    const cancelTrainBtn = document.getElementById('cancelTrainBtn');
     if (trainModelBtn) {
         trainModelBtn.addEventListener('click', async function () {
             const statusDiv = document.getElementById('trainStatus');
@@ -256,9 +263,14 @@ document.addEventListener('DOMContentLoaded', function () {
 
                 const data = await response.json();
 
-                if (response.ok) {
-                    statusDiv.className = 'success';
-                    statusDiv.textContent = 'Модель успешно обучена!';
+                if (response.ok || (response.status === 409 && data.job_id)) {
+                    // Обучение идёт в фоне — следим за прогрессом
+                    trainModelBtn.disabled = true;
+                    if (cancelTrainBtn) {
+                        cancelTrainBtn.dataset.jobId = data.job_id;
+                        cancelTrainBtn.style.display = 'inline-block';
+                    }
+                    pollTrainingJob(data.job_id);
                 } else {
                     statusDiv.className = 'error';
                     statusDiv.textContent = 'Ошибка: ' + (data.error || 'Неизвестная ошибка');
@@ -270,6 +282,17 @@ document.addEventListener('DOMContentLoaded', function () {
         });
     }
 
+    if (cancelTrainBtn) {
+        cancelTrainBtn.addEventListener('click', async function () {
+            if (!this.dataset.jobId) return;
+            try {
+                await fetch(`/api/biometric/train/${this.dataset.jobId}/cancel`, { method: 'POST' });
+            } catch (error) {
+                console.error('Error cancelling training:', error);
+            }
+        });
+    }
+
     const uploadPhotosBtn = document.getElementById('uploadPhotosBtn');
     if (uploadPhotosBtn) {
         uploadPhotosBtn.addEventListener('click', async function () {
@@ -310,10 +333,11 @@ document.addEventListener('DOMContentLoaded', function () {
                 const data = await response.json();
 
                 if (response.ok) {
-                    statusDiv.className = 'success';
-                    statusDiv.textContent = data.message || 'Фотографии загружены!';
+                    // Фото обрабатываются в фоне — следим за результатом
+                    statusDiv.textContent = `Обработка ${data.files} файл(ов)...`;
                     fileInput.value = '';
                     userNameInput.value = '';
+                    pollUploadJob(data.job_id);
                 } else {
                     statusDiv.className = 'error';
                     statusDiv.textContent = 'Ошибка: ' + (data.error || 'Неизвестная ошибка');
@@ -341,6 +365,17 @@ document.addEventListener('DOMContentLoaded', function () {
                     item.style.display = (index === parseInt(selectedCamera)) ? 'block' : 'none';
                 });
             }
+            // Кадры по WebSocket — только для видимых камер
+            updateStreamSubscriptions();
+        });
+    }
+
+    const streamTransport = document.getElementById('streamTransport');
+    if (streamTransport) {
+        streamTransport.value = localStorage.getItem('streamTransport') || 'ws';
+        streamTransport.addEventListener('change', function () {
+            localStorage.setItem('streamTransport', this.value);
+            updateStreamSubscriptions();
         });
     }
 
@@ -349,9 +384,8 @@ document.addEventListener('DOMContentLoaded', function () {
     loadSettings();
     loadMasks();
 
-    // Периодическое обновление
-    setInterval(checkSystemStatus, 5000);
-    setInterval(loadMasks, 10000);
+    // Состояние системы и камер приходит через Socket.IO; опрос — только без соединения
+    connectStateSocket();
 
     console.log('CCTV Dashboard initialized successfully!');
 });
@@ -409,40 +443,301 @@ async function loadSettings() {
         const data = await response.json();
 
         Object.keys(data.settings).forEach(cameraId => {
-            const settings = data.settings[cameraId];
-            Object.keys(settings).forEach(settingType => {
-                const checkbox = document.querySelector(
-                    `.setting-checkbox[data-camera="${cameraId}"][data-setting="${settingType}"]`
-                );
-                if (checkbox && !checkbox.disabled) {
-                    checkbox.checked = settings[settingType];
-                }
-            });
+            applyCameraSettings(cameraId, data.settings[cameraId], data.timeouts[cameraId] || 10,
+                data.motion_sensitivity ? data.motion_sensitivity[cameraId] : undefined);
+        });
+    } catch (error) {
+        console.error('Error loading settings:', error);
+    }
+}
 
-            const timeoutInput = document.querySelector(`.timeout-input[data-camera="${cameraId}"]`);
-            if (timeoutInput) {
-                timeoutInput.value = data.timeouts[cameraId] || 10;
+function applyCameraSettings(cameraId, settings, timeout, sensitivity) {
+    if (settings) {
+        Object.keys(settings).forEach(settingType => {
+            const checkbox = document.querySelector(
+                `.setting-checkbox[data-camera="${cameraId}"][data-setting="${settingType}"]`
+            );
+            if (checkbox && !checkbox.disabled) {
+                checkbox.checked = settings[settingType];
             }
         });
+    }
 
-        // Загружаем чувствительность детекции движения для каждой камеры
-        if (data.motion_sensitivity) {
-            Object.keys(data.motion_sensitivity).forEach(cameraId => {
-                const slider = document.querySelector(`.sensitivity-slider[data-camera="${cameraId}"]`);
-                const display = document.querySelector(`.sensitivity-display[data-camera="${cameraId}"]`);
-                const value = data.motion_sensitivity[cameraId];
+    const timeoutInput = document.querySelector(`.timeout-input[data-camera="${cameraId}"]`);
+    if (timeoutInput && timeout !== undefined) {
+        timeoutInput.value = timeout;
+    }
 
-                if (slider) {
-                    slider.value = value;
-                }
-                if (display) {
-                    display.textContent = value;
-                }
-            });
+    // Чувствительность детекции движения
+    if (sensitivity !== undefined) {
+        const slider = document.querySelector(`.sensitivity-slider[data-camera="${cameraId}"]`);
+        const display = document.querySelector(`.sensitivity-display[data-camera="${cameraId}"]`);
+        if (slider) {
+            slider.value = sensitivity;
         }
-    } catch (error) {
-        console.error('Error loading settings:', error);
+        if (display) {
+            display.textContent = sensitivity;
+        }
+    }
+}
+
+// ========== СОСТОЯНИЕ ЧЕРЕЗ SOCKET.IO ==========
+let stateSocket = null;
+let statePollTimers = [];
+
+function startStatePolling() {
+    if (statePollTimers.length) return;
+    statePollTimers = [setInterval(checkSystemStatus, 5000), setInterval(loadMasks, 10000)];
+}
+
+function stopStatePolling() {
+    statePollTimers.forEach(timer => clearInterval(timer));
+    statePollTimers = [];
+}
+
+function connectStateSocket() {
+    if (typeof io === 'undefined') {
+        // Клиент Socket.IO не загрузился — остаёмся на периодическом опросе
+        startStatePolling();
+        return;
     }
+
+    stateSocket = io();
+    stateSocket.on('connect', () => {
+        stopStatePolling();
+        const cameras = Array.from(document.querySelectorAll('.camera-status[data-camera]'))
+            .map(el => parseInt(el.getAttribute('data-camera')));
+        // В ответ сразу приходит полное состояние камер
+        stateSocket.emit('subscribe', { cameras: cameras });
+        loadMasks();
+        streamedCameras.clear();
+        updateStreamSubscriptions();
+    });
+    stateSocket.on('disconnect', () => {
+        startStatePolling();
+        // Без соединения — обратно на MJPEG
+        streamedCameras.clear();
+        updateStreamSubscriptions();
+    });
+    stateSocket.on('system_state', applySystemState);
+    stateSocket.on('camera_state', applyCameraState);
+    stateSocket.on('frame_meta', onFrameMeta);
+    stateSocket.on('frame', showStreamFrame);
+    window.addEventListener('resize', () => Object.values(lastFrameMeta).forEach(drawFrameMeta));
+}
+
+function applySystemState(message) {
+    if ('running' in message.changes) {
+        updateSystemStatus(message.changes.running);
+        if (!message.changes.running) {
+            clearFrameMeta();
+        }
+    }
+    message.events.forEach(event => {
+        if (event.type === 'masks_changed') {
+            loadMasks();
+        }
+    });
+}
+
+// ========== ПОТОК КАДРОВ ЧЕРЕЗ WEBSOCKET ==========
+// Кадры камер приходят событием 'frame' (JPEG в бинарном виде) по одному соединению.
+// Подтверждение отправляется, когда кадр показан: медленный клиент получает меньше кадров,
+// а не копит очередь.
+const streamedCameras = new Set();
+const frameUrls = {};  // {camera: [blob URL]} — показанный кадр и ещё не загруженные
+
+function updateStreamSubscriptions() {
+    const useSocket = stateSocket && stateSocket.connected &&
+        (localStorage.getItem('streamTransport') || 'ws') === 'ws';
+    const wanted = new Set();
+    document.querySelectorAll('.camera-video').forEach(img => {
+        const camera = parseInt(img.getAttribute('data-camera'));
+        const visible = img.closest('.camera-item').style.display !== 'none';
+        if (useSocket && visible) {
+            wanted.add(camera);
+        }
+    });
+
+    const added = [...wanted].filter(camera => !streamedCameras.has(camera));
+    const removed = [...streamedCameras].filter(camera => !wanted.has(camera));
+    if (stateSocket && stateSocket.connected) {
+        if (added.length) stateSocket.emit('stream_subscribe', { cameras: added });
+        if (removed.length) stateSocket.emit('stream_unsubscribe', { cameras: removed });
+    }
+    added.forEach(camera => streamedCameras.add(camera));
+    removed.forEach(camera => streamedCameras.delete(camera));
+
+    // Камеры не по WebSocket — на multipart MJPEG
+    document.querySelectorAll('.camera-video').forEach(img => {
+        const camera = parseInt(img.getAttribute('data-camera'));
+        if (!streamedCameras.has(camera) && img.dataset.source !== 'mjpeg') {
+            img.dataset.source = 'mjpeg';
+            img.onload = img.onerror = null;
+            img.src = img.getAttribute('data-feed');
+            (frameUrls[camera] || []).splice(0).forEach(url => URL.revokeObjectURL(url));
+        }
+    });
+}
+
+function showStreamFrame(message) {
+    const img = document.querySelector(`.camera-video[data-camera="${message.camera}"]`);
+    const ack = () => stateSocket.emit('frame_ack', { camera: message.camera, id: message.id });
+    if (!img || !streamedCameras.has(message.camera)) {
+        ack();
+        return;
+    }
+    const url = URL.createObjectURL(new Blob([message.jpeg], { type: 'image/jpeg' }));
+    const urls = frameUrls[message.camera] = frameUrls[message.camera] || [];
+    urls.push(url);
+    img.dataset.source = 'ws';
+    // Если кадр пришёл раньше, чем загрузился прошлый, прошлый пропускается: подтверждение
+    // этого кадра закрывает и все более ранние
+    img.onload = img.onerror = () => {
+        img.onload = img.onerror = null;
+        urls.splice(0, urls.indexOf(url)).forEach(old => URL.revokeObjectURL(old));
+        applyFrameMeta(message.camera, message.seq);
+        ack();
+    };
+    img.src = url;
+}
+
+// ========== ПОДПИСИ ПОВЕРХ ВИДЕО ==========
+// Сервер шлёт метаданные кадра (боксы движения, лица) только при изменении — рисуем последние.
+// При потоке по WebSocket у кадра есть номер: подписи ждут кадра, к которому относятся.
+const lastFrameMeta = {};
+const pendingFrameMeta = {};
+
+function onFrameMeta(meta) {
+    if (!streamedCameras.has(meta.camera)) {
+        drawFrameMeta(meta);
+        return;
+    }
+    const queue = pendingFrameMeta[meta.camera] = pendingFrameMeta[meta.camera] || [];
+    queue.push(meta);
+    if (queue.length > 50) queue.shift();
+}
+
+function applyFrameMeta(camera, seq) {
+    const queue = pendingFrameMeta[camera];
+    if (!queue || !queue.length) return;
+    if (seq === null) {
+        // Служебный кадр («нет сигнала») — подписей нет
+        queue.length = 0;
+        clearFrameMeta(camera);
+        return;
+    }
+    // Последние метаданные с номером не больше показанного кадра; более ранние уже не нужны
+    let current = null;
+    while (queue.length && queue[0].seq <= seq) {
+        current = queue.shift();
+    }
+    if (current) drawFrameMeta(current);
+}
+
+const MOTION_COLOR = '#ff0000';
+const CONTOUR_COLOR = '#ffff00';
+const KNOWN_FACE_COLOR = '#00ff00';
+const UNKNOWN_FACE_COLOR = '#ff0000';
+
+function drawFrameMeta(meta) {
+    const canvas = document.querySelector(`.camera-overlay[data-camera="${meta.camera}"]`);
+    if (!canvas) return;
+    lastFrameMeta[meta.camera] = meta;
+
+    const width = canvas.clientWidth;
+    const height = canvas.clientHeight;
+    if (canvas.width !== width || canvas.height !== height) {
+        canvas.width = width;
+        canvas.height = height;
+    }
+    const ctx = canvas.getContext('2d');
+    ctx.clearRect(0, 0, width, height);
+    if (!width || !height) return;
+
+    // Кадр вписан в блок с сохранением пропорций (object-fit: contain)
+    const scale = Math.min(width / meta.size[0], height / meta.size[1]);
+    const left = (width - meta.size[0] * scale) / 2;
+    const top = (height - meta.size[1] * scale) / 2;
+    const drawBox = (x, y, w, h, color, label) => {
+        ctx.strokeStyle = color;
+        ctx.fillStyle = color;
+        ctx.strokeRect(left + x * scale, top + y * scale, w * scale, h * scale);
+        if (label) {
+            ctx.fillText(label, left + x * scale, top + y * scale - 4);
+        }
+    };
+
+    ctx.lineWidth = 1;
+    ctx.font = '11px sans-serif';
+    if (meta.mode === 'active') {
+        meta.objects.forEach(obj => {
+            const [x, y, w, h] = obj.box;
+            drawBox(x, y, w, h, MOTION_COLOR, String(obj.id));
+            ctx.fillStyle = CONTOUR_COLOR;
+            ctx.fillText(`${w}x${h}`, left + (x + w) * scale - 40, top + y * scale - 4);
+        });
+        ctx.font = 'bold 13px sans-serif';
+        ctx.fillStyle = MOTION_COLOR;
+        const text = meta.objects.length ? `Motion: ${meta.objects.length} objects` : 'No motion';
+        ctx.fillText(text, left + 15, top + 25);
+        if (meta.mask) {
+            ctx.fillText('Mask active', left + 15, top + 45);
+        }
+        ctx.font = '11px sans-serif';
+    }
+
+    meta.faces.forEach(face => {
+        const [x1, y1, x2, y2] = face.box;
+        let label = face.name || 'NE RASPOZNAN';
+        if (face.confidence !== null) {
+            label += ` (${face.confidence})`;
+        }
+        drawBox(x1, y1, x2 - x1, y2 - y1, face.name ? KNOWN_FACE_COLOR : UNKNOWN_FACE_COLOR, label);
+    });
+    if (meta.faces.length) {
+        ctx.font = 'bold 13px sans-serif';
+        ctx.fillStyle = KNOWN_FACE_COLOR;
+        ctx.fillText(`Faces: ${meta.faces.length}`, left + 15, top + 65);
+    }
+}
+
+function clearFrameMeta(camera) {
+    const selector = camera === undefined ? '.camera-overlay' : `.camera-overlay[data-camera="${camera}"]`;
+    document.querySelectorAll(selector).forEach(canvas => {
+        canvas.getContext('2d').clearRect(0, 0, canvas.width, canvas.height);
+        delete lastFrameMeta[canvas.getAttribute('data-camera')];
+    });
+}
+
+function applyCameraState(message) {
+    const changes = message.changes;
+    const status = document.querySelector(`.camera-status[data-camera="${message.camera}"]`);
+
+    if (status) {
+        // Приходят только изменения — полное состояние храним на элементе
+        const state = Object.assign(JSON.parse(status.dataset.state || '{}'), changes);
+        status.dataset.state = JSON.stringify(state);
+
+        const parts = [];
+        if (state.recording || state.continuous) parts.push('REC');
+        if (state.motion) parts.push('Движение');
+        if (state.faces && state.faces.length) parts.push('Лица: ' + state.faces.join(', '));
+        if (state.fps) parts.push(`${state.fps} FPS`);
+        status.textContent = parts.join(' · ');
+        status.classList.toggle('recording', Boolean(state.recording || state.continuous));
+        status.classList.toggle('motion', Boolean(state.motion));
+    }
+
+    if ('settings' in changes || 'timeout' in changes || 'sensitivity' in changes) {
+        applyCameraSettings(message.camera, changes.settings, changes.timeout, changes.sensitivity);
+    }
+
+    message.events.forEach(event => {
+        if (event.type === 'face_recognized') {
+            console.log(`Камера ${message.camera}: распознан ${event.name}`);
+        }
+    });
 }
 
 async function loadMasks() {
@@ -494,28 +789,134 @@ async function deleteMask(filename) {
     }
 }
 
-async function loadLogs() {
+// Курсор для «Загрузить более ранние»: смещение в файле лога, до которого читать
+let logsCursor = null;
+
+async function loadLogs(older = false) {
     const statusFilter = document.getElementById('statusFilter');
     const dateFilter = document.getElementById('dateFilter');
+    const cameraFilter = document.getElementById('logCameraFilter');
+    const textFilter = document.getElementById('logTextFilter');
+    const olderBtn = document.getElementById('olderLogsBtn');
     const logsContent = document.getElementById('logsContent');
 
     if (!logsContent) return;
+    if (older !== true) older = false;
+    if (older && logsCursor === null) return;
 
     try {
         let url = '/api/logs?';
         if (statusFilter && statusFilter.value) url += `status=${statusFilter.value}&`;
         if (dateFilter && dateFilter.value) url += `date=${dateFilter.value}&`;
+        if (cameraFilter && cameraFilter.value) url += `camera=${cameraFilter.value}&`;
+        if (textFilter && textFilter.value.trim()) url += `q=${encodeURIComponent(textFilter.value.trim())}&`;
+        if (older) url += `before=${logsCursor}&`;
 
         const response = await fetch(url);
         const data = await response.json();
 
-        logsContent.textContent = data.logs.join('\n');
-        logsContent.scrollTop = logsContent.scrollHeight;
+        logsCursor = data.before;
+        if (olderBtn) olderBtn.style.display = logsCursor !== null ? 'block' : 'none';
+
+        if (older) {
+            // Более ранние строки — сверху, прокрутка остаётся на том же месте
+            const container = logsContent.parentElement;
+            const height = container.scrollHeight;
+            if (data.logs.length) {
+                logsContent.textContent = data.logs.join('\n') + '\n' + logsContent.textContent;
+            }
+            container.scrollTop += container.scrollHeight - height;
+        } else {
+            logsContent.textContent = data.logs.join('\n');
+            logsContent.parentElement.scrollTop = logsContent.parentElement.scrollHeight;
+        }
     } catch (error) {
         console.error('Error loading logs:', error);
     }
 }
 
+// ========== ОБУЧЕНИЕ В ФОНЕ ==========
+async function pollTrainingJob(jobId) {
+    const statusDiv = document.getElementById('trainStatus');
+    const trainModelBtn = document.getElementById('trainModelBtn');
+    const cancelTrainBtn = document.getElementById('cancelTrainBtn');
+
+    const finish = () => {
+        if (trainModelBtn) trainModelBtn.disabled = false;
+        if (cancelTrainBtn) cancelTrainBtn.style.display = 'none';
+    };
+
+    try {
+        const response = await fetch(`/api/biometric/train/${jobId}`);
+        const job = await response.json();
+
+        if (!response.ok) {
+            statusDiv.className = 'error';
+            statusDiv.textContent = 'Ошибка: ' + (job.error || 'Неизвестная ошибка');
+            finish();
+            return;
+        }
+
+        const p = job.progress || {};
+        if (job.status === 'done') {
+            statusDiv.className = 'success';
+            statusDiv.textContent = job.result && job.result.reloaded
+                ? 'Модель обучена и загружена в работающую систему!'
+                : 'Модель успешно обучена!';
+            finish();
+        } else if (job.status === 'failed') {
+            statusDiv.className = 'error';
+            statusDiv.textContent = 'Ошибка: ' + (job.error || 'Неизвестная ошибка');
+            finish();
+        } else if (job.status === 'cancelled') {
+            statusDiv.className = 'warning';
+            statusDiv.textContent = 'Обучение отменено';
+            finish();
+        } else {
+            statusDiv.className = '';
+            statusDiv.textContent = p.total
+                ? `Обучение: ${p.done}/${p.total} фото (${p.rate} фото/с, осталось ~${p.eta} с)`
+                : 'Обучение модели...';
+            setTimeout(() => pollTrainingJob(jobId), 1000);
+        }
+    } catch (error) {
+        statusDiv.className = 'error';
+        statusDiv.textContent = 'Ошибка соединения: ' + error.message;
+        finish();
+    }
+}
+
+// ========== ОБРАБОТКА ЗАГРУЖЕННЫХ ФОТО ==========
+async function pollUploadJob(jobId) {
+    const statusDiv = document.getElementById('uploadStatus');
+
+    try {
+        const response = await fetch(`/api/biometric/upload/${jobId}`);
+        const job = await response.json();
+
+        if (!response.ok || job.status === 'failed') {
+            statusDiv.className = 'error';
+            statusDiv.textContent = 'Ошибка: ' + (job.error || 'Неизвестная ошибка');
+        } else if (job.status === 'done') {
+            const r = job.result;
+            const rejected = r.files.filter(f => !f.accepted).map(f => `${f.file}: ${f.reason}`);
+            statusDiv.className = r.accepted ? 'success' : 'warning';
+            statusDiv.textContent = `Принято лиц: ${r.accepted}, отклонено: ${r.rejected}`
+                + (rejected.length ? ' (' + rejected.join('; ') + ')' : '');
+        } else {
+            const p = job.progress || {};
+            statusDiv.className = '';
+            statusDiv.textContent = p.total
+                ? `Обработка: ${p.done}/${p.total}, принято ${p.accepted}`
+                : 'Фото в очереди на обработку...';
+            setTimeout(() => pollUploadJob(jobId), 1000);
+        }
+    } catch (error) {
+        statusDiv.className = 'error';
+        statusDiv.textContent = 'Ошибка соединения: ' + error.message;
+    }
+}
+
 // ========== COLLAPSIBLE SECTIONS ==========
 function toggleCollapsible(header) {
     const section = header.parentElement;
@@ -816,6 +1217,70 @@ async function downloadSelectedFiles() {
     }
 }
 
+// ========= Локальные записи =========
+let localRecordingsPage = 1;
+
+document.addEventListener('DOMContentLoaded', function () {
+    const searchBtn = document.getElementById('searchLocalRecordingsBtn');
+    if (!searchBtn) return;
+    document.getElementById('localRecordingsDate').value = new Date().toISOString().split('T')[0];
+    searchBtn.addEventListener('click', () => loadLocalRecordings(1));
+    document.getElementById('localRecordingsPrev').addEventListener('click',
+        () => loadLocalRecordings(Math.max(1, localRecordingsPage - 1)));
+    document.getElementById('localRecordingsNext').addEventListener('click',
+        () => loadLocalRecordings(localRecordingsPage + 1));
+});
+
+async function loadLocalRecordings(page) {
+    const resultsDiv = document.getElementById('localRecordings');
+    const statusDiv = document.getElementById('localRecordingsStatus');
+    const pager = document.getElementById('localRecordingsPager');
+    const params = new URLSearchParams({ page: page, per_page: 20 });
+    const date = document.getElementById('localRecordingsDate').value;
+    const camera = document.getElementById('localRecordingsCamera').value;
+    if (date) params.set('date', date);
+    if (camera !== '') params.set('camera', camera);
+
+    resultsDiv.innerHTML = '<p class="loading">Загрузка...</p>';
+    try {
+        const response = await fetch('/api/recordings?' + params);
+        const data = await response.json();
+        if (!response.ok) {
+            resultsDiv.innerHTML = `<p class="error-text">Ошибка: ${data.error || 'неизвестная ошибка'}</p>`;
+            return;
+        }
+        localRecordingsPage = data.page;
+        const pages = Math.max(1, Math.ceil(data.total / data.per_page));
+        statusDiv.textContent = `Записей: ${data.total}, страница ${data.page} из ${pages}`;
+        pager.style.display = data.total > data.per_page ? 'flex' : 'none';
+        if (data.items.length === 0) {
+            resultsDiv.innerHTML = '<p class="no-results">Записей не найдено</p>';
+            return;
+        }
+        resultsDiv.innerHTML = data.items.map(item => {
+            const time = new Date(item.start * 1000).toLocaleTimeString();
+            const duration = item.duration != null ? `${Math.round(item.duration)} с` : 'идёт запись';
+            const faces = item.faces.length ? ` · ${item.faces.join(', ')}` : '';
+            const links = item.urls.video
+                ? `<a href="${item.urls.video}" target="_blank">Смотреть</a>
+                   <a href="${item.urls.video}?download=1">Скачать</a>`
+                : '';
+            return `
+                <div class="archive-file-item">
+                    <img class="recording-poster" src="${item.urls.poster}" loading="lazy" alt=""
+                         onerror="this.style.visibility='hidden'">
+                    <label>
+                        <span class="file-name">Камера ${item.camera} · ${item.event || item.kind}${faces}</span>
+                        <span class="file-time">${time} · ${duration}</span>
+                        ${links}
+                    </label>
+                </div>`;
+        }).join('');
+    } catch (error) {
+        resultsDiv.innerHTML = '<p class="error-text">Не удалось подключиться к серверу</p>';
+    }
+}
+
 // Обновляем функцию showPage для загрузки настроек архива
 const originalShowPage = showPage;
 showPage = function (pageId) {
@@ -0,0 +1,137 @@
+import time
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+
+from loguru import logger
+
+from mjpeg_avi import encode_jpeg
+
+# Общий JPEG-кодер живого потока: кадр камеры сжимается один раз, сколько бы ни было зрителей
+# (multipart /video_feed и WebSocket). Зритель, который не успел, получает сразу последний кадр.
+STREAM_QUALITY = 70
+
+# version — сквозной номер в хабе (для ожидания нового кадра), seq — номер кадра камеры
+# из метаданных (frame_meta) или None для служебных кадров («нет сигнала»)
+EncodedFrame = namedtuple('EncodedFrame', 'version seq time jpeg')
+
+
+class FrameHub:
+    """
+    Последний кадр каждой камеры: put() из цикла камер, сжатие — в потоке хаба и только
+    для камер со зрителями; если кадр не успели сжать до следующего — он пропускается.
+    signal — сигнал для зрителей-гринлетов (serving.frame_signal); без него ждут на Condition.
+    """
+
+    def __init__(self, quality=STREAM_QUALITY, signal=None):
+        self.quality = quality
+        self.signal = signal
+        self.encoded = 0
+        self.skipped = 0
+        self._cond = threading.Condition()
+        self._raw = {}       # {camera: (seq, время, кадр)} — ждут сжатия
+        self._frames = {}    # {camera: EncodedFrame}
+        self._viewers = {}   # {camera: число зрителей}
+        self._version = 0
+        self._thread = None
+
+    # ========= Зрители =========
+    def add_viewer(self, camera):
+        with self._cond:
+            self._viewers[camera] = self._viewers.get(camera, 0) + 1
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="frame-hub", daemon=True)
+            self._thread.start()
+
+    def remove_viewer(self, camera):
+        with self._cond:
+            count = self._viewers.get(camera, 0) - 1
+            if count > 0:
+                self._viewers[camera] = count
+            else:
+                # Без зрителей старый кадр не нужен — новый зритель не увидит застывшую картинку
+                self._viewers.pop(camera, None)
+                self._frames.pop(camera, None)
+                self._raw.pop(camera, None)
+
+    @contextmanager
+    def viewer(self, camera):
+        self.add_viewer(camera)
+        try:
+            yield
+        finally:
+            self.remove_viewer(camera)
+
+    # ========= Кадры =========
+    def put(self, camera, frame, seq=None, timestamp=None):
+        """Новый кадр камеры (кадр дальше не должен меняться); без зрителей — ничего не делает"""
+        with self._cond:
+            if not self._viewers.get(camera):
+                return
+            if camera in self._raw:
+                self.skipped += 1
+            self._raw[camera] = (seq, timestamp or time.time(), frame)
+            self._cond.notify_all()
+
+    def latest(self, camera):
+        with self._cond:
+            return self._frames.get(camera)
+
+    def wait(self, camera, after=0, timeout=None):
+        """Кадр камеры новее версии after или None по таймауту"""
+        self._wait_until(lambda: self._newer(camera, after), timeout)
+        with self._cond:
+            frame = self._frames.get(camera)
+            return frame if frame is not None and frame.version > after else None
+
+    def wait_any(self, known, timeout=None):
+        """{camera: EncodedFrame} для камер, где есть кадр новее known[camera]"""
+        self._wait_until(lambda: self._updates(known), timeout)
+        with self._cond:
+            return self._updates(known)
+
+    def _wait_until(self, predicate, timeout):
+        if self.signal is None or not self.signal.in_hub_thread():
+            with self._cond:
+                self._cond.wait_for(predicate, timeout)
+            return
+        # Гринлет: Condition заблокировал бы весь хаб — ждём сигнала, проверяя условие
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._cond:
+                if predicate():
+                    return
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return
+            self.signal.wait(remaining)
+
+    def _newer(self, camera, after):
+        frame = self._frames.get(camera)
+        return frame is not None and frame.version > after
+
+    def _updates(self, known):
+        return {camera: frame for camera, frame in self._frames.items()
+                if frame.version > known.get(camera, 0)}
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._raw)
+                batch, self._raw = self._raw, {}
+            # Сжатие вне блокировки: cv2 отпускает GIL, цикл камер не ждёт
+            for camera, (seq, timestamp, frame) in batch.items():
+                try:
+                    jpeg = encode_jpeg(frame, self.quality)
+                except Exception as e:
+                    logger.error(f"Stream encoding failed for camera {camera}: {e}")
+                    continue
+                with self._cond:
+                    if not self._viewers.get(camera):
+                        continue
+                    self._version += 1
+                    self._frames[camera] = EncodedFrame(self._version, seq, timestamp, jpeg)
+                    self.encoded += 1
+                    self._cond.notify_all()
+                if self.signal is not None:
+                    self.signal.notify()
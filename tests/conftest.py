@@ -0,0 +1,26 @@
+import os
+import sys
+
+import cv2
+import numpy as np
+import pytest
+
+# Модули проекта лежат в корне репозитория
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def count_frames(path):
+    """Число кадров видео при чтении через cv2.VideoCapture"""
+    cap = cv2.VideoCapture(path)
+    frames = 0
+    while cap.read()[0]:
+        frames += 1
+    cap.release()
+    return frames
+
+
+@pytest.fixture
+def frame():
+    """Кадр 64x48 с градиентом (однотонный JPEG слишком мал для проверок размера)"""
+    row = np.linspace(0, 255, 64, dtype=np.uint8)
+    return np.dstack([np.tile(row, (48, 1))] * 3)
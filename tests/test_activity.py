@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from activity import ActivitySeries, activity_ranges, load_activity, recording_activity, ACTIVITY_DTYPE
+from recordings_index import RecordingsIndex
+
+
+def series_of(motion, faces=()):
+    series = np.zeros(len(motion), dtype=ACTIVITY_DTYPE)
+    series['motion'] = motion
+    for second in faces:
+        series['face'][second] = 1
+    return series
+
+
+def test_series_keeps_peaks_per_second_and_pads_to_duration(tmp_path):
+    video = str(tmp_path / "clip.avi")
+    series = ActivitySeries()
+    series.add(100.0, 0.1, objects=1)
+    series.add(100.5, 0.3, objects=2)
+    series.add(102.2, 0.05, face=True)
+    series.add(99.0, 0.9)  # раньше начала — не учитывается
+    series.save(video, duration=5.5)
+
+    data = load_activity(video)
+    assert len(data) == 6
+    assert data['motion'][0] == pytest.approx(0.3, abs=1e-3)
+    assert list(data['objects'][:3]) == [2, 0, 0]
+    assert list(data['face']) == [0, 0, 1, 0, 0, 0]
+    assert load_activity(str(tmp_path / "missing.avi")) is None
+
+
+def test_series_grows_beyond_initial_buffer():
+    series = ActivitySeries()
+    series.add(0.0, 0.0)
+    series.add(500.0, 0.2)
+    assert series.length == 501
+
+
+def test_ranges_merge_short_gaps():
+    motion = [0, 0.2, 0, 0, 0.3, 0, 0, 0, 0, 0.5, 0]
+    ranges = activity_ranges(series_of(motion), threshold=0.1, merge_gap=2)
+    assert [(r['start'], r['end']) for r in ranges] == [(1, 5), (9, 10)]
+    assert ranges[0]['peak_motion'] == pytest.approx(0.3, abs=1e-3)
+    assert activity_ranges(series_of([0, 0, 0])) == []
+
+
+def test_face_alone_makes_second_active():
+    ranges = activity_ranges(series_of([0, 0, 0, 0], faces=[2]))
+    assert [(r['start'], r['end'], r['face']) for r in ranges] == [(2, 3, True)]
+
+
+def test_recording_activity_of_event_uses_its_segments(tmp_path):
+    index = RecordingsIndex(str(tmp_path / "index.db"))
+    try:
+        segment = str(tmp_path / "segment.avi")
+        index.recording_started(segment, "segment", 1, "continuous", 1000.0)
+        index.recording_finished(segment, 1000.0, 1060.0, 480, 1)
+        np.save(str(tmp_path / "segment.activity.npy"), series_of([0.0] * 5 + [0.5] * 2 + [0.0] * 40 + [0.5]))
+        index.add_event(1, "motion_detected", 1004.0, 1010.0, [{'file': segment, 'offset': 4.0}])
+        event = index.query(kind="event")[0][0]
+
+        result = recording_activity(index, event)
+        assert [(r['start'], r['end'], r['offset']) for r in result] == [(1005.0, 1007.0, 5)]
+        assert result[0]['file'] == segment
+    finally:
+        index.close()
@@ -0,0 +1,143 @@
+import json
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+import AI_face
+import face_cache
+
+pytestmark = pytest.mark.skipif(not hasattr(cv2, "face"), reason="нужен opencv-contrib-python (cv2.face)")
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Датасет, кэш лиц и файлы модели — относительные пути, всё во временной папке"""
+    monkeypatch.chdir(tmp_path)
+    extracted = []
+
+    def fake_extract(path):
+        # Вместо поиска лиц — само фото как одно «лицо»
+        extracted.append(path.replace("\\", "/"))
+        img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        return None if img is None else img.reshape(1, 100, 100)
+
+    monkeypatch.setattr(face_cache, "extract_file", fake_extract)
+    return extracted
+
+
+def add_photo(person, name, seed):
+    folder = os.path.join(AI_face.DATASET_PATH, person)
+    os.makedirs(folder, exist_ok=True)
+    img = np.random.default_rng(seed).integers(0, 256, (100, 100), dtype=np.uint8)
+    cv2.imwrite(os.path.join(folder, name), img)
+
+
+def model_size():
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    recognizer.read(AI_face.MODEL_PATH)
+    return len(recognizer.getHistograms())
+
+
+def manifest():
+    with open(AI_face.MANIFEST_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_new_photos_are_added_without_retraining(workdir):
+    add_photo("anna", "1.png", 1)
+    add_photo("boris", "1.png", 2)
+    assert AI_face.learning() is True
+    assert model_size() == 2
+    labels = manifest()["labels"]
+
+    add_photo("anna", "2.png", 3)
+    add_photo("vera", "1.png", 4)
+    workdir.clear()
+    assert AI_face.learning() is True
+    # Дообучение: декодируются только новые фото, ID старых людей не сдвигаются
+    assert sorted(workdir) == ["dataset/anna/2.png", "dataset/vera/1.png"]
+    assert model_size() == 4
+    assert manifest()["labels"] == {**labels, "vera": 2}
+    assert np.load(AI_face.LABELS_PATH, allow_pickle=True).item() == {0: "anna", 1: "boris", 2: "vera"}
+
+    workdir.clear()
+    assert AI_face.learning() is False
+    assert workdir == []
+
+
+def test_changed_photo_triggers_full_retrain_from_cache(workdir):
+    add_photo("anna", "1.png", 1)
+    add_photo("anna", "2.png", 2)
+    AI_face.learning()
+
+    add_photo("anna", "2.png", 5)  # тот же файл, другое содержимое
+    workdir.clear()
+    assert AI_face.learning() is True
+    # Полное переобучение: неизменённое фото берётся из кэша лиц
+    assert workdir == ["dataset/anna/2.png"]
+    assert model_size() == 2
+
+
+def test_full_retrain_when_requested_or_manifest_is_old(workdir):
+    add_photo("anna", "1.png", 1)
+    AI_face.learning()
+    add_photo("anna", "2.png", 2)
+    assert AI_face.learning(incremental=False) is True
+    assert model_size() == 2
+
+    data = manifest()
+    data["version"] = AI_face.MANIFEST_VERSION - 1
+    with open(AI_face.MANIFEST_PATH, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    add_photo("anna", "3.png", 3)
+    assert AI_face.learning() is True
+    assert model_size() == 3
+    assert manifest()["version"] == AI_face.MANIFEST_VERSION
+
+
+def test_cancel_before_writing_keeps_previous_model(workdir):
+    add_photo("anna", "1.png", 1)
+    AI_face.learning()
+    add_photo("anna", "2.png", 2)
+
+    calls = []
+
+    def check_cancelled():
+        calls.append(1)
+        if len(calls) == 3:  # последняя точка отмены перед записью
+            raise RuntimeError("cancelled")
+
+    with pytest.raises(RuntimeError):
+        AI_face.learning(check_cancelled=check_cancelled)
+    assert model_size() == 1
+    assert "anna/2.png" not in manifest()["files"]
+
+
+def test_parallel_extraction_keeps_order_and_reports_progress(monkeypatch):
+    threads = set()
+
+    def slow_extract(path):
+        threads.add(threading.get_ident())
+        time.sleep(0.01 * (int(path) % 3))  # поздние файлы могут закончиться раньше
+        return int(path)
+
+    monkeypatch.setattr(face_cache, "extract_file", slow_extract)
+    monkeypatch.setattr(AI_face, "TRAIN_WORKERS", 4)
+    progress = []
+    paths = [str(n) for n in range(12)]
+
+    results = list(AI_face._extract_parallel(paths, lambda done, total, rate, eta: progress.append((done, total))))
+    assert results == list(range(12))
+    assert progress == [(n, 12) for n in range(1, 13)]
+    assert len(threads) > 1
+
+
+def test_single_worker_extracts_in_caller_thread(monkeypatch):
+    caller = threading.get_ident()
+    monkeypatch.setattr(face_cache, "extract_file", lambda path: threading.get_ident())
+    monkeypatch.setattr(AI_face, "TRAIN_WORKERS", 1)
+    assert list(AI_face._extract_parallel(["a", "b"])) == [caller, caller]
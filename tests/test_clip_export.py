@@ -0,0 +1,93 @@
+import cv2
+import numpy as np
+import pytest
+
+from clip_export import plan_export, export_stream, frame_times
+from mjpeg_avi import MJPEGAviWriter, AviInfo
+from recordings_index import RecordingsIndex
+from conftest import count_frames
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = RecordingsIndex(str(tmp_path / "index.db"))
+    yield index
+    index.close()
+
+
+def add_segment(index, tmp_path, name, start, seconds, fps=4, size=(64, 48)):
+    path = str(tmp_path / name)
+    writer = MJPEGAviWriter(path, fps, size)
+    for i in range(seconds * fps):
+        writer.write(np.full((size[1], size[0], 3), i % 256, dtype=np.uint8))
+    writer.release()
+    index.recording_started(path, "segment", 1, "continuous", start)
+    index.recording_finished(path, start, start + seconds, seconds * fps, 0)
+    return path
+
+
+def export_to_file(parts, path):
+    stream, total = export_stream(parts)
+    data = b"".join(stream)
+    with open(path, "wb") as f:
+        f.write(data)
+    return data, total
+
+
+def test_avi_info_reads_writer_output(index, tmp_path):
+    path = add_segment(index, tmp_path, "a.avi", 1000.0, 2)
+    info = AviInfo(path)
+    assert info.is_mjpeg
+    assert info.fps == pytest.approx(4)
+    assert tuple(info.size) == (64, 48)
+    assert len(info.frames) == 8
+
+
+def test_plan_selects_frames_inside_range(index, tmp_path):
+    add_segment(index, tmp_path, "a.avi", 1000.0, 10)
+    add_segment(index, tmp_path, "b.avi", 1010.0, 10)
+    parts = plan_export(index, 1, 1008.0, 1012.0)
+    assert [(p.first, p.last) for p in parts] == [(32, 40), (0, 9)]
+    assert plan_export(index, 2, 1000.0, 1020.0) == []
+
+
+def test_passthrough_export_has_exact_size(index, tmp_path):
+    add_segment(index, tmp_path, "a.avi", 1000.0, 5)
+    add_segment(index, tmp_path, "b.avi", 1005.0, 5)
+    parts = plan_export(index, 1, 1000.0, 1010.0)
+    data, total = export_to_file(parts, str(tmp_path / "out.avi"))
+    assert total == len(data)
+    cap = cv2.VideoCapture(str(tmp_path / "out.avi"))
+    assert cap.get(cv2.CAP_PROP_FPS) == pytest.approx(4)
+    cap.release()
+    assert count_frames(str(tmp_path / "out.avi")) == 40
+
+
+def test_parts_are_conformed_to_first_fps_and_size(index, tmp_path):
+    add_segment(index, tmp_path, "a.avi", 1000.0, 5, fps=4, size=(64, 48))
+    add_segment(index, tmp_path, "b.avi", 1005.0, 5, fps=8, size=(32, 24))
+    parts = plan_export(index, 1, 1000.0, 1010.0)
+    out = str(tmp_path / "out.avi")
+    _, total = export_to_file(parts, out)
+    assert total is None  # второй кусок перекодируется — размер заранее неизвестен
+    cap = cv2.VideoCapture(out)
+    sizes = set()
+    frames = 0
+    while True:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        frames += 1
+        sizes.add(frame.shape[:2])
+    cap.release()
+    assert sizes == {(48, 64)}
+    assert frames == 40  # 5 с по 4 кадра + 5 с, прорежённые с 8 до 4 кадров/с
+
+
+def test_frame_times_follow_capture_timestamps(tmp_path):
+    path = str(tmp_path / "a.avi")
+    with open(str(tmp_path / "a.timestamps.csv"), "w", encoding="utf-8") as f:
+        f.write("frame,timestamp\n0,100.000\n3,100.900\n")
+    times = frame_times(path, 100.0, 4, 5)
+    np.testing.assert_allclose(times, [100.0, 100.25, 100.5, 100.9, 101.15])
+    np.testing.assert_allclose(frame_times(str(tmp_path / "b.avi"), 50.0, 2, 3), [50.0, 50.5, 51.0])
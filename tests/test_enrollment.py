@@ -0,0 +1,108 @@
+import zipfile
+
+import numpy as np
+
+import enrollment
+import face_cache
+from enrollment import EnrollmentCapture, asymmetry
+
+
+def face(value):
+    return np.full((100, 100), value, dtype=np.uint8)
+
+
+def test_similar_faces_keep_the_better_one():
+    capture = EnrollmentCapture(target=5)
+    capture._keep(10.0, face(100))
+    capture._keep(20.0, face(102))  # отличие меньше MIN_DIFFERENCE
+    capture._keep(5.0, face(101))
+    assert len(capture.samples) == 1
+    assert capture.samples[0][0] == 20.0
+
+
+def test_worst_sample_is_replaced_when_full():
+    capture = EnrollmentCapture(target=2)
+    capture._keep(10.0, face(0))
+    capture._keep(30.0, face(100))
+    capture._keep(20.0, face(200))
+    capture._keep(1.0, face(50))
+    assert sorted(score for score, _ in capture.samples) == [20.0, 30.0]
+    assert [f[0, 0] for f in capture.best_faces()] == [100, 200]
+    assert capture.best_faces()[0].dtype == np.uint8
+
+
+def test_done_when_all_samples_are_good_or_time_is_up():
+    capture = EnrollmentCapture(target=2)
+    capture._keep(enrollment.GOOD_SCORE, face(0))
+    assert not capture.done
+    capture._keep(enrollment.GOOD_SCORE + 1, face(100))
+    assert capture.done
+    assert EnrollmentCapture(max_duration=0).done
+
+
+def test_frame_without_face_is_counted_and_ignored():
+    capture = EnrollmentCapture()
+    assert capture.offer(np.zeros((240, 320, 3), dtype=np.uint8)) is None
+    assert capture.frames_seen == 1 and not capture.samples
+
+
+def test_asymmetry_of_mirrored_face_is_zero():
+    half = np.tile(np.arange(50, dtype=np.uint8), (100, 1))
+    assert asymmetry(np.hstack([half, np.fliplr(half)])) == 0.0
+    assert asymmetry(np.hstack([np.zeros((100, 50), np.uint8), np.full((100, 50), 255, np.uint8)])) == 1.0
+
+
+class FakeJob:
+    def __init__(self):
+        self.progress = {}
+
+    def check_cancelled(self):
+        pass
+
+    def update(self, **progress):
+        self.progress.update(progress)
+
+
+def test_person_name_is_safe_directory_name():
+    assert enrollment.person_name("  Иванов   Иван ") == "Иванов Иван"
+    assert enrollment.person_name("../../etc/passwd") == "etcpasswd"
+    assert enrollment.person_name("a\\b") == "ab"
+    for raw in ("", "..", "/", None):
+        assert enrollment.person_name(raw) is None
+
+
+def test_dhash_detects_near_duplicates():
+    gradient = np.tile(np.arange(0, 200, 2, dtype=np.uint8), (100, 1))
+    h = enrollment.dhash(gradient)
+    assert enrollment._is_duplicate(enrollment.dhash(gradient + 1), [h])
+    assert not enrollment._is_duplicate(enrollment.dhash(np.fliplr(gradient)), [h])
+
+
+def test_process_upload_reads_zip_and_rejects_duplicates(tmp_path, monkeypatch):
+    monkeypatch.setattr(face_cache, "CACHE_DIR", str(tmp_path / "face_cache"))
+    # Лицо определяется по первому байту «фото»: 1 и 2 — разные лица, 0 — лица нет
+    faces = {1: np.tile(np.arange(0, 200, 2, dtype=np.uint8), (100, 1))}
+    faces[2] = np.fliplr(faces[1])
+    monkeypatch.setattr(enrollment, "extract_upload_face",
+                        lambda data: (faces[data[0]], None) if data[0] in faces else (None, "no face"))
+
+    staging = tmp_path / "staging"
+    staging.mkdir()
+    (staging / "a.jpg").write_bytes(b"\x01")
+    with zipfile.ZipFile(staging / "more.zip", "w") as archive:
+        archive.writestr("b.jpg", b"\x01")
+        archive.writestr("c.png", b"\x02")
+        archive.writestr("d.jpg", b"\x00")
+        archive.writestr("notes.txt", b"\x02")
+    (staging / "broken.zip").write_bytes(b"not a zip")
+    paths = [str(staging / name) for name in ("a.jpg", "more.zip", "broken.zip")]
+
+    job = FakeJob()
+    result = enrollment.process_upload(job, "Анна", paths, str(staging))
+    reasons = {item["file"]: item["reason"] for item in result["files"]}
+    assert reasons == {"a.jpg": None, "more.zip/b.jpg": "duplicate", "more.zip/c.png": None,
+                       "more.zip/d.jpg": "no face", "broken.zip": "cannot read file"}
+    assert result["accepted"] == 2
+    assert job.progress == {"done": 5, "total": 5, "accepted": 2}
+    assert not staging.exists()
+    assert len(face_cache.list_captures()["Анна"]) == 2
@@ -0,0 +1,71 @@
+import threading
+
+from events import EventBus, MAX_EVENTS
+
+
+def collect(bus):
+    messages = []
+    bus.subscribe(lambda camera, changes, events: messages.append((camera, changes, events)))
+    bus.stop()  # рассылку в тестах вызываем сами (flush)
+    return messages
+
+
+def test_only_changes_are_sent():
+    bus = EventBus()
+    messages = collect(bus)
+    bus.set(1, motion=True, fps=8)
+    assert bus.flush() == 1
+    bus.set(1, motion=True, fps=7)
+    bus.flush()
+    assert messages == [(1, {'motion': True, 'fps': 8}, []), (1, {'fps': 7}, [])]
+    bus.set(1, motion=True)
+    assert bus.flush() == 0
+
+
+def test_value_returning_to_sent_is_not_sent():
+    bus = EventBus()
+    messages = collect(bus)
+    bus.set(2, recording=False)
+    bus.flush()
+    bus.set(2, recording=True)
+    bus.set(2, recording=False)  # до рассылки вернулось к отправленному
+    assert bus.flush() == 0
+    assert bus.snapshot(2) == {'recording': False}
+    assert len(messages) == 1
+
+
+def test_events_are_capped_per_interval():
+    bus = EventBus()
+    messages = collect(bus)
+    for i in range(MAX_EVENTS + 10):
+        bus.publish(None, 'face', name=str(i))
+    bus.flush()
+    _, changes, events = messages[0]
+    assert changes == {} and len(events) == MAX_EVENTS
+    assert events[0] == {'type': 'face', 'name': '0'}
+
+
+def test_failing_subscriber_does_not_stop_others():
+    bus = EventBus()
+    received = []
+
+    def broken(*args):
+        raise RuntimeError("boom")
+
+    bus.subscribe(broken)
+    bus.subscribe(lambda *args: received.append(args))
+    bus.stop()
+    bus.set(1, motion=True)
+    bus.flush()
+    assert received == [(1, {'motion': True}, [])]
+
+
+def test_background_thread_delivers_changes():
+    bus = EventBus(interval=0.01)
+    delivered = threading.Event()
+    bus.subscribe(lambda camera, changes, events: delivered.set())
+    try:
+        bus.set(3, motion=True)
+        assert delivered.wait(2)
+    finally:
+        bus.stop()
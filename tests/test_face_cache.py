@@ -0,0 +1,79 @@
+import os
+import json
+
+import numpy as np
+import pytest
+
+import face_cache
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(face_cache, "CACHE_DIR", str(tmp_path / "face_cache"))
+    return tmp_path / "face_cache"
+
+
+def faces(value, count=1):
+    return np.full((count, 100, 100), value, dtype=np.uint8)
+
+
+def test_add_and_get_samples():
+    face_cache.add_many("anna", [("k1", faces(1, 2)), ("k2", faces(2))])
+    assert face_cache.get_samples("anna", "k1").shape == (2, 100, 100)
+    assert face_cache.get_samples("anna", "k2")[0, 0, 0] == 2
+    assert face_cache.get_samples("anna", "missing") is None
+
+
+def test_existing_key_is_not_added_again(cache_dir):
+    face_cache.add_many("anna", [("k1", faces(1))])
+    face_cache.add_many("anna", [("k1", faces(9))])
+    assert face_cache.get_samples("anna", "k1")[0, 0, 0] == 1
+    assert len(os.listdir(cache_dir / "anna")) == 2  # один массив + index.json
+
+
+def test_add_does_not_rewrite_open_arrays(cache_dir):
+    face_cache.add_many("anna", [("k1", faces(1))])
+    person_data = face_cache.load_person("anna")
+    before = {name: os.stat(cache_dir / "anna" / name).st_mtime_ns for name in person_data[0]}
+    face_cache.add_many("anna", [("k2", faces(2))])
+    # Прежний файл не заменён и читается через старый mmap
+    assert {name: os.stat(cache_dir / "anna" / name).st_mtime_ns for name in before} == before
+    assert face_cache.get_samples("anna", "k1", person_data)[0, 0, 0] == 1
+    assert face_cache.get_samples("anna", "k2")[0, 0, 0] == 2
+
+
+def test_legacy_single_array_is_read(cache_dir):
+    person_dir = cache_dir / "anna"
+    person_dir.mkdir(parents=True)
+    np.save(person_dir / "crops.npy", np.concatenate([faces(1, 2), faces(2)]))
+    with open(person_dir / "index.json", "w", encoding="utf-8") as f:
+        json.dump({"a": [0, 2], "b": [2, 1], "broken": [3, 5]}, f)
+    shards, index = face_cache.load_person("anna")
+    assert sorted(index) == ["a", "b"]
+    face_cache.add_many("anna", [("c", faces(3))])
+    assert face_cache.get_samples("anna", "b")[0, 0, 0] == 2
+    assert face_cache.get_samples("anna", "c")[0, 0, 0] == 3
+
+
+def test_shards_are_merged_above_limit(cache_dir, monkeypatch):
+    monkeypatch.setattr(face_cache, "MAX_SHARDS", 3)
+    for i in range(5):
+        face_cache.add_many("anna", [(f"k{i}", faces(i + 1, i + 1))])
+    shards, index = face_cache.load_person("anna")
+    assert len(shards) < 3
+    assert sorted(os.listdir(cache_dir / "anna")) == sorted(list(shards) + ["index.json"])
+    for i in range(5):
+        samples = face_cache.get_samples("anna", f"k{i}")
+        assert samples.shape[0] == i + 1 and samples[0, 0, 0] == i + 1
+
+
+def test_captures_are_listed_per_person():
+    keys = face_cache.add_captures("anna", faces(7, 2) + np.arange(2, dtype=np.uint8)[:, None, None])
+    face_cache.add_many("boris", [("photo", faces(1))])
+    assert face_cache.list_captures() == {"anna": sorted(keys)}
+
+
+def test_damaged_index_is_treated_as_empty(cache_dir):
+    (cache_dir / "anna").mkdir(parents=True)
+    (cache_dir / "anna" / "index.json").write_text("{", encoding="utf-8")
+    assert face_cache.load_person("anna") == ({}, {})
@@ -0,0 +1,57 @@
+import cv2
+import numpy as np
+import pytest
+
+from face_detection import DNN_INPUT_SIZE, DNN_MEAN, DNNFaceDetector, scale_face_boxes
+
+
+class FakeNet:
+    """Сеть-заглушка: запоминает входы и отдаёт заданные строки детекций"""
+
+    def __init__(self, rows_per_call):
+        self.rows_per_call = list(rows_per_call)
+        self.inputs = []
+
+    def setInput(self, blob):
+        self.inputs.append(blob.copy())
+
+    def forward(self):
+        return np.array(self.rows_per_call.pop(0), dtype=np.float32).reshape(1, 1, -1, 7)
+
+
+def frames(count, size=(64, 48)):
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8) for _ in range(count)]
+
+
+@pytest.mark.parametrize("swap_rb", [True, False])
+def test_blob_matches_blob_from_images(swap_rb):
+    images = frames(3)
+    detector = DNNFaceDetector(FakeNet([]), max_batch=4, swap_rb=swap_rb)
+    expected = cv2.dnn.blobFromImages(images, 1.0, DNN_INPUT_SIZE, DNN_MEAN, swapRB=swap_rb, crop=False)
+    np.testing.assert_allclose(detector._make_blob(images), expected, atol=1e-4)
+
+
+def test_batches_are_split_and_boxes_go_to_their_frames():
+    net = FakeNet([
+        # Первая пачка (кадры 0, 1): лицо на кадре 1 и слабая детекция на кадре 0
+        [[0, 1, 0.3, 0.1, 0.1, 0.2, 0.2], [1, 1, 0.9, -0.1, 0.2, 0.5, 1.2]],
+        # Вторая пачка (кадр 2): image_id считается внутри пачки
+        [[0, 1, 0.8, 0.5, 0.5, 0.75, 0.75]],
+    ])
+    detector = DNNFaceDetector(net, max_batch=2, conf_threshold=0.5)
+    results = detector.detect_batch(frames(3))
+
+    assert [blob.shape[0] for blob in net.inputs] == [2, 1]
+    assert results[0] == []
+    assert results[1] == [pytest.approx([0.0, 0.2, 0.5, 1.0, 0.9])]
+    assert results[2] == [pytest.approx([0.5, 0.5, 0.75, 0.75, 0.8])]
+
+
+def test_scale_face_boxes_drops_empty_boxes():
+    boxes = [[0.0, 0.2, 0.5, 1.0, 0.9], [0.5, 0.5, 0.5, 0.7, 0.8]]
+    assert scale_face_boxes(boxes, (48, 64, 3)) == [[0, 9, 32, 48]]
+
+
+def test_load_returns_none_without_model_files(tmp_path):
+    assert DNNFaceDetector.load(str(tmp_path / "deploy.prototxt"), str(tmp_path / "model.caffemodel")) is None
@@ -0,0 +1,52 @@
+import cv2
+import numpy as np
+import pytest
+
+import face_model_store
+from face_model_store import lbp_histogram, load_store, export_recognizer
+
+pytestmark = pytest.mark.skipif(not hasattr(cv2, "face"), reason="нужен opencv-contrib (cv2.face)")
+
+
+@pytest.fixture
+def faces():
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 256, (100, 100), dtype=np.uint8) for _ in range(9)]
+
+
+@pytest.fixture
+def recognizer(faces):
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    recognizer.train(faces, np.arange(len(faces)) % 3)
+    return recognizer
+
+
+def test_histograms_match_opencv(faces, recognizer):
+    for face, expected in zip(faces, recognizer.getHistograms()):
+        np.testing.assert_allclose(lbp_histogram(face), np.ravel(expected), atol=1e-6)
+
+
+def test_store_round_trip_keeps_float32(recognizer, tmp_path):
+    export_recognizer(recognizer, {0: "a", 1: "b", 2: "c"}, store_dir=str(tmp_path))
+    model, header = load_store(str(tmp_path))
+    assert model.histograms.dtype == np.float32
+    assert header["count"] == 9
+    assert model.names == {0: "a", 1: "b", 2: "c"}
+
+
+def test_predictions_match_opencv(faces, recognizer, tmp_path):
+    export_recognizer(recognizer, {0: "a", 1: "b", 2: "c"}, store_dir=str(tmp_path))
+    model, _ = load_store(str(tmp_path))
+    rng = np.random.default_rng(1)
+    queries = faces[:3] + [rng.integers(0, 256, (100, 100), dtype=np.uint8) for _ in range(5)]
+    labels, distances = model.predict_batch(queries)
+    for face, label, distance in zip(queries, labels, distances):
+        expected_label, expected_distance = recognizer.predict(face)
+        assert label == expected_label
+        assert distance == pytest.approx(expected_distance, abs=1e-4)
+
+
+def test_store_of_other_format_is_ignored(recognizer, tmp_path, monkeypatch):
+    export_recognizer(recognizer, {}, store_dir=str(tmp_path))
+    monkeypatch.setattr(face_model_store, "STORE_FORMAT", face_model_store.STORE_FORMAT + 1)
+    assert load_store(str(tmp_path)) == (None, None)
@@ -0,0 +1,65 @@
+import time
+import threading
+
+from jobs import JobRegistry
+
+
+def wait_done(job, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while job.active and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return job.to_dict()
+
+
+def test_submit_records_result():
+    job = JobRegistry().submit("calc", lambda job, x: x * 2, 21)
+    assert wait_done(job)["status"] == "done"
+    assert job.result == 42
+
+
+def test_failed_and_cancelled_jobs():
+    registry = JobRegistry()
+
+    def fail(job):
+        raise ValueError("boom")
+
+    def cancelled(job):
+        job.cancel()
+        job.check_cancelled()
+
+    failed = registry.submit("x", fail)
+    assert wait_done(failed)["error"] == "boom"
+    assert wait_done(registry.submit("x", cancelled))["status"] == "cancelled"
+
+
+def test_submit_unique_starts_one_job_under_concurrency():
+    registry = JobRegistry()
+    release = threading.Event()
+    results = []
+
+    def submit():
+        results.append(registry.submit_unique("train", lambda job: release.wait(5)))
+
+    threads = [threading.Thread(target=submit) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    started = [job for job, created in results if created]
+    assert len(started) == 1
+    assert {job.id for job, _ in results} == {started[0].id}
+    release.set()
+    wait_done(started[0])
+    _, created = registry.submit_unique("train", lambda job: None)
+    assert created
+
+
+def test_enqueued_job_cancelled_while_waiting():
+    registry = JobRegistry()
+    release = threading.Event()
+    first = registry.enqueue("upload", lambda job: release.wait(5))
+    second = registry.enqueue("upload", lambda job: "ran")
+    second.cancel()
+    release.set()
+    assert wait_done(first)["status"] == "done"
+    assert wait_done(second)["status"] == "cancelled"
@@ -0,0 +1,129 @@
+import io
+import zipfile
+
+import pytest
+
+import log_archive
+from log_archive import ArchiveSummaries, iter_chunks, iter_lines, log_days, search_days
+from log_reader import LogFilter
+
+
+def log_line(date, n, level="INFO", camera=0):
+    return f"{date} 12:00:{n % 60:02d} | {level:<8} | [CAM{camera}] event {date} {n}"
+
+
+def day_lines(date, count=50, errors=()):
+    return [log_line(date, n, "ERROR" if n in errors else "INFO", camera=1 if n in errors else 0)
+            for n in range(count)]
+
+
+def write_zip(path, lines):
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr(path.name[:-4], "\n".join(lines) + "\n")
+
+
+@pytest.fixture
+def logs(tmp_path):
+    """Три дня: два сжатых, текущий .log; ERROR на камере 1 есть только 29-го и 1-го"""
+    logs = tmp_path / "logs"
+    logs.mkdir()
+    write_zip(logs / "2024-04-29.log.zip", day_lines("2024-04-29", errors=(10,)))
+    write_zip(logs / "2024-04-30.log.zip", day_lines("2024-04-30"))
+    (logs / "2024-05-01.log").write_text("\n".join(day_lines("2024-05-01", errors=(5, 40))) + "\n")
+    (logs / "other.txt").write_text("not a log")
+    return logs
+
+
+def test_log_days_newest_first(logs):
+    days = log_days(str(logs))
+    assert [date for date, _ in days] == ["2024-05-01", "2024-04-30", "2024-04-29"]
+    assert days[-1][1] == [str(logs / "2024-04-29.log.zip")]
+    assert log_days(str(logs / "missing")) == []
+
+
+def test_iter_lines_reads_archive(logs):
+    lines = list(iter_lines(str(logs / "2024-04-30.log.zip")))
+    assert len(lines) == 50
+    assert lines[0].rstrip("\n") == log_line("2024-04-30", 0)
+
+
+@pytest.mark.parametrize("size", [1, 7, 1000])
+def test_iter_chunks_yields_whole_lines(size):
+    data = b"first\nsecond line\nthird\nno newline"
+    chunks = list(iter_chunks(io.BytesIO(data), size=size))
+    assert "".join(chunks) == data.decode()
+    assert all(chunk.endswith("\n") for chunk in chunks[:-1])
+
+
+def test_search_newest_and_oldest_first(logs):
+    days = log_days(str(logs))
+    errors = LogFilter(level="ERROR")
+
+    lines, stats = search_days(days, errors, limit=10, workers=2)
+    assert lines == [log_line("2024-04-29", 10, "ERROR", 1),
+                     log_line("2024-05-01", 5, "ERROR", 1),
+                     log_line("2024-05-01", 40, "ERROR", 1)]
+    assert stats == {'files': 3, 'skipped': 0}
+
+    # Новейшие: limit набран в текущем дне — архивы не читаются
+    lines, stats = search_days(days, errors, limit=2, workers=1)
+    assert lines == [log_line("2024-05-01", 5, "ERROR", 1), log_line("2024-05-01", 40, "ERROR", 1)]
+    assert stats['files'] == 1
+
+    # Старейшие: дни в обратном порядке, строки от старых к новым
+    lines, _ = search_days(list(reversed(days)), errors, limit=2, newest_first=False, workers=1)
+    assert lines == [log_line("2024-04-29", 10, "ERROR", 1), log_line("2024-05-01", 5, "ERROR", 1)]
+
+
+def test_search_text_and_camera(logs):
+    days = log_days(str(logs))
+    lines, _ = search_days(days, LogFilter(camera=0, text="EVENT 2024-04-30 4"), limit=100)
+    assert lines == [log_line("2024-04-30", 4)] + [log_line("2024-04-30", n) for n in range(40, 50)]
+
+
+def test_summaries_skip_days_without_matches(logs, tmp_path):
+    days = log_days(str(logs))
+    summaries = ArchiveSummaries(str(tmp_path / "summaries"))
+
+    search_days(days, LogFilter(), limit=1000, summaries=summaries)
+    # Сводки только для архивов: текущий .log ещё дописывается
+    assert sorted(p.name for p in (tmp_path / "summaries").iterdir()) == [
+        "2024-04-29.log.zip.summary", "2024-04-30.log.zip.summary"]
+    summary = summaries.get(str(logs / "2024-04-29.log.zip"))
+    assert summary['lines'] == 50
+    assert summary['levels'] == {'INFO': 49, 'ERROR': 1}
+    assert summary['cameras'] == {'0': 49, '1': 1}
+
+    # Сводка читается с диска новым экземпляром; 30-е без ERROR пропускается
+    lines, stats = search_days(days, LogFilter(level="ERROR"), limit=100,
+                               summaries=ArchiveSummaries(str(tmp_path / "summaries")))
+    assert stats == {'files': 2, 'skipped': 1}
+    assert len(lines) == 3
+
+    summaries.prune([str(logs / "2024-04-29.log.zip")])
+    assert [p.name for p in (tmp_path / "summaries").iterdir()] == ["2024-04-29.log.zip.summary"]
+
+
+def test_changed_archive_invalidates_summary(logs, tmp_path):
+    summaries = ArchiveSummaries(str(tmp_path / "summaries"))
+    path = logs / "2024-04-30.log.zip"
+    search_days([("2024-04-30", [str(path)])], LogFilter(), summaries=summaries)
+    assert summaries.get(str(path)) is not None
+
+    write_zip(path, day_lines("2024-04-30", count=60, errors=(3,)))
+    assert summaries.get(str(path)) is None
+    lines, stats = search_days([("2024-04-30", [str(path)])], LogFilter(level="ERROR"), summaries=summaries)
+    assert stats['skipped'] == 0
+    assert lines == [log_line("2024-04-30", 3, "ERROR", 1)]
+
+
+def test_matches_found_in_archive_larger_than_chunk(tmp_path):
+    # День на несколько блоков CHUNK_SIZE: блоки без [CAM1] пропускаются, совпадения на стыках не теряются
+    count = 60000
+    errors = (0, 25000, count - 1)
+    path = tmp_path / "2024-04-28.log.zip"
+    write_zip(path, day_lines("2024-04-28", count=count, errors=errors))
+    assert zipfile.ZipFile(path).infolist()[0].file_size > 2 * log_archive.CHUNK_SIZE
+
+    lines, _ = search_days([("2024-04-28", [str(path)])], LogFilter(camera=1), limit=100)
+    assert lines == [log_line("2024-04-28", n, "ERROR", 1) for n in errors]
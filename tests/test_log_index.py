@@ -0,0 +1,155 @@
+import json
+import zipfile
+
+import pytest
+
+import log_index
+from log_index import LEVELS, LogIndexer, level_number
+
+DATE = "2024-05-01"
+
+
+@pytest.fixture(autouse=True)
+def small_blocks(monkeypatch):
+    monkeypatch.setattr(log_index, "BLOCK_LINES", 10)
+
+
+def entry(n, level="INFO", camera=None):
+    return {'time': 1000.0 + n, 'level': level, 'levelno': LEVELS[level], 'camera': camera,
+            'message': f"event {n}", 'module': "test", 'extra': {}}
+
+
+def jsonl(entries):
+    return "".join(json.dumps(e) + "\n" for e in entries)
+
+
+def make_entries(count):
+    # Ошибки на камере 4 — только в 25-й строке, WARNING — каждая 10-я
+    entries = []
+    for n in range(count):
+        level = "ERROR" if n == 25 else "WARNING" if n % 10 == 0 else "INFO"
+        entries.append(entry(n, level, camera=4 if n == 25 else n % 3))
+    return entries
+
+
+def write_day(logs_dir, entries, date=DATE):
+    logs_dir.mkdir(exist_ok=True)
+    (logs_dir / f"{date}.jsonl").write_text(jsonl(entries), encoding="utf-8")
+
+
+def make_indexer(tmp_path):
+    logs = tmp_path / "logs"
+    return LogIndexer(logs_dir=str(logs), index_dir=str(logs / "index"))
+
+
+def test_query_reads_only_candidate_blocks(tmp_path):
+    write_day(tmp_path / "logs", make_entries(45))
+    day = make_indexer(tmp_path).day(DATE)
+    assert not day.archived
+
+    assert day.refresh() == 45
+    assert [b['lines'] for b in day.blocks] == [10, 10, 10, 10, 5]
+    assert len(list(day.candidate_blocks(camera=4))) == 1
+    assert len(list(day.candidate_blocks(min_level=LEVELS['ERROR']))) == 1
+    assert len(list(day.candidate_blocks(start=1031, end=1033))) == 1
+
+    entries, cursor = day.query(min_level=LEVELS['ERROR'], camera=4)
+    assert [e['message'] for e in entries] == ["event 25"]
+    assert cursor is None
+    entries, _ = day.query(start=1020, end=1022, text="EVENT")
+    assert [e['message'] for e in entries] == ["event 20", "event 21", "event 22"]
+
+
+def test_cursor_paging_returns_every_entry_once(tmp_path):
+    write_day(tmp_path / "logs", make_entries(45))
+    day = make_indexer(tmp_path).day(DATE)
+
+    seen, after = [], 0
+    while True:
+        entries, after = day.query(min_level=LEVELS['WARNING'], limit=2, after=after)
+        seen += [e['message'] for e in entries]
+        if after is None:
+            break
+    assert seen == ["event 0", "event 10", "event 20", "event 25", "event 30", "event 40"]
+
+
+def test_refresh_indexes_only_appended_lines(tmp_path):
+    logs = tmp_path / "logs"
+    entries = make_entries(15)
+    write_day(logs, entries)
+    indexer = make_indexer(tmp_path)
+    day = indexer.day(DATE)
+    assert day.refresh() == 15
+    assert day.refresh() == 0
+
+    # Неполная строка ещё не индексируется; незаполненный последний блок дополняется
+    path = logs / f"{DATE}.jsonl"
+    more = [entry(n) for n in range(15, 22)]
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(jsonl(more) + '{"time": 10')
+    assert day.refresh() == 12
+    assert [b['lines'] for b in day.blocks] == [10, 10, 2]
+
+    # Индекс сохраняется на диск и подхватывается новым экземпляром
+    reloaded = make_indexer(tmp_path).day(DATE)
+    assert reloaded.size == day.size
+    assert reloaded.blocks == day.blocks
+    assert len(reloaded.query(limit=100)[0]) == 22
+
+
+def test_replaced_file_is_reindexed(tmp_path):
+    logs = tmp_path / "logs"
+    write_day(logs, make_entries(30))
+    day = make_indexer(tmp_path).day(DATE)
+    day.refresh()
+    write_day(logs, make_entries(5))
+    assert day.refresh() == 5
+    assert len(day.query(limit=100)[0]) == 5
+
+
+def test_zipped_day_is_queried_from_archive(tmp_path):
+    logs = tmp_path / "logs"
+    logs.mkdir()
+    first, second = make_entries(30)[:20], make_entries(30)[20:]
+    # При повторной ротации loguru переименовывает более старый архив, добавляя время создания
+    older = f"{DATE}.{DATE}_00-00-00_000000.jsonl.zip"
+    for name, part in ((older, first), (f"{DATE}.jsonl.zip", second)):
+        with zipfile.ZipFile(logs / name, "w", zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr(name[:-4], jsonl(part))
+    indexer = make_indexer(tmp_path)
+
+    day = indexer.day(DATE)
+    assert day.archived
+    assert len(day.paths) == 2
+
+    seen, after = [], 0
+    while True:
+        entries, after = day.query(min_level=LEVELS['WARNING'], limit=2, after=after)
+        seen += [e['message'] for e in entries]
+        if after is None:
+            break
+    assert seen == ["event 0", "event 10", "event 20", "event 25"]
+    assert [e['message'] for e in day.query(camera=4)[0]] == ["event 25"]
+
+
+def test_missing_day_and_bad_date(tmp_path):
+    indexer = make_indexer(tmp_path)
+    assert indexer.day(DATE) is None
+    with pytest.raises(ValueError):
+        indexer.day("2024-13-40")
+    with pytest.raises(ValueError):
+        level_number("LOUD")
+    assert level_number(" warning ") == 30
+
+
+def test_refresh_all_prunes_indexes_of_rotated_days(tmp_path):
+    logs = tmp_path / "logs"
+    write_day(logs, make_entries(5), date="2024-04-30")
+    write_day(logs, make_entries(5))
+    indexer = make_indexer(tmp_path)
+    indexer.refresh_all()
+    assert sorted(p.name for p in (logs / "index").iterdir()) == ["2024-04-30.json", f"{DATE}.json"]
+
+    (logs / "2024-04-30.jsonl").unlink()
+    indexer.refresh_all()
+    assert [p.name for p in (logs / "index").iterdir()] == [f"{DATE}.json"]
@@ -0,0 +1,133 @@
+import io
+
+import pytest
+
+import log_reader
+from log_reader import LogFilter, parse_line, reverse_lines, tail
+
+
+def log_line(n, level="INFO", camera=None):
+    prefix = f"[CAM{camera}] " if camera is not None else ""
+    return f"2024-05-01 12:00:00 | {level:<8} | {prefix}event {n:05d}"
+
+
+def write_log(path, lines, trailing_newline=True):
+    text = "\n".join(lines) + ("\n" if trailing_newline else "")
+    path.write_bytes(text.encode())
+    return str(path)
+
+
+def read_all_pages(path, limit, **kwargs):
+    pages = []
+    before = None
+    while True:
+        lines, before = tail(path, limit=limit, before=before, **kwargs)
+        pages.append(lines)
+        if before is None:
+            return pages
+
+
+@pytest.mark.parametrize("block_size", [1, 7, 64, 4096])
+def test_reverse_lines_splits_lines_across_blocks(block_size):
+    data = b"first\nsecond line\n\nfourth\nlast"
+    result = list(reverse_lines(io.BytesIO(data), len(data), block_size=block_size))
+    assert [line for _, line in result] == [b"last", b"fourth", b"", b"second line", b"first"]
+    # Смещение — начало строки в файле
+    for start, line in result:
+        assert data[start:start + len(line)] == line
+
+
+def test_reverse_lines_stops_at_end_offset():
+    data = b"a\nbb\nccc\n"
+    result = list(reverse_lines(io.BytesIO(data), 5, block_size=2))
+    assert result == [(5, b""), (2, b"bb"), (0, b"a")]
+
+
+def test_tail_pages_cover_file_across_block_boundaries(tmp_path):
+    # Строки по ~45 байт: файл больше нескольких BLOCK_SIZE, страницы пересекают границы блоков
+    count = 4000
+    expected = [log_line(n) for n in range(count)]
+    path = write_log(tmp_path / "big.log", expected)
+    assert (tmp_path / "big.log").stat().st_size > 2 * log_reader.BLOCK_SIZE
+
+    pages = read_all_pages(path, limit=333)
+    assert all(len(page) == 333 for page in pages[:-1])
+    collected = [line for page in reversed(pages) for line in page]
+    assert collected == expected
+
+
+def test_tail_without_trailing_newline_and_empty_file(tmp_path):
+    path = write_log(tmp_path / "x.log", [log_line(1), log_line(2)], trailing_newline=False)
+    assert tail(path, limit=10) == ([log_line(1), log_line(2)], None)
+
+    empty = write_log(tmp_path / "empty.log", [], trailing_newline=False)
+    assert tail(empty) == ([], None)
+
+
+def test_tail_cursor_points_at_first_returned_line(tmp_path):
+    lines = [log_line(n) for n in range(10)]
+    path = write_log(tmp_path / "x.log", lines)
+    page, cursor = tail(path, limit=3)
+    assert page == lines[-3:]
+    with open(path, "rb") as f:
+        f.seek(cursor)
+        assert f.readline().decode().strip() == lines[7]
+    # Курсор за пределами файла обрезается до размера
+    assert tail(path, limit=1, before=10 ** 9)[0] == lines[-1:]
+
+
+def test_tail_filters_level_camera_and_text(tmp_path):
+    lines = [
+        log_line(1, "INFO", camera=0),
+        log_line(2, "ERROR", camera=1),
+        log_line(3, "ERROR", camera=12),
+        "Traceback (most recent call last):",
+        log_line(4, "WARNING", camera=1),
+    ]
+    path = write_log(tmp_path / "x.log", lines)
+
+    assert tail(path, log_filter=LogFilter(level="error"))[0] == lines[1:3]
+    # [CAM1] не совпадает с [CAM12]
+    assert tail(path, log_filter=LogFilter(camera=1))[0] == [lines[1], lines[4]]
+    assert tail(path, log_filter=LogFilter(text="EVENT 0000"))[0] == lines[:3] + [lines[4]]
+    assert tail(path, log_filter=LogFilter(level="ERROR", camera=12))[0] == [lines[2]]
+    # Строки без шапки проходят только без фильтра
+    assert lines[3] in tail(path)[0]
+
+
+def test_filtered_paging_skips_non_matching_blocks(tmp_path):
+    lines = [log_line(n, camera=n % 5) for n in range(3000)]
+    path = write_log(tmp_path / "x.log", lines)
+    pages = read_all_pages(path, limit=100, log_filter=LogFilter(camera=3))
+    collected = [line for page in reversed(pages) for line in page]
+    assert collected == [line for n, line in enumerate(lines) if n % 5 == 3]
+
+
+def test_tail_max_scan_returns_partial_page_with_cursor(tmp_path):
+    lines = [log_line(n, "ERROR" if n % 50 == 0 else "INFO") for n in range(201)]
+    path = write_log(tmp_path / "x.log", lines)
+    errors = [line for line in lines if "ERROR" in line]
+    level = LogFilter(level="ERROR")
+
+    page, cursor = tail(path, limit=10, log_filter=level, max_scan=1000)
+    assert page == [lines[200]]
+    assert cursor is not None
+
+    # Продолжение с курсора не теряет и не повторяет строки
+    seen = list(page)
+    while cursor is not None:
+        more, cursor = tail(path, limit=10, before=cursor, log_filter=level, max_scan=1000)
+        seen[:0] = more
+    assert seen == errors
+
+
+def test_limit_is_clamped(tmp_path):
+    path = write_log(tmp_path / "x.log", [log_line(n) for n in range(5)])
+    assert len(tail(path, limit=0)[0]) == 1
+    assert len(tail(path, limit=10 ** 6)[0]) == 5
+
+
+def test_parse_line():
+    assert parse_line("2024-05-01 12:00:00 | warning | a | b") == ("2024-05-01 12:00:00", "WARNING", "a | b")
+    assert parse_line("  File \"x.py\", line 1") is None
+    assert LogFilter().empty
@@ -0,0 +1,40 @@
+import cv2
+import pytest
+
+from mjpeg_avi import MJPEGAviWriter, encode_jpeg
+from conftest import count_frames
+
+
+def test_writer_round_trip(frame, tmp_path):
+    path = str(tmp_path / "segment.avi")
+    writer = MJPEGAviWriter(path, 8, (64, 48))
+    for _ in range(10):
+        writer.write(frame)
+    writer.write(encode_jpeg(frame))  # готовый JPEG пишется как есть
+    writer.release()
+
+    cap = cv2.VideoCapture(path)
+    assert cap.isOpened()
+    assert cap.get(cv2.CAP_PROP_FPS) == pytest.approx(8)
+    assert (cap.get(cv2.CAP_PROP_FRAME_WIDTH), cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) == (64, 48)
+    assert cap.get(cv2.CAP_PROP_FRAME_COUNT) == 11
+    cap.release()
+    assert count_frames(path) == 11
+
+
+def test_writer_reuses_jpeg_of_repeated_frame(frame, tmp_path):
+    writer = MJPEGAviWriter(str(tmp_path / "segment.avi"), 8, (64, 48))
+    writer.write(frame)
+    jpeg = writer._last_jpeg
+    writer.write(frame)
+    assert writer._last_jpeg is jpeg
+    writer.release()
+    assert count_frames(writer.path) == 2
+
+
+def test_release_twice_is_harmless(frame, tmp_path):
+    writer = MJPEGAviWriter(str(tmp_path / "segment.avi"), 8, (64, 48))
+    writer.write(frame)
+    writer.release()
+    writer.release()
+    assert not writer.isOpened()
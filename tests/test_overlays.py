@@ -0,0 +1,38 @@
+import json
+import time
+
+import numpy as np
+
+from overlays import frame_meta, render_base, render_overlay, track_id
+
+
+def contour(x, y, w, h):
+    return np.array([[[x, y]], [[x + w - 1, y]], [[x + w - 1, y + h - 1]], [[x, y + h - 1]]], dtype=np.int32)
+
+
+def test_frame_meta_is_json_ready():
+    faces = [{'box': [10, 10, 50, 50], 'name': 'Anna', 'confidence': 42}]
+    meta = frame_meta(7, 2, 1000.12345, (640, 480), 'active', [contour(100, 50, 40, 30)], faces, mask=True)
+    assert json.loads(json.dumps(meta)) == meta
+    assert meta['objects'] == [{'id': 1, 'track': track_id(2, [100, 50, 40, 30]), 'box': [100, 50, 40, 30]}]
+    assert meta['time'] == 1000.123 and meta['motion'] and meta['mask']
+
+
+def test_render_base_draws_mask_and_time_only():
+    frame = np.zeros((240, 320, 3), dtype=np.uint8)
+    mask = np.zeros((480, 640), dtype=np.uint8)
+    mask[:100, :100] = 255  # другой размер — масштабируется к кадру
+    meta = frame_meta(1, 0, time.time(), (640, 480), 'static')
+    output = render_base(frame, meta, mask)
+    assert output[10, 10].any() and not output[100, 200].any()
+    assert output[220:240, 10:100].any()  # время внизу слева
+    assert not frame.any()  # исходный кадр не меняется
+
+
+def test_render_overlay_scales_boxes_to_frame():
+    frame = np.zeros((240, 320, 3), dtype=np.uint8)
+    meta = frame_meta(1, 0, time.time(), (640, 480), 'active', [contour(200, 200, 100, 100)])
+    output = render_overlay(frame, meta)
+    # Бокс 200..300 кадра 640x480 на кадре 320x240 — 100..150
+    assert output[100, 125].any() and output[125, 100].any()
+    assert not output[125, 125].any()
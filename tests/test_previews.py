@@ -0,0 +1,46 @@
+import json
+
+import cv2
+import numpy as np
+
+from previews import PreviewBuilder, preview_path, POSTER_SUFFIX, SPRITE_SUFFIX, SPRITE_INFO_SUFFIX
+from mjpeg_avi import encode_jpeg
+
+
+def tagged(value):
+    return np.full((48, 64, 3), value, dtype=np.uint8)
+
+
+def test_thumbnails_stay_evenly_spaced():
+    builder = PreviewBuilder(tiles=4)
+    for i in range(100):
+        builder.add(tagged(i), float(i))
+    times = [ts for ts, _ in builder.thumbs]
+    assert len(times) < 8
+    assert len(set(np.diff(times))) == 1  # шаг одинаковый
+    assert times[0] == 0.0
+
+
+def test_save_writes_poster_sprite_and_info(tmp_path):
+    video = str(tmp_path / "clip.avi")
+    builder = PreviewBuilder(tiles=6)
+    for i in range(30):
+        frame = tagged(i * 8)
+        builder.add(encode_jpeg(frame) if i % 2 else frame, 100.0 + i)
+        builder.mark_peak(frame, 100.0 + i, 0.5 if i == 12 else 0.1)
+    builder.save(video)
+
+    poster = cv2.imread(preview_path(video, POSTER_SUFFIX))
+    assert abs(int(poster[0, 0, 0]) - 96) <= 2  # кадр с пиком движения
+    with open(preview_path(video, SPRITE_INFO_SUFFIX), encoding="utf-8") as f:
+        info = json.load(f)
+    assert info["poster_time"] == 112.0
+    assert info["tile"] == [64, 48] and info["columns"] == 5
+    assert len(info["times"]) == 6 and info["times"] == sorted(info["times"])
+    sprite = cv2.imread(preview_path(video, SPRITE_SUFFIX))
+    assert sprite.shape[:2] == (2 * 48, 5 * 64)
+
+
+def test_empty_builder_writes_nothing(tmp_path):
+    PreviewBuilder().save(str(tmp_path / "clip.avi"))
+    assert list(tmp_path.iterdir()) == []
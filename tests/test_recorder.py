@@ -0,0 +1,174 @@
+import json
+import os
+import time
+
+import numpy as np
+import pytest
+
+import recorder
+from recorder import RecorderPool
+from conftest import count_frames
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.fixture
+def pool():
+    pool = RecorderPool(workers=1)
+    yield pool
+    pool.shutdown()
+
+
+class FakeRecording:
+    def __init__(self, generation, idle_timeout=0.1):
+        self.path = "fake.avi"
+        self.idle_timeout = idle_timeout
+        self.generation = generation
+        self.last_frame = time.time() - 10
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_start_write_stop_writes_file(pool, frame, tmp_path):
+    path = str(tmp_path / "clip.avi")
+    assert pool.start(1, path, "MJPG", 8, (64, 48))
+    assert not pool.start(1, path, "MJPG", 8, (64, 48))  # уже идёт
+    t0 = time.time()
+    for i in range(8):
+        assert pool.write(1, frame, t0 + i / 8)
+    assert pool.stop(1)
+    assert not pool.is_recording(1)
+    assert not pool.write(1, frame)
+    assert wait_for(lambda: pool.stats()["1"]["frames_written"] == 8)
+    assert wait_for(lambda: os.path.exists(recorder.timestamps_path(path)) and count_frames(path) == 8)
+
+
+def test_write_drops_frames_when_queue_is_full(frame, tmp_path):
+    pool = RecorderPool(workers=1, max_pending=0)
+    try:
+        pool.start(1, str(tmp_path / "clip.avi"), "MJPG", 8, (64, 48))
+        assert not pool.write(1, frame)
+        assert pool.stats()["1"]["frames_dropped"] == 1
+    finally:
+        pool.shutdown()
+
+
+def test_close_idle_clears_flag_of_its_own_recording(pool):
+    with pool._lock:
+        pool._active.add(1)
+        pool._generations[1] = 1
+    recording = FakeRecording(generation=1)
+    recordings = {1: recording}
+    pool._close_idle(recordings)
+    assert recording.closed and not recordings
+    assert not pool.is_recording(1)
+
+
+def test_close_idle_keeps_newer_recording_active(pool):
+    # Цикл камер уже поставил в очередь stop и новый start (поколение 2)
+    with pool._lock:
+        pool._active.add(1)
+        pool._generations[1] = 2
+    recording = FakeRecording(generation=1)
+    pool._close_idle({1: recording})
+    assert recording.closed
+    assert pool.is_recording(1)
+
+
+def test_recent_recording_is_not_idle(pool):
+    recording = FakeRecording(generation=1, idle_timeout=60)
+    recordings = {1: recording}
+    pool._close_idle(recordings)
+    assert not recording.closed and recordings
+
+
+def tagged(tag):
+    """Кадр, помеченный буквой (значением пикселей)"""
+    return np.full((48, 64, 3), ord(tag), dtype=np.uint8)
+
+
+def tags(frames):
+    return [chr(frame[0, 0, 0]) for frame in frames]
+
+
+class ListWriter:
+    def __init__(self):
+        self.frames = []
+
+    def write(self, frame):
+        self.frames.append(frame)
+
+    def release(self):
+        pass
+
+
+def make_recording(tmp_path, fps=8):
+    writer = ListWriter()
+    return recorder._Recording(str(tmp_path / "clip.avi"), writer, fps, None), writer
+
+
+def test_emit_fills_gaps_with_previous_frame(tmp_path):
+    recording, writer = make_recording(tmp_path)
+    assert recording.emit(tagged("a"), 100.0) == (0, False)
+    # Следующий кадр через 0.5 с — при 8 FPS три повтора «a»
+    assert recording.emit(tagged("b"), 100.5) == (3, False)
+    recording.close()
+    assert tags(writer.frames) == ["a", "a", "a", "a", "b"]
+
+
+def test_emit_skips_frames_faster_than_fps(tmp_path):
+    recording, writer = make_recording(tmp_path)
+    recording.emit(tagged("a"), 100.0)
+    assert recording.emit(tagged("b"), 100.01) == (0, True)
+    recording.emit(tagged("c"), 100.125)
+    recording.close()
+    assert tags(writer.frames) == ["a", "c"]
+
+
+def test_emit_caps_long_gaps(tmp_path):
+    recording, writer = make_recording(tmp_path, fps=2)
+    recording.emit(tagged("a"), 100.0)
+    duplicated, _ = recording.emit(tagged("b"), 1100.0)
+    assert duplicated == recorder.MAX_GAP_SECONDS * 2
+    # После сдвига сетки следующий кадр идёт без пропуска
+    assert recording.emit(tagged("c"), 1100.5) == (0, False)
+    recording.close()
+
+
+def test_emit_writes_capture_timestamps(tmp_path):
+    recording, _ = make_recording(tmp_path)
+    recording.emit(tagged("a"), 100.0)
+    recording.emit(tagged("b"), 100.25)
+    recording.close()
+    with open(recorder.timestamps_path(recording.path), encoding="utf-8") as f:
+        assert f.read().splitlines() == ["frame,timestamp", "0,100.000", "2,100.250"]
+
+
+def test_segments_rotate_on_boundary_and_record_events(frame, tmp_path):
+    base = str(tmp_path)
+    segmented = recorder._SegmentedRecording(3, base, 4, (64, 48), segment_seconds=10, quality=70)
+    t0 = 1_700_000_000.0  # кратно 10 с
+    for i in range(60):   # 15 с при 4 FPS — два куска
+        segmented.emit(frame, t0 + i / 4)
+    first = segmented.segments[0][2]
+    segmented.add_event("motion_detected", t0 + 8, t0 + 12, peak_motion=0.5, faces={"Anna"})
+    segmented.close()
+
+    assert len(segmented.segments) == 2
+    assert count_frames(first) == 40
+    assert count_frames(segmented.segments[1][2]) == 20
+    events_path = os.path.join(recorder.continuous_dir(base, 3, t0 + 8), recorder.EVENTS_FILE)
+    with open(events_path, encoding="utf-8") as f:
+        event = json.loads(f.readline())
+    assert [s["file"] for s in event["segments"]] == [first, segmented.segments[1][2]]
+    assert event["segments"][0]["offset"] == 8
+    assert event["faces"] == ["Anna"]
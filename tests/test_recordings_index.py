@@ -0,0 +1,89 @@
+import os
+
+import pytest
+
+import recorder
+from recordings_index import RecordingsIndex
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = RecordingsIndex(str(tmp_path / "index.db"))
+    yield index
+    index.close()
+
+
+def add_file(index, path, camera, start, duration=10, size=100, faces=(), event="motion_detected"):
+    index.recording_started(path, "clip", camera, event, start)
+    index.recording_finished(path, start, start + duration, duration * 8, size, 0.1, faces)
+
+
+def test_query_filters_and_paging(index):
+    add_file(index, "a.avi", 1, 1000)
+    add_file(index, "b.avi", 1, 2000, faces=["Anna"])
+    add_file(index, "c.avi", 2, 3000)
+    index.recording_started("open.avi", "clip", 1, "manual", 4000)
+
+    rows, total = index.query(camera=1)
+    assert total == 3
+    assert [row["path"] for row in rows] == ["open.avi", "b.avi", "a.avi"]
+    rows, total = index.query(camera=1, limit=1, offset=1, newest_first=False)
+    assert (total, rows[0]["path"]) == (3, "b.avi")
+    # Пересечение с отрезком: запись 1000..1010 попадает в [1005, 1500]
+    assert [row["path"] for row in index.query(start=1005, end=1500)[0]] == ["a.avi"]
+    assert [row["path"] for row in index.query(face="Anna")[0]] == ["b.avi"]
+    assert index.find("b.avi")["faces"] == ["Anna"]
+    assert index.find("open.avi")["end"] is None
+
+
+def test_oldest_files_skip_open_and_protected(index):
+    add_file(index, "old_face.avi", 1, 1000, faces=["Anna"])
+    add_file(index, "new_face.avi", 1, 5000, faces=["Anna"])
+    add_file(index, "new.avi", 1, 6000)
+    index.recording_started("open.avi", "clip", 1, "manual", 500)
+
+    assert [row["path"] for row in index.oldest_files()] == ["old_face.avi", "new_face.avi", "new.avi"]
+    rows = index.oldest_files(protect_faces_since=2000)
+    assert [row["path"] for row in rows] == ["old_face.avi", "new.avi"]
+    assert index.usage() == {1: (300, 3, 1000)}
+
+
+def test_prune_events_drops_removed_segments(index):
+    index.add_event(1, "motion_detected", 100, 110, [{"file": "s1.avi", "offset": 0}, {"file": "s2.avi", "offset": 0}])
+    index.add_event(1, "motion_detected", 200, 210, [{"file": "s1.avi", "offset": 5}])
+    index.prune_events(["s1.avi"])
+    rows, total = index.query(kind="event")
+    assert total == 1
+    assert rows[0]["segments"] == [{"file": "s2.avi", "offset": 0}]
+
+
+def test_has_files_under(index, tmp_path):
+    add_file(index, os.path.join("rec", "day", "cam1", "a.avi"), 1, 1000)
+    assert index.has_files_under(os.path.join("rec", "day"))
+    assert not index.has_files_under(os.path.join("rec", "da"))
+
+
+def test_rebuild_recovers_segments_events_faces_and_motion(index, frame, tmp_path):
+    base = str(tmp_path / "recordings")
+    segmented = recorder._SegmentedRecording(2, base, 4, (64, 48), segment_seconds=10, quality=70,
+                                             index=index)
+    t0 = 1_700_000_000.0
+    for i in range(48):
+        segmented.emit(frame, t0 + i / 4)
+        segmented.note_activity(0.2 if i == 5 else 0.0, {"Anna"} if i == 5 else set(), 1, i == 5)
+    segmented.add_event("motion_detected", t0 + 1, t0 + 2, peak_motion=0.3, faces={"Anna"})
+    segmented.close()
+
+    rebuilt = RecordingsIndex(str(tmp_path / "rebuilt.db"))
+    try:
+        assert rebuilt.rebuild(base) == 3
+        segments = rebuilt.query(kind="segment", newest_first=False)[0]
+        assert [row["frames"] for row in segments] == [40, 8]
+        assert segments[0]["faces"] == ["Anna"]
+        assert segments[0]["peak_motion"] == pytest.approx(0.3)
+        assert segments[1]["faces"] == []
+        event = rebuilt.query(kind="event")[0][0]
+        assert event["segments"][0]["file"] == segments[0]["path"]
+        assert sorted(row["kind"] for row in rebuilt.query(face="Anna")[0]) == ["event", "segment"]
+    finally:
+        rebuilt.close()
@@ -0,0 +1,126 @@
+import os
+import time
+import datetime
+
+import pytest
+
+import retention
+from retention import RetentionManager, DAY
+from recordings_index import RecordingsIndex
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = RecordingsIndex(str(tmp_path / "index.db"))
+    yield index
+    index.close()
+
+
+@pytest.fixture(autouse=True)
+def no_pause(monkeypatch):
+    monkeypatch.setattr(retention, "DELETE_PAUSE", 0)
+
+
+def make_manager(index, tmp_path, **kwargs):
+    params = dict(max_bytes=0, max_days=0, camera_bytes={}, camera_days={}, face_days=0, min_free_percent=0)
+    params.update(kwargs)
+    return RetentionManager(index, str(tmp_path / "recordings"), **params)
+
+
+def add_recording(index, tmp_path, name, age_days, faces=(), camera=1, size=100):
+    start = time.time() - age_days * DAY
+    day = datetime.datetime.fromtimestamp(start).strftime("%Y-%m-%d")
+    directory = tmp_path / "recordings" / day / "motion_detected" / f"cam{camera}"
+    directory.mkdir(parents=True, exist_ok=True)
+    path = str(directory / f"{name}.avi")
+    with open(path, "wb") as f:
+        f.write(b"\0" * size)
+    index.recording_started(path, "clip", camera, "motion_detected", start)
+    index.recording_finished(path, start, start + 10, 80, size, 0.1, faces)
+    return path
+
+
+def remaining(index):
+    return sorted(os.path.basename(row["path"]) for row in index.oldest_files())
+
+
+def test_byte_quota_evicts_oldest_and_faces_last(index, tmp_path):
+    add_recording(index, tmp_path, "face", 3, faces=["Anna"])
+    add_recording(index, tmp_path, "older", 2)
+    add_recording(index, tmp_path, "newer", 1)
+    add_recording(index, tmp_path, "newest", 0.5)
+    manager = make_manager(index, tmp_path, max_bytes=250, face_days=7)
+    assert manager.run_once()
+    # Лишние 150 байт — удаляются две самые старые записи без лиц
+    assert remaining(index) == ["face.avi", "newest.avi"]
+    assert manager.deleted_files == 2 and manager.deleted_bytes == 200
+
+
+def test_faces_are_evicted_when_nothing_else_is_left(index, tmp_path):
+    add_recording(index, tmp_path, "face", 3, faces=["Anna"])
+    add_recording(index, tmp_path, "plain", 1)
+    make_manager(index, tmp_path, max_bytes=50, face_days=7).run_once()
+    assert remaining(index) == []
+
+
+def test_age_limit_keeps_recent_and_protected_faces(index, tmp_path):
+    add_recording(index, tmp_path, "old", 5)
+    add_recording(index, tmp_path, "old_face", 5, faces=["Anna"])
+    add_recording(index, tmp_path, "recent", 1)
+    make_manager(index, tmp_path, max_days=2, face_days=7).run_once()
+    assert remaining(index) == ["old_face.avi", "recent.avi"]
+
+
+def test_per_camera_quota(index, tmp_path):
+    add_recording(index, tmp_path, "cam1_old", 3, camera=1)
+    add_recording(index, tmp_path, "cam1_new", 1, camera=1)
+    add_recording(index, tmp_path, "cam2_old", 4, camera=2)
+    make_manager(index, tmp_path, camera_bytes={1: 150}).run_once()
+    assert remaining(index) == ["cam1_new.avi", "cam2_old.avi"]
+
+
+def test_delete_budget_asks_for_another_pass(index, tmp_path):
+    for i in range(3):
+        add_recording(index, tmp_path, f"r{i}", 5 - i)
+    manager = make_manager(index, tmp_path, max_days=1)
+    assert not manager.run_once(max_deletes=2)
+    assert remaining(index) == ["r2.avi"]
+    assert manager.run_once(max_deletes=2)
+    assert remaining(index) == []
+
+
+def test_sidecars_go_but_transcoder_temp_and_other_files_stay(index, tmp_path):
+    path = add_recording(index, tmp_path, "clip", 5)
+    other = add_recording(index, tmp_path, "recent", 1)
+    stem = os.path.splitext(path)[0]
+    for suffix in retention.SIDECAR_SUFFIXES:
+        open(stem + suffix, "w").close()
+    temp = stem + ".transcoding.mp4"
+    open(temp, "w").close()
+    make_manager(index, tmp_path, max_days=2).run_once()
+    assert sorted(os.listdir(os.path.dirname(path))) == ["clip.transcoding.mp4"]
+    assert os.path.exists(other)
+
+
+def test_emptied_day_folder_is_removed(index, tmp_path):
+    path = add_recording(index, tmp_path, "clip", 5)
+    day_dir = os.path.dirname(os.path.dirname(os.path.dirname(path)))
+    make_manager(index, tmp_path, max_days=2).run_once()
+    assert not os.path.exists(day_dir)
+    assert os.path.isdir(tmp_path / "recordings")
+
+
+def test_past_day_folder_with_other_recordings_is_kept(index, tmp_path):
+    old = add_recording(index, tmp_path, "old", 5)
+    kept = os.path.join(os.path.dirname(old), "kept.mp4")
+    with open(kept, "wb") as f:
+        f.write(b"\0" * 10)
+    start = time.time() - 5 * DAY + 60
+    index.recording_started(kept, "clip", 1, "motion_detected", start)
+    index.recording_finished(kept, start, start + 10, 80, 10)
+    unknown = os.path.join(os.path.dirname(old), "notes.txt")
+    open(unknown, "w").close()
+
+    make_manager(index, tmp_path, max_bytes=50).run_once()
+    assert not os.path.exists(old)
+    assert os.path.exists(kept) and os.path.exists(unknown)
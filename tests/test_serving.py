@@ -0,0 +1,19 @@
+import threading
+
+import serving
+
+
+def test_threading_mode_runs_calls_in_place():
+    # Без gevent (по умолчанию OCTO_ASYNC=threading) диспетчера и сигнала гринлетов нет
+    assert serving.ASYNC_MODE == 'threading'
+    assert serving.dispatcher is None
+    assert serving.frame_signal() is None
+
+    caller = threading.get_ident()
+    assert serving.run_blocking(lambda a, b=0: (a + b, threading.get_ident()), 1, b=2) == (3, caller)
+    assert serving.call_in_server(max, 4, 7) == 7
+
+
+def test_iter_blocking_yields_all_items():
+    assert list(serving.iter_blocking(iter([1, None, 3]))) == [1, None, 3]
+    assert list(serving.iter_blocking([])) == []
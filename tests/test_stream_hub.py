@@ -0,0 +1,45 @@
+import cv2
+import numpy as np
+
+from stream_hub import FrameHub
+
+
+def test_frames_without_viewers_are_ignored(frame):
+    hub = FrameHub()
+    hub.put(1, frame)
+    assert hub.latest(1) is None
+
+
+def test_viewer_gets_encoded_frame(frame):
+    hub = FrameHub()
+    with hub.viewer(1):
+        hub.put(1, frame, seq=5, timestamp=100.0)
+        encoded = hub.wait(1, timeout=5)
+        assert encoded is not None
+        assert (encoded.seq, encoded.time) == (5, 100.0)
+        image = cv2.imdecode(np.frombuffer(encoded.jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+        assert image.shape == frame.shape
+        # Пока нового кадра нет — ожидание заканчивается по таймауту
+        assert hub.wait(1, after=encoded.version, timeout=0.05) is None
+    # Последний зритель ушёл — кадр забыт
+    assert hub.latest(1) is None
+
+
+def test_wait_any_reports_only_newer_cameras(frame):
+    hub = FrameHub()
+    with hub.viewer(1), hub.viewer(2):
+        hub.put(1, frame)
+        first = hub.wait(1, timeout=5)
+        hub.put(2, frame)
+        assert hub.wait(2, after=first.version, timeout=5) is not None
+        updates = hub.wait_any({1: first.version}, timeout=5)
+        assert list(updates) == [2]
+        assert hub.wait_any({1: first.version, 2: updates[2].version}, timeout=0.05) == {}
+
+
+def test_frame_replaced_before_encoding_is_counted_as_skipped(frame):
+    hub = FrameHub()
+    hub._viewers[1] = 1  # зритель без потока кодирования: кадры копятся в очереди
+    hub.put(1, frame)
+    hub.put(1, frame)
+    assert hub.skipped == 1
@@ -0,0 +1,69 @@
+import os
+
+import numpy as np
+import pytest
+
+import transcoder
+from transcoder import Transcoder, detect_codec
+from mjpeg_avi import MJPEGAviWriter
+from recordings_index import RecordingsIndex
+from conftest import count_frames
+
+pytestmark = pytest.mark.skipif(detect_codec() is None, reason="в сборке OpenCV нет кодека для перекодирования")
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = RecordingsIndex(str(tmp_path / "index.db"))
+    yield index
+    index.close()
+
+
+def add_mjpeg(index, path, frames=24):
+    rng = np.random.default_rng(0)
+    base = rng.integers(0, 256, (96, 128, 3), dtype=np.uint8)
+    writer = MJPEGAviWriter(path, 8, (128, 96), quality=95)
+    for i in range(frames):
+        # Повторы кадра, как в записи с постоянной частотой
+        writer.write(np.roll(base, i // 2, axis=1))
+    writer.release()
+    index.recording_started(path, "clip", 1, "motion_detected", 1000.0)
+    index.recording_finished(path, 1000.0, 1000.0 + frames / 8, frames, os.path.getsize(path))
+
+
+def test_transcode_replaces_file_and_updates_index(index, tmp_path):
+    path = str(tmp_path / "recording_10-00-00.avi")
+    add_mjpeg(index, path)
+    assert index.transcode_candidates(finished_before=2000) != []
+
+    worker = Transcoder(index)
+    assert worker.transcode(path)
+    _, ext = detect_codec()
+    target = os.path.splitext(path)[0] + ext
+    assert os.path.exists(target)
+    assert os.path.exists(path) == (target == path)
+    assert not [name for name in os.listdir(tmp_path) if transcoder.TRANSCODING_SUFFIX in name]
+    row = index.find(target)
+    assert row["transcode"] == "done" and row["size"] == os.path.getsize(target)
+    assert abs(count_frames(target) - 24) <= transcoder.FRAME_TOLERANCE
+    assert worker.stats()["bytes_saved"] > 0
+    assert index.transcode_candidates(finished_before=2000) == []
+
+
+def test_missing_and_non_mjpeg_files_are_skipped(index, tmp_path):
+    missing = str(tmp_path / "missing.avi")
+    index.recording_started(missing, "clip", 1, "manual", 1000.0)
+    index.recording_finished(missing, 1000.0, 1001.0, 8, 0)
+    assert not Transcoder(index).transcode(missing)
+    assert index.find(missing)["transcode"] == "skipped"
+
+
+def test_stop_during_encoding_keeps_original(index, tmp_path):
+    path = str(tmp_path / "recording_10-00-00.avi")
+    add_mjpeg(index, path)
+    worker = Transcoder(index, load=lambda: 10.0)  # цикл камер перегружен
+    worker.stop()
+    assert not worker.transcode(path)
+    assert os.path.exists(path)
+    assert index.find(path)["transcode"] is None
+    assert not [name for name in os.listdir(tmp_path) if transcoder.TRANSCODING_SUFFIX in name]
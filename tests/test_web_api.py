@@ -0,0 +1,135 @@
+import importlib
+import json
+import os
+import zipfile
+
+import pytest
+
+from log_index import LogIndexer
+from recordings_index import RecordingsIndex
+
+
+@pytest.fixture(scope="module")
+def octo_web(tmp_path_factory):
+    """octo_web при импорте создаёт logs/ и recordings/ в текущей папке — импорт во временной"""
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("web"))
+    try:
+        yield importlib.import_module("octo_web")
+    finally:
+        os.chdir(cwd)
+
+
+@pytest.fixture
+def recordings(octo_web, tmp_path, monkeypatch):
+    root = tmp_path / "recordings"
+    root.mkdir()
+    index = RecordingsIndex(str(tmp_path / "index.db"))
+    monkeypatch.setattr(octo_web, "recordings_index", index)
+    monkeypatch.setattr(octo_web, "RECORDINGS_ROOT", os.path.realpath(root))
+    yield root, index
+    index.close()
+
+
+@pytest.fixture
+def client(octo_web):
+    client = octo_web.app.test_client()
+    with client.session_transaction() as session:
+        session['user'] = 'admin'
+        session['role'] = 'Admin'
+    return client
+
+
+def add_recording(index, path, camera=1, start=1000.0, size=None):
+    index.recording_started(str(path), "clip", camera, "motion_detected", start)
+    index.recording_finished(str(path), start, start + 10, 80, size or os.path.getsize(path))
+    return index.find(str(path))['id']
+
+
+def test_requires_login(octo_web, recordings):
+    response = octo_web.app.test_client().get('/api/recordings')
+    assert response.status_code == 302
+
+
+def test_list_recordings_filters_and_pages(client, recordings):
+    root, index = recordings
+    for n, camera in enumerate((1, 1, 2)):
+        path = root / f"clip{n}.avi"
+        path.write_bytes(b"x" * 10)
+        add_recording(index, path, camera=camera, start=1000.0 + n)
+
+    data = client.get('/api/recordings?camera=1&per_page=1&page=2').get_json()
+    assert (data['total'], data['page'], data['per_page']) == (2, 2, 1)
+    item = data['items'][0]
+    assert item['start'] == 1000.0
+    assert 'path' not in item
+    assert item['urls']['video'] == f"/api/recordings/{item['id']}/file"
+
+    assert client.get('/api/recordings?date=2024-13-01').status_code == 400
+
+
+def test_recording_file_supports_range(client, recordings):
+    root, index = recordings
+    path = root / "cam1" / "clip.avi"
+    path.parent.mkdir()
+    path.write_bytes(bytes(range(256)) * 4)
+    recording_id = add_recording(index, path)
+
+    response = client.get(f'/api/recordings/{recording_id}/file', headers={'Range': 'bytes=100-199'})
+    assert response.status_code == 206
+    assert response.data == (bytes(range(256)) * 4)[100:200]
+    assert response.headers['Content-Range'] == 'bytes 100-199/1024'
+    assert response.headers['Content-Type'] == 'video/x-msvideo'
+
+    full = client.get(f'/api/recordings/{recording_id}/file?download=1')
+    assert full.status_code == 200
+    assert len(full.data) == 1024
+    assert 'attachment' in full.headers['Content-Disposition']
+    # Повторный запрос с ETag — без тела
+    again = client.get(f'/api/recordings/{recording_id}/file', headers={'If-None-Match': full.headers['ETag']})
+    assert again.status_code == 304
+
+
+def test_recording_file_outside_recordings_is_not_served(client, recordings, tmp_path):
+    root, index = recordings
+    outside = tmp_path / "secret.avi"
+    outside.write_bytes(b"secret")
+    recording_id = add_recording(index, outside)
+    missing = root / "gone.avi"
+    missing.write_bytes(b"x")
+    missing_id = add_recording(index, missing)
+    missing.unlink()
+
+    assert client.get(f'/api/recordings/{recording_id}/file').status_code == 404
+    assert client.get(f'/api/recordings/{missing_id}/file').status_code == 404
+    assert client.get('/api/recordings/9999/file').status_code == 404
+
+
+def test_log_query_distinguishes_missing_and_archived_days(octo_web, client, tmp_path, monkeypatch):
+    logs = tmp_path / "logs"
+    logs.mkdir()
+    entry = {'time': 1000.0, 'level': 'ERROR', 'levelno': 40, 'camera': 2, 'message': "[CAM2] lost"}
+    with zipfile.ZipFile(logs / "2024-04-30.jsonl.zip", "w") as zf:
+        zf.writestr("2024-04-30.jsonl", json.dumps(entry) + "\n")
+    monkeypatch.setattr(octo_web, "log_indexer", LogIndexer(str(logs), str(logs / "index")))
+
+    response = client.get('/api/logs/query?date=2024-04-29')
+    assert response.status_code == 404
+    data = client.get('/api/logs/query?date=2024-04-30&level=warning').get_json()
+    assert data['archived'] is True
+    assert [e['message'] for e in data['entries']] == ["[CAM2] lost"]
+    assert client.get('/api/logs/query?date=2024-04-30&level=loud').status_code == 400
+
+
+
+def test_logs_tail_pages_with_cursor(octo_web, client, tmp_path, monkeypatch):
+    logs = tmp_path / "logs"
+    logs.mkdir()
+    lines = [f"2024-05-01 12:00:00 | INFO     | [CAM1] event {n}" for n in range(5)]
+    (logs / "2024-05-01.log").write_text("\n".join(lines) + "\n")
+    monkeypatch.chdir(tmp_path)
+
+    first = client.get('/api/logs?limit=3').get_json()
+    assert (first['file'], first['logs']) == ("2024-05-01.log", lines[2:])
+    rest = client.get(f"/api/logs?limit=3&before={first['before']}").get_json()
+    assert (rest['logs'], rest['before']) == (lines[:2], None)
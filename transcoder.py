@@ -0,0 +1,215 @@
+import os
+import time
+import tempfile
+import threading
+
+import cv2
+import numpy as np
+from loguru import logger
+
+from mjpeg_avi import AviInfo
+
+# Перекодирование закрытых MJPEG-записей в компактный кодек в фоне, когда камеры не загружены.
+# Кодек выбирается из доступных в сборке OpenCV/FFmpeg (первый, который открывается на запись).
+CODEC_CANDIDATES = [('avc1', '.mp4'), ('H264', '.mp4'), ('mp4v', '.mp4'), ('XVID', '.avi')]
+MIN_AGE = 60               # секунд после закрытия файла, прежде чем его трогать
+CHECK_INTERVAL = 30        # секунд между поисками новых файлов
+BUSY_FACTOR = 1.5          # цикл камер дольше стольких кадровых интервалов — пауза
+PAUSE_STEP = 0.5
+FRAME_TOLERANCE = 2        # допустимая разница в числе кадров при проверке результата
+TRANSCODING_SUFFIX = ".transcoding"
+
+_codec = None
+_codec_lock = threading.Lock()
+
+
+def detect_codec():
+    """(fourcc, расширение) первого кодека, который реально пишет файл, или None"""
+    global _codec
+    with _codec_lock:
+        if _codec is not None:
+            return _codec or None
+        _codec = False
+        frame = np.zeros((64, 64, 3), dtype=np.uint8)
+        for fourcc, ext in CODEC_CANDIDATES:
+            fd, path = tempfile.mkstemp(suffix=ext)
+            os.close(fd)
+            try:
+                writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), 8, (64, 64))
+                if writer.isOpened():
+                    for _ in range(3):
+                        writer.write(frame)
+                    writer.release()
+                    if os.path.getsize(path) > 0:
+                        _codec = (fourcc, ext)
+                        break
+                writer.release()
+            except cv2.error:
+                pass
+            finally:
+                if os.path.exists(path):
+                    os.remove(path)
+        if _codec:
+            logger.info(f"Transcoder codec: {_codec[0]} ({_codec[1]})")
+        else:
+            logger.warning("No compact video codec available, transcoding disabled")
+        return _codec or None
+
+
+def _set_low_priority():
+    """Минимальный приоритет планировщика для текущего потока (Linux: nice потока)"""
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+    except (AttributeError, OSError):
+        pass
+
+
+class Transcoder:
+    """
+    Очередь перекодирования: закрытые MJPEG-записи из индекса перекодируются по одной,
+    результат проверяется, подменяет исходник атомарно, индекс обновляется.
+    load — функция, возвращающая текущую длительность цикла камер (с); при перегрузке — пауза.
+    """
+
+    def __init__(self, index, load=None, frame_interval=0.125):
+        self.index = index
+        self.load = load
+        self.busy_threshold = frame_interval * BUSY_FACTOR
+        self.files = 0
+        self.failed = 0
+        self.bytes_before = 0
+        self.bytes_after = 0
+        self.paused = False
+        self.current = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="transcoder", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        codec = _codec or None
+        return {
+            'codec': codec[0] if codec else None,
+            'files': self.files,
+            'failed': self.failed,
+            'bytes_before': self.bytes_before,
+            'bytes_after': self.bytes_after,
+            'bytes_saved': self.bytes_before - self.bytes_after,
+            'paused': self.paused,
+            'current': self.current,
+        }
+
+    def _run(self):
+        _set_low_priority()
+        if detect_codec() is None:
+            return
+        while not self._stop.is_set():
+            candidates = self.index.transcode_candidates(time.time() - MIN_AGE, limit=10)
+            for row in candidates:
+                if self._stop.is_set():
+                    return
+                try:
+                    self.transcode(row['path'])
+                except Exception as e:
+                    self.failed += 1
+                    logger.error(f"Transcoding failed for {row['path']}: {e}")
+                    self.index.set_transcode(row['path'], 'failed')
+            if not candidates:
+                self._stop.wait(CHECK_INTERVAL)
+
+    def _wait_idle(self):
+        """Ждать, пока цикл камер не разгрузится"""
+        while self.load is not None and not self._stop.is_set() and self.load() > self.busy_threshold:
+            self.paused = True
+            time.sleep(PAUSE_STEP)
+        self.paused = False
+
+    def transcode(self, path):
+        """Перекодировать одну запись; True — файл заменён"""
+        if not os.path.exists(path):
+            self.index.set_transcode(path, 'skipped')
+            return False
+        info = AviInfo(path)
+        if not info.is_mjpeg or not info.frames:
+            # XVID и т.п. уже сжаты — не трогаем
+            self.index.set_transcode(path, 'skipped')
+            return False
+        fourcc, ext = detect_codec()
+        target = os.path.splitext(path)[0] + ext
+        temp = target + TRANSCODING_SUFFIX + ext
+        self.current = path
+        try:
+            written = self._encode(path, info, temp, fourcc)
+            if written is None:
+                return False  # остановлено
+            self._verify(temp, written)
+            before, after = os.path.getsize(path), os.path.getsize(temp)
+            if after >= before:
+                os.remove(temp)
+                self.index.set_transcode(path, 'skipped')
+                return False
+            # Подмена: новый файл появляется под окончательным именем одной операцией
+            os.replace(temp, target)
+            self.index.set_transcode(path, 'done', new_path=target, size=after)
+            if target != path:
+                os.remove(path)
+        finally:
+            self.current = None
+            if os.path.exists(temp):
+                os.remove(temp)
+        self.files += 1
+        self.bytes_before += before
+        self.bytes_after += after
+        logger.info(f"Transcoded {path} -> {target}: {before / 1024 / 1024:.1f} MB -> {after / 1024 / 1024:.1f} MB")
+        return True
+
+    def _encode(self, path, info, temp, fourcc):
+        writer = cv2.VideoWriter(temp, cv2.VideoWriter_fourcc(*fourcc), info.fps or 8.0, info.size)
+        if not writer.isOpened():
+            raise RuntimeError(f"cannot open writer {fourcc}")
+        written = 0
+        prev_jpeg = prev_frame = None
+        try:
+            with open(path, "rb") as f:
+                for offset, size in info.frames:
+                    if written % 16 == 0:
+                        self._wait_idle()
+                        if self._stop.is_set():
+                            return None
+                    f.seek(offset)
+                    jpeg = f.read(size)
+                    # Повторы кадра (постоянная частота) не декодируются заново
+                    if jpeg != prev_jpeg:
+                        prev_frame = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+                        prev_jpeg = jpeg
+                    if prev_frame is None:
+                        raise ValueError(f"broken frame at {offset}")
+                    writer.write(prev_frame)
+                    written += 1
+        finally:
+            writer.release()
+        return written
+
+    @staticmethod
+    def _verify(temp, expected):
+        """Результат открывается, кадров столько же (с допуском), первый кадр читается"""
+        cap = cv2.VideoCapture(temp)
+        try:
+            if not cap.isOpened():
+                raise ValueError("output cannot be opened")
+            count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            if count > 0 and abs(count - expected) > FRAME_TOLERANCE:
+                raise ValueError(f"frame count {count} != {expected}")
+            ok, _ = cap.read()
+            if not ok:
+                raise ValueError("first frame cannot be read")
+        finally:
+            cap.release()
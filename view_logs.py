@@ -1,8 +1,9 @@
 #!/usr/bin/env python3
 import os
-import zipfile
 from loguru import logger
 
+from log_archive import iter_lines
+
 LOGS_DIR = "logs"
 
 def _list_logs():
@@ -14,16 +15,14 @@ def _list_logs():
     return sorted(files, reverse=True)
 
 def _print_file(path):
-    with open(path, "r", encoding="utf-8", errors="ignore") as f:
-        print(f.read())
+    # Построчно: день лога может весить сотни МБ
+    for line in iter_lines(path):
+        print(line, end="")
 
 def _print_zip_first_log(path):
-    with zipfile.ZipFile(path, "r") as zf:
-        # Берём первый файл из архива (у Loguru он единственный)
-        name = zf.namelist()[0]
-        with zf.open(name, "r") as f:
-            content = f.read().decode("utf-8", errors="ignore")
-            print(content)
+    # Первый файл из архива (у Loguru он единственный), распаковка по мере вывода
+    for line in iter_lines(path):
+        print(line, end="")
 
 def view_logs():
     if not os.path.exists(LOGS_DIR):